@@ -1 +1,4 @@
 export const API_URL = "http://localhost:8000";
+
+// Opt into MessagePack for large payloads (/graph, /tree, /ask)
+export const USE_MSGPACK = import.meta.env.VITE_USE_MSGPACK === "true";
@@ -4,11 +4,23 @@ import { X, Edit2, Save, Trash2, Search, FileText } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
-import api from '../services/api';
+import api, { type ChangeEvent } from '../services/api';
+
+// Same chain-per-category layout the server builds for /graph
+const chainLinks = (nodes: any[]) => {
+    const lastInGroup: Record<string, string> = {};
+    const links: any[] = [];
+    for (const node of nodes) {
+        const previous = lastInGroup[node.group];
+        if (previous) links.push({ source: previous, target: node.id });
+        lastInGroup[node.group] = node.id;
+    }
+    return links;
+};
 
 const Graph = () => {
     // 1. Core State
-    const [graphData, setGraphData] = useState({ nodes: [], links: [] });
+    const [graphData, setGraphData] = useState<{ nodes: any[], links: any[] }>({ nodes: [], links: [] });
     const [dimensions, setDimensions] = useState({ width: 800, height: 600 });
     const [selectedNode, setSelectedNode] = useState<any>(null);
     const [searchQuery, setSearchQuery] = useState("");
@@ -27,6 +39,8 @@ const Graph = () => {
     // 3. Init: Fetch & Resize
     useEffect(() => {
         fetchGraph();
+        // Apply server-pushed deltas instead of refetching the whole graph
+        return api.events.subscribe(applyChange);
     }, []);
 
     // Observer for the layout change (when sidebars open/close)
@@ -51,6 +65,28 @@ const Graph = () => {
         } catch (e) { console.error(e); }
     };
 
+    const applyChange = (event: ChangeEvent) => {
+        if (event.type === 'resync') {
+            fetchGraph();
+            return;
+        }
+        if (event.type === 'folder.changed') return;
+
+        setGraphData((current: any) => {
+            const removedId = event.type === 'node.removed' ? event.id : event.node?.id;
+            const nodes = current.nodes.filter((n: any) => n.id !== removedId);
+            if (event.type !== 'node.removed' && event.node) {
+                // Keep the simulated position of an updated node
+                const previous = current.nodes.find((n: any) => n.id === event.node.id);
+                nodes.push(previous ? { ...previous, ...event.node } : event.node);
+            }
+            return { nodes, links: chainLinks(nodes) };
+        });
+        if (event.type === 'node.removed') {
+            setSelectedNode((selected: any) => selected?.id === event.id ? null : selected);
+        }
+    };
+
     // 4. Interaction Handlers
     const handleNodeSelect = (node: any) => {
         setSelectedNode(node);
@@ -68,8 +104,7 @@ const Graph = () => {
         if (!confirm("Are you sure you want to delete this memory?")) return;
         try {
             await api.memories.delete(selectedNode.id);
-            setSelectedNode(null);
-            fetchGraph(); // Reload graph
+            setSelectedNode(null); // The change feed removes the node from the graph
             setNotification({ type: 'success', msg: "Memory deleted." });
             setTimeout(() => setNotification(null), 3000);
         } catch(e) {
@@ -40,7 +40,16 @@ const Home = () => {
 
   const handleAutoSave = async (data: any) => {
       try {
-        await api.memories.save(data);
+        const result = await api.memories.save(data);
+        if (result.status === 'duplicate') {
+            // Nothing was written: let the user fold it into the existing note or keep both
+            const existing = result.duplicate_of;
+            const merge = window.confirm(
+                `This looks like an existing note: "${existing.title || existing.id}".\n\n` +
+                `OK merges it into that note, Cancel saves it as a new note.`
+            );
+            await api.memories.save(data, merge ? 'merge' : 'create');
+        }
         setInput("");
         setTitle("");
         setAnalysis(null);
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Search, ArrowRight, Brain, AlertCircle, BookOpen } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
@@ -9,10 +9,29 @@ const Recall = () => {
     const [loading, setLoading] = useState(false);
     const [result, setResult] = useState<any>(null);
     const [error, setError] = useState("");
+    const [suggestions, setSuggestions] = useState<any[]>([]);
+
+    // Typeahead: cheap in-memory lookup, debounced per keystroke
+    useEffect(() => {
+        if (!query.trim()) {
+            setSuggestions([]);
+            return;
+        }
+        const timer = setTimeout(async () => {
+            try {
+                const data = await api.analysis.suggest(query);
+                setSuggestions(data.suggestions);
+            } catch {
+                setSuggestions([]);
+            }
+        }, 80);
+        return () => clearTimeout(timer);
+    }, [query]);
 
     const handleSearch = async () => {
         if (!query.trim()) return;
         
+        setSuggestions([]);
         setLoading(true);
         setError("");
         setResult(null);
@@ -60,6 +79,24 @@ const Recall = () => {
                             {loading ? <div className="w-5 h-5 border-2 border-accent border-t-transparent rounded-full animate-spin"/> : <ArrowRight size={20} />}
                         </button>
                     </div>
+
+                    {/* Typeahead Suggestions */}
+                    {suggestions.length > 0 && (
+                        <div className="absolute z-20 left-0 right-0 mt-1 bg-card border border-border rounded-lg shadow-md overflow-hidden">
+                            {suggestions.map((s: any) => (
+                                <button
+                                    key={s.id}
+                                    onClick={() => { setQuery(s.title); setSuggestions([]); }}
+                                    className="w-full flex items-center justify-between gap-3 px-4 py-2 text-left text-sm hover:bg-secondary/50 transition-colors"
+                                >
+                                    <span className="text-primary truncate">{s.title}</span>
+                                    <span className="px-1.5 py-0.5 rounded text-[10px] bg-secondary border border-border text-text-secondary uppercase shrink-0">
+                                        {s.kind === 'ticket' && s.tickets.length ? s.tickets[0] : s.category || 'Note'}
+                                    </span>
+                                </button>
+                            ))}
+                        </div>
+                    )}
                 </div>
 
                 {/* Error Banner */}
@@ -39,7 +39,7 @@ const Settings = () => {
         }
     };
 
-    const [notification, setNotification] = useState<{type: 'confirm'|'confirm_reset'|'success'|'error', msg: string} | null>(null);
+    const [notification, setNotification] = useState<{type: 'confirm'|'confirm_reset'|'reset_done'|'success'|'error', msg: string, resetId?: string} | null>(null);
 
     const startReindex = async () => {
         setNotification(null);
@@ -59,9 +59,9 @@ const Settings = () => {
         setNotification(null);
         setLoading(true);
         try {
-            await axios.post(`${API_URL}/reset`);
-            setNotification({ type: 'success', msg: "Brain completely wiped. Fresh start!" });
-            setTimeout(() => setNotification(null), 5000);
+            const res = await axios.post(`${API_URL}/reset`);
+            setNotification({ type: 'reset_done', msg: "Brain completely wiped. Fresh start!", resetId: res.data.reset_id });
+            setTimeout(() => setNotification(n => n?.type === 'reset_done' ? null : n), 15000);
         } catch(e) {
             setNotification({ type: 'error', msg: "Failed to wipe brain." });
         } finally {
@@ -69,6 +69,20 @@ const Settings = () => {
         }
     };
 
+    const undoReset = async (resetId: string) => {
+        setNotification(null);
+        setLoading(true);
+        try {
+            await axios.post(`${API_URL}/reset/${resetId}/undo`);
+            setNotification({ type: 'success', msg: "Wipe undone. Your memories are back." });
+            setTimeout(() => setNotification(null), 5000);
+        } catch(e) {
+            setNotification({ type: 'error', msg: "Undo failed (the wipe may already be purged)." });
+        } finally {
+            setLoading(false);
+        }
+    };
+
     if (loading) return <div className="flex-1 flex items-center justify-center text-gray-500 flex-col gap-4">
         <RefreshCw className="animate-spin text-indigo-500" size={32} />
         <p>Processing Vault...</p>
@@ -92,7 +106,7 @@ const Settings = () => {
                     {notification.type === 'confirm_reset' && (
                          <div className="bg-card border-red-500 border p-6 rounded-2xl shadow-2xl max-w-sm">
                             <h3 className="text-lg font-bold text-red-500 mb-2">Wipe Everything?</h3>
-                            <p className="text-text-secondary text-sm mb-4">This will DELETE ALL MEMORIES and embeddings permanently. There is no undo.</p>
+                            <p className="text-text-secondary text-sm mb-4">This will DELETE ALL MEMORIES and embeddings. You can undo it for a few minutes, then it is permanent.</p>
                             <div className="flex gap-3 justify-end">
                                 <button onClick={() => setNotification(null)} className="px-4 py-2 text-text-secondary hover:text-primary transition-colors">Cancel</button>
                                 <button onClick={resetBrain} className="px-4 py-2 bg-red-600 hover:bg-red-700 text-white rounded-lg transition-colors font-medium">Nuke It</button>
@@ -104,6 +118,12 @@ const Settings = () => {
                             <Check size={20} /> {notification.msg}
                         </div>
                     )}
+                    {notification.type === 'reset_done' && (
+                        <div className="bg-emerald-500/10 border border-emerald-500/20 p-4 rounded-xl shadow-xl flex items-center gap-3 text-emerald-400">
+                            <Check size={20} /> {notification.msg}
+                            <button onClick={() => undoReset(notification.resetId!)} className="ml-2 px-3 py-1 bg-white/10 hover:bg-white/20 text-primary rounded-lg transition-colors text-sm font-medium">Undo</button>
+                        </div>
+                    )}
                     {notification.type === 'error' && (
                         <div className="bg-red-500/10 border border-red-500/20 p-4 rounded-xl shadow-xl text-red-400">
                             {notification.msg}
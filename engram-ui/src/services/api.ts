@@ -1,10 +1,34 @@
-import axios from 'axios';
-import { API_URL } from '../constants';
+import axios, { type AxiosRequestConfig } from 'axios';
+import { API_URL, USE_MSGPACK } from '../constants';
+import { decodeMsgPack } from './msgpack';
+
+// Request config for routes that can answer in MessagePack
+const bulkConfig = (): AxiosRequestConfig => USE_MSGPACK
+    ? { headers: { Accept: 'application/msgpack' }, responseType: 'arraybuffer' }
+    : {};
+
+const bulkData = (res: { data: any, headers: any }) => {
+    const contentType = String(res.headers['content-type'] || '');
+    if (contentType.includes('application/msgpack')) return decodeMsgPack(res.data);
+    // Server without msgpack support falls back to JSON
+    if (res.data instanceof ArrayBuffer) return JSON.parse(new TextDecoder().decode(res.data));
+    return res.data;
+};
+
+export type ChangeEvent = {
+    seq: number,
+    type: 'node.added' | 'node.updated' | 'node.removed' | 'folder.changed' | 'resync',
+    vault: string,
+    node?: any,
+    id?: string,
+    path?: string | null
+};
 
 const api = {
     memories: {
-        save: async (data: any) => {
-            const res = await axios.post(`${API_URL}/save`, data);
+        // onDuplicate: "merge" | "offer" | "create"; the server's dedup_mode when omitted
+        save: async (data: any, onDuplicate?: string) => {
+            const res = await axios.post(`${API_URL}/save`, data, { params: { on_duplicate: onDuplicate } });
             return res.data;
         },
         delete: async (id: string) => {
@@ -18,26 +42,48 @@ const api = {
         }
     },
     graph: {
-        get: async () => {
-            const res = await axios.get(`${API_URL}/graph`);
-            return res.data;
+        get: async (vault?: string) => {
+            const res = await axios.get(`${API_URL}/graph`, { ...bulkConfig(), params: { vault } });
+            return bulkData(res);
         }
     },
     analysis: {
+        suggest: async (q: string, limit: number = 8) => {
+            const res = await axios.get(`${API_URL}/suggest`, { params: { q, limit } });
+            return res.data;
+        },
         analyze: async (text: string) => {
            const res = await axios.post(`${API_URL}/analyze`, { text });
            return res.data;
         },
-        ask: async (query: string) => {
-            const res = await axios.post(`${API_URL}/ask`, { query });
-            return res.data;
+        ask: async (query: string, options: { vault?: string, allVaults?: boolean } = {}) => {
+            const params = { vault: options.vault, all_vaults: options.allVaults || undefined };
+            const res = await axios.post(`${API_URL}/ask`, { query }, { ...bulkConfig(), params });
+            return bulkData(res);
+        }
+    },
+    events: {
+        // Live change feed (SSE); the browser reconnects and resumes via Last-Event-ID
+        subscribe: (onEvent: (event: ChangeEvent) => void, vault?: string) => {
+            const url = vault ? `${API_URL}/events?vault=${encodeURIComponent(vault)}` : `${API_URL}/events`;
+            const source = new EventSource(url);
+            source.onmessage = (message) => onEvent(JSON.parse(message.data));
+            return () => source.close();
         }
     },
     system: {
+        getTree: async (path?: string) => {
+             const res = await axios.get(`${API_URL}/tree`, { ...bulkConfig(), params: { path } });
+             return bulkData(res);
+        },
         getConfig: async () => {
              const res = await axios.get(`${API_URL}/config`);
              return res.data;
         },
+        getVaults: async () => {
+             const res = await axios.get(`${API_URL}/vaults`);
+             return res.data;
+        },
         updateConfig: async(key: string, value: string) => {
              const res = await axios.post(`${API_URL}/config`, { [key]: value });
              return res.data;
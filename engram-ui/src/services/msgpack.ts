@@ -0,0 +1,78 @@
+// Minimal MessagePack decoder for the API's opt-in binary responses.
+// Covers the types the backend emits (nil, bool, int, float, str, bin, array, map).
+
+const textDecoder = new TextDecoder();
+
+export function decodeMsgPack(buffer: ArrayBuffer): any {
+    const view = new DataView(buffer);
+    const bytes = new Uint8Array(buffer);
+    let offset = 0;
+
+    const readStr = (length: number) => {
+        const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    };
+
+    const readBin = (length: number) => {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    };
+
+    const readArray = (length: number) => {
+        const value = new Array(length);
+        for (let i = 0; i < length; i++) value[i] = read();
+        return value;
+    };
+
+    const readMap = (length: number) => {
+        const value: Record<string, any> = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            value[String(key)] = read();
+        }
+        return value;
+    };
+
+    const read = (): any => {
+        const type = view.getUint8(offset++);
+
+        if (type <= 0x7f) return type;
+        if (type >= 0xe0) return type - 0x100;
+        if ((type & 0xe0) === 0xa0) return readStr(type & 0x1f);
+        if ((type & 0xf0) === 0x90) return readArray(type & 0x0f);
+        if ((type & 0xf0) === 0x80) return readMap(type & 0x0f);
+
+        let value: any;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: value = view.getUint8(offset); offset += 1; return readBin(value);
+            case 0xc5: value = view.getUint16(offset); offset += 2; return readBin(value);
+            case 0xc6: value = view.getUint32(offset); offset += 4; return readBin(value);
+            case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+            case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+            case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+            case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+            case 0xce: value = view.getUint32(offset); offset += 4; return value;
+            case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+            case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+            case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+            case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+            case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+            case 0xd9: value = view.getUint8(offset); offset += 1; return readStr(value);
+            case 0xda: value = view.getUint16(offset); offset += 2; return readStr(value);
+            case 0xdb: value = view.getUint32(offset); offset += 4; return readStr(value);
+            case 0xdc: value = view.getUint16(offset); offset += 2; return readArray(value);
+            case 0xdd: value = view.getUint32(offset); offset += 4; return readArray(value);
+            case 0xde: value = view.getUint16(offset); offset += 2; return readMap(value);
+            case 0xdf: value = view.getUint32(offset); offset += 4; return readMap(value);
+            default:
+                throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+        }
+    };
+
+    return read();
+}
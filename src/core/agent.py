@@ -1,90 +1,174 @@
-import ollama
 import json
 import re
 from .config import MODELS
+from .gateway import ModelGateway, ModelUnavailableError, get_model_gateway
 from src.core.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Static instructions for `process`. Kept byte-identical across calls and sent as
+# the system message so Ollama can reuse the evaluated prefix from its KV cache;
+# only the user message (the note itself) changes between requests.
+PROCESS_SYSTEM_PROMPT = """
+You are the 'Cortex' of a PROFESSIONAL Second Brain system. Your goal is to organize thoughts into a pristine, unparalleled WORK knowledge base.
+The user message is the INPUT TEXT to organize.
+
+### 1. CATEGORIZATION ARCHITECTURE (WORK ONLY)
+You MUST classify all input into one of these strict Work Domains:
+
+- **`Work/Tickets`**: For tasks with EXPLICIT ticket IDs (e.g., JIRA-123) or clear bug fixes/feature requests.
+- **`Work/Meetings`**: Syncs, standups, huddles, interviews, calendar events.
+- **`Work/Tech`**: Engineering, deployment, infrastructure, code reviews, documentation.
+- **`Work/Planning`**: Goals, OKRs, roadmaps, strategy, career growth.
+- **`Work/General`**: Ideas, notes, or thoughts that don't fit the above but are work-related.
+
+### 2. STRICT PROCESSING RULES
+- **PROFESSIONAL ONLY**: Do NOT create any 'Personal' categories. If the input seems personal (e.g. 'buy milk'), try to reframe it as a work task (e.g. 'Work/General' -> 'Buy milk for office') or ignore the personal aspect and focus on any work context.
+- **Ambiguity Filter**: If the input is too generic (e.g., "fix the bug", "meeting tomorrow") and lacks context on WHICH project or topic:
+  - You MUST return `is_clear: false`
+  - Ask a clarifying question like: "Which project or ticket is this related to?" or "What is the topic of the meeting?".
+- **Identity Constraint**: Do NOT invent project names or ticket IDs.
+- **Input Structure**: The input text may start with "Title:" and "Content:". If a "Title:" is provided, use it as the primary basis for the note's Title, but you may refine it for professionalism.
+
+### 3. OUTPUT SPECIFICATIONS
+- **Title**: Create a concise, professional title. Use the user provided title if one exists with refinement if needed.
+- **Summary**: Write a high-quality Markdown summary.
+  - Tasks: Use checkboxes `[ ]`.
+  - Code: MUST wrap all code in markdown code blocks (e.g., ```python ... ```).
+- **Tags**: Generate 3-5 relevant, lowercase tags.
+
+### OUTPUT JSON FORMAT
+Return ONLY a JSON object with these fields:
+- "is_clear": boolean
+- "clarifying_question": string (only if is_clear is false, otherwise empty)
+- "category": "Work/SubCategory"
+- "tags": list of lowercase strings
+- "title": string
+- "summary": Markdown string
+"""
+
+# JSON schema handed to Ollama's `format` parameter so decoding is constrained
+# to a valid object; no regex scraping of free text needed.
+PROCESS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_clear": {"type": "boolean"},
+        "clarifying_question": {"type": "string"},
+        "category": {
+            "type": "string",
+            "enum": ["Work/Tickets", "Work/Meetings", "Work/Tech", "Work/Planning", "Work/General"]
+        },
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "title": {"type": "string"},
+        "summary": {"type": "string"}
+    },
+    "required": ["is_clear", "category", "tags", "title", "summary"]
+}
+
+# Map and reduce steps of the rollup summaries (src.core.rollups)
+ROLLUP_MAP_PROMPT = """
+You maintain a work journal. Summarize the notes below, all from "{label}", as 3-6 short Markdown bullets:
+what was worked on, decisions made, open items. Keep ticket IDs, names and dates exactly as written.
+Do NOT invent anything that is not in the notes. Return only the bullets.
+"""
+
+ROLLUP_REDUCE_PROMPT = """
+You maintain a work journal. Below are partial summaries covering "{label}", oldest first.
+Merge them into one summary of at most 8 Markdown bullets, keeping the most important work,
+decisions and open items. Keep ticket IDs, names and dates exactly as written. Return only the bullets.
+"""
+
+# Keep the chat model resident between notes so the cached prefix survives
+KEEP_ALIVE = "30m"
+
+
+def unprocessed_note(text: str) -> dict:
+    """
+    Fallback analysis for text the agent could not process.
+    """
+    return {
+        "is_clear": True,
+        "category": "Inbox",
+        "tags": ["error"],
+        "title": "Unprocessed Note",
+        "summary": text
+    }
+
+
 class BrainAgent:
-    def __init__(self):
-        self.model = MODELS["chat"]
-        self.client = ollama.AsyncClient()
+    def __init__(self, gateway: ModelGateway = None, model: str = None):
+        self.model = model or MODELS["chat"]
+        self.gateway = gateway or get_model_gateway()
+        # Last observed Ollama timings per operation (milliseconds)
+        self.last_timings = {}
+
+    def _record_timings(self, op: str, response) -> dict:
+        """
+        Extracts prompt-eval vs. generation timings from an Ollama response.
+        Ollama reports durations in nanoseconds.
+        """
+        def _ms(key):
+            value = response.get(key)
+            return round(value / 1e6, 1) if value else 0.0
+
+        timings = {
+            "prompt_tokens": response.get("prompt_eval_count") or 0,
+            "prompt_eval_ms": _ms("prompt_eval_duration"),
+            "eval_tokens": response.get("eval_count") or 0,
+            "eval_ms": _ms("eval_duration"),
+            "load_ms": _ms("load_duration"),
+            "total_ms": _ms("total_duration"),
+        }
+        self.last_timings[op] = timings
+        logger.info(
+            f"{op}: prompt_eval {timings['prompt_tokens']} tok / {timings['prompt_eval_ms']}ms, "
+            f"eval {timings['eval_tokens']} tok / {timings['eval_ms']}ms, total {timings['total_ms']}ms"
+        )
+        return timings
 
     async def process(self, text: str) -> dict:
         """
         Analyzes the text to determine category, tags, and clarity.
         """
-        prompt = f"""
-        You are the 'Cortex' of a PROFESSIONAL Second Brain system. Your goal is to organize thoughts into a pristine, unparalleled WORK knowledge base.
-        
-        INPUT TEXT: "{text}"
-        
-        ### 1. CATEGORIZATION ARCHITECTURE (WORK ONLY)
-        You MUST classify all input into one of these strict Work Domains:
-        
-        - **`Work/Tickets`**: For tasks with EXPLICIT ticket IDs (e.g., JIRA-123) or clear bug fixes/feature requests.
-        - **`Work/Meetings`**: Syncs, standups, huddles, interviews, calendar events.
-        - **`Work/Tech`**: Engineering, deployment, infrastructure, code reviews, documentation.
-        - **`Work/Planning`**: Goals, OKRs, roadmaps, strategy, career growth.
-        - **`Work/General`**: Ideas, notes, or thoughts that don't fit the above but are work-related.
-        
-        ### 2. STRICT PROCESSING RULES
-        - **PROFESSIONAL ONLY**: Do NOT create any 'Personal' categories. If the input seems personal (e.g. 'buy milk'), try to reframe it as a work task (e.g. 'Work/General' -> 'Buy milk for office') or ignore the personal aspect and focus on any work context.
-        - **Ambiguity Filter**: If the input is too generic (e.g., "fix the bug", "meeting tomorrow") and lacks context on WHICH project or topic:
-          - You MUST return `is_clear: false`
-          - Ask a clarifying question like: "Which project or ticket is this related to?" or "What is the topic of the meeting?".
-        - **Identity Constraint**: Do NOT invent project names or ticket IDs.
-        - **Input Structure**: The input text may start with "Title:" and "Content:". If a "Title:" is provided, use it as the primary basis for the note's Title, but you may refine it for professionalism.
-
-        ### 3. OUTPUT SPECIFICATIONS
-        - **Title**: Create a concise, professional title. Use the user provided title if one exists with refinement if needed.
-        - **Summary**: Write a high-quality Markdown summary.
-          - Tasks: Use checkboxes `[ ]`.
-          - Code: MUST wrap all code in markdown code blocks (e.g., ```python ... ```).
-        - **Tags**: Generate 3-5 relevant, lowercase tags.
-        
-        ### OUTPUT JSON FORMAT
-        Return ONLY valid JSON.
-        CRITICAL FORMATTING RULES:
-        1. You MUST escape all newlines in strings as "\\n". ({{ "summary": "Line1\\nLine2" }})
-        2. You MUST escape all double quotes in strings as "\\\"". ({{ "code": "printf(\\\"hello\\\")" }})
-        3. Do not print raw newlines or raw tabs inside the JSON values.
-        
-        {{
-          "is_clear": boolean,
-          "clarifying_question": "string (only if false)",
-          "category": "Work/SubCategory",
-          "tags": ["tag1", "tag2"],
-          "title": "Title",
-          "summary": "# Header\\nContent..."
-        }}
-        """
-
         try:
-            response = await self.client.chat(model=self.model, messages=[
-                {'role': 'user', 'content': prompt}
-            ])
-            
+            response = await self.gateway.chat(
+                model=self.model,
+                messages=[
+                    {'role': 'system', 'content': PROCESS_SYSTEM_PROMPT},
+                    {'role': 'user', 'content': text}
+                ],
+                format=PROCESS_SCHEMA,
+                keep_alive=KEEP_ALIVE
+            )
+            self._record_timings("process", response)
+
             content = response['message']['content']
-            
-            # Extract JSON using regex
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                content = json_match.group(0)
-            
-            return json.loads(content, strict=False)
-            
+
+            try:
+                return json.loads(content, strict=False)
+            except json.JSONDecodeError:
+                # Older Ollama builds ignore schema formats; salvage the object
+                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                if not json_match:
+                    raise
+                return json.loads(json_match.group(0), strict=False)
+
+        except ModelUnavailableError:
+            # Not a bad answer: the model is down, and callers must not persist a fallback
+            raise
         except Exception as e:
             logger.error(f"Agent processing failed: {e}")
-            # Fallback
-            return {
-                "is_clear": True,
-                "category": "Inbox", 
-                "tags": ["error"], 
-                "title": "Unprocessed Note",
-                "summary": text
-            }
+            return unprocessed_note(text)
+
+    async def warm_up(self):
+        """
+        Loads the chat model into memory ahead of the first real request.
+        """
+        try:
+            await self.gateway.warm(self.model, keep_alive=KEEP_ALIVE)
+            logger.info(f"Chat model warmed up: {self.model}")
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.model} failed: {e}")
 
     async def answer(self, query: str, context: list) -> str:
         """
@@ -117,12 +201,26 @@ class BrainAgent:
         Answer:
         """
 
-        response = await self.client.chat(model=self.model, messages=[
+        response = await self.gateway.chat(model=self.model, messages=[
             {'role': 'user', 'content': prompt}
-        ])
+        ], keep_alive=KEEP_ALIVE)
+        self._record_timings("answer", response)
         
         return response['message']['content']
 
+    async def summarize(self, label: str, texts: list, combine: bool = False) -> str:
+        """
+        One map (notes -> bullets) or reduce (summaries -> bullets) step of a rollup.
+        Raises ModelUnavailableError when the model is down, so callers can retry later.
+        """
+        system = (ROLLUP_REDUCE_PROMPT if combine else ROLLUP_MAP_PROMPT).format(label=label)
+        response = await self.gateway.chat(model=self.model, messages=[
+            {'role': 'system', 'content': system},
+            {'role': 'user', 'content': "\n\n---\n\n".join(texts)}
+        ], keep_alive=KEEP_ALIVE)
+        self._record_timings("rollup_reduce" if combine else "rollup_map", response)
+        return response['message']['content'].strip()
+
     async def detect_updates(self, new_input: str, context_docs: list) -> list:
         """
         Checks if the new_input implies an update to existing context documents.
@@ -160,7 +258,7 @@ class BrainAgent:
         """
         
         try:
-            response = await self.client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+            response = await self.gateway.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
             content = response['message']['content']
             json_match = re.search(r'\[.*\]', content, re.DOTALL)
             if json_match:
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -12,11 +13,79 @@ class Settings(BaseSettings):
     base_dir: Path = Field(default_factory=lambda: Path(os.getcwd()))
     vault_path: Path = Field(default_factory=lambda: Path(os.getcwd()) / "engram_vault")
     config_file: Path = Field(default_factory=lambda: Path(os.getcwd()) / "config.json")
+
+    # Additional Vaults (name -> path); `vault_path` is always the "default" vault
+    vaults: Dict[str, Path] = Field(default_factory=dict)
+    max_open_vaults: int = 4
+    vault_idle_s: float = 600.0
     
     # Models
     chat_model: str = "llama3.1:8b"
     embed_model: str = "nomic-embed-text"
 
+    # Model Gateway (Ollama)
+    ollama_host: Optional[str] = None  # Falls back to OLLAMA_HOST / localhost
+    ollama_hosts: List[str] = Field(default_factory=list)  # Extra chat endpoints, load-balanced with ollama_host
+    chat_timeout_s: float = 120.0
+    embed_timeout_s: float = 30.0
+    model_connect_timeout_s: float = 5.0
+    model_retries: int = 2
+    model_retry_backoff_s: float = 0.25
+    model_max_connections: int = 8
+    breaker_failure_threshold: int = 5
+    breaker_reset_s: float = 30.0
+    model_health_interval_s: float = 10.0
+    model_hedge_min_s: float = 10.0  # Never hedge a chat call earlier than this
+    model_hedge_factor: float = 3.0  # ...or before this multiple of the endpoint's usual latency
+    model_parallel_per_endpoint: int = 2  # Mirrors OLLAMA_NUM_PARALLEL; sizes bulk tagging
+
+    # Embedding Model Migration (re-embeds into a shadow collection when embed_model changes)
+    embed_migration_batch: int = 32
+    embed_migration_pause_s: float = 0.2  # Between batches, leaving the model to interactive calls
+
+    # Write Path (group commit of vector-store writes)
+    commit_interval_ms: int = 50
+    commit_batch_size: int = 16
+    commit_retry_s: float = 0.5  # First retry delay of a failed batch, doubling up to commit_retry_max_s
+    commit_retry_max_s: float = 30.0
+
+    # Near-Duplicate Detection on save: "merge" | "offer" | "create" (no check)
+    dedup_mode: str = "offer"  # Return the match and let the client decide; never merge unasked
+    dedup_jaccard_threshold: float = 0.7
+    dedup_cosine_threshold: float = 0.97
+    dedup_identical_threshold: float = 0.95  # Merging is a no-op above this
+
+    # /ask Context Assembly (token estimates, ~4 chars per token)
+    ask_token_budget: int = 1500
+    ask_candidates: int = 20  # Over-fetched, then narrowed by MMR
+    ask_max_notes: int = 8
+    ask_max_note_tokens: int = 400
+    ask_mmr_lambda: float = 0.7  # 1.0 = pure relevance, lower favours diversity
+
+    # Reset: contents go to .engram/trash and are purged after this undo window
+    reset_undo_s: float = 600.0
+    reset_flush_timeout_s: float = 5.0  # Wait for queued saves before swapping the store; then they are dropped
+
+    # Rollups: cached per-category / per-week summaries for broad or temporal /ask questions
+    rollups_enabled: bool = True
+    rollup_debounce_s: float = 30.0  # Batch up writes before re-summarizing
+    rollup_chunk_notes: int = 16  # Notes per map step (and summaries per reduce step)
+    rollup_note_tokens: int = 150  # Each note is cut to this much in the map prompt
+
+    # API Responses
+    compression_min_size: int = 1024
+
+    # Profiling (/debug/profiles); off unless a token is set, sent as X-Profiling-Token
+    profiling_token: Optional[str] = None
+    profile_ring_size: int = 20  # Captured profiles kept in memory, oldest dropped first
+    profile_sample_interval_ms: float = 5.0
+
+    # Logging (queued, off the request path); level is changeable via /config
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" | "text"
+    log_sample_rate: float = 0.1  # Share of hot-path lines kept
+    log_sample_max_per_s: int = 5  # Per hot-path line
+
     class Config:
         env_file = ".env"
         
@@ -33,6 +102,12 @@ class Settings(BaseSettings):
                         self.chat_model = data["chat_model"]
                     if "embed_model" in data:
                         self.embed_model = data["embed_model"]
+                    if "ollama_hosts" in data:
+                        self.ollama_hosts = list(data["ollama_hosts"])
+                    if "vaults" in data:
+                        self.vaults = {name: Path(path) for name, path in data["vaults"].items()}
+                    if "log_level" in data:
+                        self.log_level = data["log_level"]
         except Exception as e:
             import logging
             logging.getLogger(__name__).warning(f"Failed to load config.json: {e}")
@@ -41,16 +116,21 @@ class Settings(BaseSettings):
 settings = Settings()
 settings.load_from_json()
 
-# Backward Compatibility Exports (for now, to reduce refactor noise, but eventually replace)
+# Backward Compatibility Exports (startup values only; live components take their
+# paths/models from src.core.runtime, which can swap them without a restart)
 VAULT_ROOT = settings.vault_path
 MODELS = {
     "chat": settings.chat_model,
     "embed": settings.embed_model
 }
 CONFIG_FILE = settings.config_file
+DEFAULT_VAULT = "default"
 DB_PATH = settings.vault_path / ".engram" / "db"
+JOURNAL_PATH = settings.vault_path / ".engram" / "journal"
 
-def init_folders():
+def init_folders(vault_path: Path = None):
     """Ensure essential folders exist"""
-    settings.vault_path.mkdir(parents=True, exist_ok=True)
-    (settings.vault_path / ".engram").mkdir(exist_ok=True)
\ No newline at end of file
+    vault_path = Path(vault_path or settings.vault_path)
+    vault_path.mkdir(parents=True, exist_ok=True)
+    (vault_path / ".engram").mkdir(exist_ok=True)
+    (vault_path / ".engram" / "journal").mkdir(exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import re
+import numpy as np
+from .config import settings
+
+CHARS_PER_TOKEN = 4  # Close enough for Llama-family tokenizers on English prose
+MIN_SPAN_TOKENS = 24  # Not worth adding a note with less room than this
+
+_UNIT_SPLIT = re.compile(r"\n\s*\n|(?<=[.!?])\s+(?=[A-Z0-9#*-])")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN) if text else 0
+
+
+def query_terms(query: str) -> set:
+    # Same term rule as VectorDB.lexical_search
+    return {t for t in re.findall(r"\w+", query.lower()) if len(t) > 2}
+
+
+def best_span(text: str, terms: set, max_tokens: int) -> str:
+    """
+    The shortest contiguous run of paragraphs/sentences that fits `max_tokens`
+    and mentions the most query terms (the note's first unit if none match).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    units = [u.strip() for u in _UNIT_SPLIT.split(text) if u and u.strip()]
+    lowered = [u.lower() for u in units]
+    scores = [sum(1 for t in terms if t in u) for u in lowered]
+    costs = [estimate_tokens(u) for u in units]
+
+    best_score, best_start, best_end = -1, 0, -1
+    start, score, cost = 0, 0, 0
+    for end in range(len(units)):
+        score += scores[end]
+        cost += costs[end]
+        while cost > max_tokens and start <= end:
+            score -= scores[start]
+            cost -= costs[start]
+            start += 1
+        if start <= end and score > best_score:
+            best_score, best_start, best_end = score, start, end
+
+    if best_end < 0:
+        # A single unit is over budget on its own: hard cut around the first hit
+        unit = max(range(len(units)), key=lambda i: scores[i]) if units else 0
+        source = units[unit] if units else text
+        hit = min((source.lower().find(t) for t in terms if t in source.lower()), default=0)
+        width = max_tokens * CHARS_PER_TOKEN
+        begin = max(0, min(hit - width // 4, len(source) - width))
+        prefix = "…" if begin > 0 else ""
+        suffix = "…" if begin + width < len(source) else ""
+        return f"{prefix}{source[begin:begin + width]}{suffix}"
+
+    # Drop non-matching units at either edge: the smallest window with the best coverage
+    while best_start < best_end and scores[best_start] == 0:
+        best_start += 1
+    while best_end > best_start and scores[best_end] == 0:
+        best_end -= 1
+
+    span = "\n".join(units[best_start:best_end + 1])
+    prefix = "…" if best_start > 0 else ""
+    suffix = "…" if best_end < len(units) - 1 else ""
+    return f"{prefix}{span}{suffix}"
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def assemble_context(query: str, query_embedding, candidates: list, budget: int = None,
+                     max_notes: int = None, max_note_tokens: int = None, mmr_lambda: float = None) -> dict:
+    """
+    Picks the smallest useful context for a question from over-fetched candidates.
+
+    Candidates are taken in maximal-marginal-relevance order over their stored
+    embeddings (relevant to the query, unlike what is already chosen); near
+    copies of a chosen note are skipped, and each note is trimmed to its most
+    relevant span until the token budget is spent. Without embeddings (e.g.
+    keyword fallback) the given order is kept.
+    """
+    budget = budget or settings.ask_token_budget
+    max_notes = max_notes or settings.ask_max_notes
+    max_note_tokens = max_note_tokens or settings.ask_max_note_tokens
+    mmr_lambda = settings.ask_mmr_lambda if mmr_lambda is None else mmr_lambda
+    terms = query_terms(query)
+
+    use_mmr = query_embedding is not None and candidates and all(
+        c.get("embedding") is not None for c in candidates
+    )
+    if use_mmr:
+        rows = _unit_rows([c["embedding"] for c in candidates])
+        relevance = rows @ _unit_rows(query_embedding)
+        similarity = rows @ rows.T
+
+    remaining = list(range(len(candidates)))
+    chosen = []
+    items = []
+    used = 0
+
+    while remaining and len(items) < max_notes and budget - used >= MIN_SPAN_TOKENS:
+        if use_mmr:
+            def mmr_score(i):
+                redundancy = similarity[i, chosen].max() if chosen else 0.0
+                return mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+            pick = max(remaining, key=mmr_score)
+        else:
+            pick = remaining[0]
+        remaining.remove(pick)
+
+        if use_mmr and chosen and similarity[pick, chosen].max() >= settings.dedup_cosine_threshold:
+            continue  # Near-duplicate of a note already in context
+
+        candidate = candidates[pick]
+        span = best_span(candidate["content"], terms, min(max_note_tokens, budget - used))
+        tokens = estimate_tokens(span)
+        item = {k: v for k, v in candidate.items() if k != "embedding"}
+        item.update(content=span, tokens=tokens, trimmed=span != candidate["content"])
+        if use_mmr:
+            item["relevance"] = round(float(relevance[pick]), 4)
+        items.append(item)
+        chosen.append(pick)
+        used += tokens
+
+    return {"items": items, "tokens": used, "budget": budget, "candidates": len(candidates)}
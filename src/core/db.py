@@ -1,15 +1,69 @@
 from src.core.logger import setup_logger
+import heapq
+import re
+import threading
+import weakref
 import chromadb
-import ollama
 from .config import DB_PATH, MODELS
+from .gateway import ModelGateway, get_model_gateway
 
 logger = setup_logger(__name__)
 
+PAGE_SIZE = 256  # Notes per page when scanning the collection
+COLLECTION = "engram_memory"
+
+# Open handles per store path: a vault being reconfigured has one per live generation
+_handles = {}
+_handles_lock = threading.Lock()
+
 class VectorDB:
-    def __init__(self):
+    """
+    The live collection is tagged with the embedding model that built it
+    ("embed_model" in its metadata) and is always queried with that model.
+    When the configured model differs, `target_model` is set and an
+    EmbeddingMigration (src.core.migration) re-embeds into a shadow
+    collection before `promote` swaps it in.
+    """
+    def __init__(self, path=None, embed_model: str = None, gateway: ModelGateway = None):
+        self.path = path or DB_PATH
+        self.target_model = embed_model or MODELS["embed"]
+        self.gateway = gateway or get_model_gateway()
         # Initialize persistent client
-        self.client = chromadb.PersistentClient(path=str(DB_PATH))
-        self.collection = self.client.get_or_create_collection(name="engram_memory")
+        self.client = chromadb.PersistentClient(path=str(self.path))
+        self.collection = self.client.get_or_create_collection(name=COLLECTION)
+        # Untagged stores predate tagging; they were built with the configured model
+        self.embed_model = self.model_of(self.collection) or self._tag(self.collection, self.target_model)
+        self.migration = None  # Set by EmbeddingMigration while one runs
+        # Serializes store writes against the collection swap
+        self._write_lock = threading.RLock()
+        with _handles_lock:
+            _handles.setdefault(str(self.path), weakref.WeakSet()).add(self)
+
+    @staticmethod
+    def model_of(collection) -> str:
+        return (collection.metadata or {}).get("embed_model")
+
+    @staticmethod
+    def _tag(collection, model: str) -> str:
+        collection.modify(metadata={**(collection.metadata or {}), "embed_model": model})
+        return model
+
+    @property
+    def needs_migration(self) -> bool:
+        return self.embed_model != self.target_model
+
+    def _written(self, ids: list):
+        # Caller holds self._write_lock
+        if self.migration:
+            self.migration.mark_dirty(ids)
+
+    @staticmethod
+    def _sanitize_metadata(metadata: dict) -> dict:
+        # ChromaDB flat structure mostly supports strings/ints/floats
+        return {
+            k: (",".join(str(i) for i in v) if isinstance(v, list) else v)
+            for k, v in metadata.items()
+        }
 
     def add(self, content: str, metadata: dict, doc_id: str = None) -> None:
         """
@@ -18,40 +72,84 @@ class VectorDB:
         Otherwise generates one (not recommended for sync).
         """
         # Generate embedding
-        response = ollama.embeddings(model=MODELS["embed"], prompt=content)
-        embedding = response["embedding"]
+        model = self.embed_model
+        embedding = self.gateway.embeddings(model=model, prompt=content)["embedding"]
 
         # Ensure we have an ID
         if not doc_id:
             import time
             doc_id = f"{metadata.get('category')}_{int(time.time())}"
 
-        # Sanitize metadata (ChromaDB flat structure mostly supports strings/ints/floats)
-        sanitized_metadata = {
-            k: (",".join(str(i) for i in v) if isinstance(v, list) else v)
-            for k, v in metadata.items()
-        }
+        with self._write_lock:
+            if model != self.embed_model:
+                # The collection was swapped to a new model while embedding
+                embedding = self.embed(content)
+            self.collection.upsert(
+                ids=[doc_id],
+                embeddings=[embedding],
+                documents=[content],
+                metadatas=[self._sanitize_metadata(metadata)]
+            )
+            self._written([doc_id])
+        logger.debug(f"Memory stored: {doc_id}", extra={"sample_key": "db.add"})
 
-        self.collection.add(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[content],
-            metadatas=[sanitized_metadata]
-        )
-        logger.info(f"Memory stored: {doc_id}")
+    def add_many(self, items: list) -> None:
+        """
+        Embeds and upserts a batch of notes in one round trip each to Ollama and Chroma.
+        items: list of dicts with 'content', 'metadata' and 'doc_id'.
+        """
+        if not items:
+            return
+
+        # Items may carry an embedding already computed upstream (e.g. by the duplicate check),
+        # tagged with the model that produced it
+        model = self.embed_model
+        embeddings = self._embed_missing(items, model)
+
+        with self._write_lock:
+            if model != self.embed_model:
+                # The collection was swapped to a new model while embedding
+                embeddings = self._embed_missing(items, self.embed_model)
+            self.collection.upsert(
+                ids=[item["doc_id"] for item in items],
+                embeddings=embeddings,
+                documents=[item["content"] for item in items],
+                metadatas=[self._sanitize_metadata(item["metadata"]) for item in items]
+            )
+            self._written([item["doc_id"] for item in items])
+        logger.info(f"Memories stored (batch of {len(items)})")
 
-    def search(self, query: str, n_results=3):
+    def _embed_missing(self, items: list, model: str) -> list:
+        embeddings = [
+            item.get("embedding") if item.get("embed_model", model) == model else None
+            for item in items
+        ]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            response = self.gateway.embed(model=model, input=[items[i]["content"] for i in missing])
+            for i, embedding in zip(missing, response["embeddings"]):
+                embeddings[i] = embedding
+        return embeddings
+
+    def search(self, query: str, n_results=3, query_embedding: list = None, include_embeddings: bool = False):
         """
         Semantic search for the 'Ask' feature
         Returns list of dicts: {'content': str, 'metadata': dict}
+        (plus 'embedding' with include_embeddings, e.g. for diversity selection).
+        Pass query_embedding to reuse an already computed query vector.
         """
-        response = ollama.embeddings(model=MODELS["embed"], prompt=query)
-        embedding = response["embedding"]
+        embedding = query_embedding
+        if embedding is None:
+            response = self.gateway.embeddings(model=self.embed_model, prompt=query)
+            embedding = response["embedding"]
 
+        include = ['documents', 'metadatas', 'distances']
+        if include_embeddings:
+            include.append('embeddings')
         results = self.collection.query(
             query_embeddings=[embedding],
             n_results=n_results,
-            include=['documents', 'metadatas', 'distances']
+            include=include
         )
         
         # Zip documents and metadatas, filtering by distance
@@ -59,25 +157,131 @@ class VectorDB:
         if results['documents']:
             for i in range(len(results['documents'][0])):
                 dist = results['distances'][0][i]
-                logger.info(f"Search Result: {results['metadatas'][0][i].get('title')} (Distance: {dist})")
+                logger.debug(f"Search Result: {results['metadatas'][0][i].get('title')} (Distance: {dist})",
+                             extra={"sample_key": "db.search.result"})
                 
                 # Filter out irrelevant results 
                 # Adjusted threshold to 400 based on observed L2 distances
                 if dist > 400:
                     continue
                     
-                output.append({
+                hit = {
                     "id": results['ids'][0][i],
                     "content": results['documents'][0][i],
                     "metadata": results['metadatas'][0][i],
                     "distance": dist
-                })
+                }
+                if include_embeddings:
+                    hit["embedding"] = results['embeddings'][0][i]
+                output.append(hit)
 
         return output
 
+    def embed(self, content: str) -> list:
+        """
+        Returns the embedding for content without storing anything.
+        """
+        return self.gateway.embeddings(model=self.embed_model, prompt=content)["embedding"]
+
+    def nearest(self, embedding: list, n_results=3) -> list:
+        """
+        Nearest stored notes to an embedding, including their vectors.
+        """
+        if self.collection.count() == 0:
+            return []
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            include=['documents', 'metadatas', 'distances', 'embeddings']
+        )
+        return [{
+            "id": results['ids'][0][i],
+            "content": results['documents'][0][i],
+            "metadata": results['metadatas'][0][i],
+            "distance": results['distances'][0][i],
+            "embedding": results['embeddings'][0][i]
+        } for i in range(len(results['ids'][0]))]
+
+    def get_note(self, doc_id: str):
+        """
+        Returns a single stored note as {'id', 'content', 'metadata'}, or None.
+        """
+        results = self.collection.get(ids=[doc_id], include=['documents', 'metadatas'])
+        if not results['ids']:
+            return None
+        return {"id": doc_id, "content": results['documents'][0], "metadata": results['metadatas'][0]}
+
+    def lexical_search(self, query: str, n_results=3):
+        """
+        Keyword fallback used while the embedding model is unavailable.
+        Scores notes by query-term hits (title hits count double); no Ollama calls.
+        """
+        terms = {t for t in re.findall(r"\w+", query.lower()) if len(t) > 2}
+        if not terms:
+            return []
+
+        # Bounded top-n over a paged scan: memory stays flat however large the vault
+        top = []
+        for seq, note in enumerate(self.iter_notes(fields=("documents", "metadatas"))):
+            content = note["content"] or ""
+            meta = note["metadata"]
+            body_words = set(re.findall(r"\w+", content.lower()))
+            title_words = set(re.findall(r"\w+", str(meta.get('title', '')).lower()))
+            score = len(terms & body_words) + 2 * len(terms & title_words)
+            if not score:
+                continue
+            entry = (score, -seq, {"id": note["id"], "content": content, "metadata": meta, "score": score})
+            if len(top) < n_results:
+                heapq.heappush(top, entry)
+            elif entry[:2] > top[0][:2]:
+                heapq.heapreplace(top, entry)
+
+        return [item for _, _, item in sorted(top, key=lambda e: e[:2], reverse=True)]
+
+    def iter_notes(self, fields=("metadatas",), ids: list = None, page_size: int = PAGE_SIZE):
+        """
+        Streams stored notes page by page, so memory is bounded by one page.
+        fields: any of "documents", "metadatas", "embeddings"; empty for ids only.
+        ids: restrict to these notes (fetched in pages of the same size).
+        Yields {'id'} plus 'content' / 'metadata' / 'embedding' for the selected fields.
+        """
+        fields = list(fields)
+        offset = 0
+        while True:
+            if ids is None:
+                page = self.collection.get(include=fields, limit=page_size, offset=offset)
+            else:
+                chunk = ids[offset:offset + page_size]
+                if not chunk:
+                    return
+                page = self.collection.get(ids=chunk, include=fields)
+
+            page_ids = page['ids']
+            for i, doc_id in enumerate(page_ids):
+                note = {"id": doc_id}
+                if "documents" in fields:
+                    note["content"] = page['documents'][i]
+                if "metadatas" in fields:
+                    note["metadata"] = page['metadatas'][i] or {}
+                if "embeddings" in fields:
+                    note["embedding"] = page['embeddings'][i]
+                yield note
+
+            if ids is None and len(page_ids) < page_size:
+                return
+            offset += page_size
+
+    def iter_ids(self, page_size: int = PAGE_SIZE):
+        """
+        Streams every stored note id (no documents, metadata or vectors are loaded).
+        """
+        for note in self.iter_notes(fields=(), page_size=page_size):
+            yield note["id"]
+
     def get_all_notes(self):
         """
-        Retrieves all notes for the Graph View.
+        Retrieves all notes in one call (documents, metadata and ids).
+        Loads the whole collection; prefer iter_notes/iter_ids for scans.
         """
         results = self.collection.get()
         return results
@@ -86,16 +290,147 @@ class VectorDB:
         """
         Deletes a note by ID.
         """
-        self.collection.delete(ids=[doc_id])
+        with self._write_lock:
+            self.collection.delete(ids=[doc_id])
+            self._written([doc_id])
+
+    def close(self):
+        """
+        Releases this handle's reference to the path's shared Chroma system
+        (stopped, with its SQLite connections and caches, when the last handle
+        on the path closes).
+        """
+        with _handles_lock:
+            handles = _handles.get(str(self.path))
+            if handles is not None:
+                handles.discard(self)
+                if not handles:
+                    del _handles[str(self.path)]
+        with self._write_lock:
+            self.client.close()
 
     def reset(self):
         """
         Nukes the entire database for a fresh start.
         """
+        with self._write_lock:
+            self._stop_migration()
+            try:
+                self.client.delete_collection(COLLECTION)
+            except Exception:
+                pass # It might not exist
+
+            self.collection = self.client.get_or_create_collection(name=COLLECTION)
+            self.embed_model = self._tag(self.collection, self.target_model)
+        logger.info("Database reset complete.")
+
+    def detach(self, name: str):
+        """
+        Renames the live collection to `name` and starts an empty one in its
+        place. Instant whatever the size: nothing is copied or deleted.
+        """
+        with self._write_lock:
+            # A fresh store starts on the configured model; nothing left to migrate
+            self._stop_migration()
+            self.collection.modify(name=name)
+            self.collection = self.client.get_or_create_collection(name=COLLECTION)
+            self.embed_model = self._tag(self.collection, self.target_model)
+        logger.info(f"Collection detached as {name}")
+
+    def reattach(self, name: str) -> int:
+        """
+        Makes the detached collection `name` live again. Notes written to the
+        live collection since it was detached are carried over (they win on
+        id clashes). Returns how many were carried over.
+        """
+        with self._write_lock:
+            self._stop_migration()
+            detached = self.client.get_collection(name)
+            detached_model = self.model_of(detached) or self.embed_model
+            current = self.collection
+            carried = 0
+            for page in _pages(self.iter_notes(fields=("documents", "metadatas", "embeddings"))):
+                embeddings = [note["embedding"] for note in page]
+                if detached_model != self.embed_model:
+                    # Newer notes were embedded with another model; bring them into the restored space
+                    response = self.gateway.embed(model=detached_model, input=[note["content"] for note in page])
+                    embeddings = response["embeddings"]
+                detached.upsert(
+                    ids=[note["id"] for note in page],
+                    embeddings=embeddings,
+                    documents=[note["content"] for note in page],
+                    metadatas=[note["metadata"] or None for note in page]
+                )
+                carried += len(page)
+
+            self.client.delete_collection(current.name)
+            detached.modify(name=COLLECTION)
+            self.collection = detached
+            self.embed_model = detached_model
+        logger.info(f"Collection {name} reattached ({carried} newer notes carried over)")
+        return carried
+
+    def open_shadow(self, model: str):
+        """
+        The shadow collection being built for `model` (created on first use,
+        reused to resume an interrupted migration).
+        """
+        name = "shadow-" + re.sub(r"[^a-zA-Z0-9._-]", "-", model).strip("-._")
+        shadow = self.client.get_or_create_collection(name=name)
+        if self.model_of(shadow) != model:
+            self._tag(shadow, model)
+        return shadow
+
+    def promote(self, shadow):
+        """
+        Swaps a completed shadow collection in as the live one and drops the old
+        collection. Caller holds the write lock, so no write lands in between.
+        Other handles on the store (an older generation still draining) are
+        moved over first, so none is left on the dropped collection.
+        """
+        old = self.collection
+        retired = f"retired-{old.id}"
+        old.modify(name=retired)
+        shadow.modify(name=COLLECTION)
+        self.collection = shadow
+        self.embed_model = self.model_of(shadow)
+        for other in self._siblings():
+            with other._write_lock:
+                # Its writes in flight notice the model change and re-embed
+                other.collection = other.client.get_collection(COLLECTION)
+                other.embed_model = self.embed_model
+        self.drop(retired)
+        logger.info(f"Embedding model switched to {self.embed_model}")
+
+    def _siblings(self) -> list:
+        with _handles_lock:
+            return [other for other in _handles.get(str(self.path), ()) if other is not self]
+
+    def _stop_migration(self):
+        # Caller holds the write lock; the shadow no longer matches the store
+        if self.migration and self.migration.active:
+            self.migration.cancel(wait=False)
+
+    def has_collection(self, name: str) -> bool:
+        """Whether a (detached or shadow) collection called `name` exists."""
+        return name in {collection.name for collection in self.client.list_collections()}
+
+    def drop(self, name: str):
+        """
+        Deletes a detached collection.
+        """
         try:
-            self.client.delete_collection("engram_memory")
-        except Exception:
-            pass # It might not exist
-            
-        self.collection = self.client.get_or_create_collection(name="engram_memory")
-        logger.info("Database reset complete.")
\ No newline at end of file
+            self.client.delete_collection(name)
+        except Exception as e:
+            logger.warning(f"Failed to drop collection {name}: {e}")
+
+
+def _pages(notes, size: int = PAGE_SIZE):
+    page = []
+    for note in notes:
+        page.append(note)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,197 @@
+import hashlib
+import math
+import re
+import threading
+from .config import settings
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always collide
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE = (1 << 61) - 1
+# Fixed permutation coefficients so signatures are stable across processes
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE or 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    """Hashed word k-shingles of the normalized text."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < k:
+        words = words + [""] * (k - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + k]).encode(), digest_size=8).digest(), "big")
+        for i in range(len(words) - k + 1)
+    }
+
+
+def minhash(text: str) -> tuple:
+    hashed = shingles(text)
+    return tuple(min((a * h + b) % _MERSENNE for h in hashed) for a, b in _PERMS)
+
+
+def jaccard(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimated Jaccard similarity of the underlying shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def encode_signature(sig: tuple) -> str:
+    # Chroma metadata is flat, so the signature is stored as a hex string
+    return ",".join(format(v, "x") for v in sig)
+
+
+def decode_signature(value: str) -> tuple:
+    return tuple(int(v, 16) for v in value.split(","))
+
+
+def cosine(vec_a, vec_b) -> float:
+    dot = sum(x * y for x, y in zip(vec_a, vec_b))
+    norm = math.sqrt(sum(x * x for x in vec_a)) * math.sqrt(sum(y * y for y in vec_b))
+    return dot / norm if norm else 0.0
+
+
+class DuplicateIndex:
+    """
+    In-memory MinHash/LSH index over one vault's notes.
+    Signatures are persisted in each note's Chroma metadata ("minhash"), so the
+    index is rebuilt from the store on first use without re-reading the vault.
+    """
+    def __init__(self, db):
+        self.db = db
+        self._signatures = {}
+        self._buckets = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _bands(self, sig: tuple):
+        for band in range(BANDS):
+            yield band, hash(sig[band * ROWS:(band + 1) * ROWS])
+
+    def _insert(self, doc_id: str, sig: tuple):
+        self._signatures[doc_id] = sig
+        for key in self._bands(sig):
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def _remove(self, doc_id: str):
+        sig = self._signatures.pop(doc_id, None)
+        if sig is None:
+            return
+        for key in self._bands(sig):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            # Metadata pages only; documents are read just for notes saved before signatures existed
+            unsigned = []
+            for note in self.db.iter_notes(fields=("metadatas",)):
+                encoded = note["metadata"].get("minhash")
+                if encoded:
+                    self._insert(note["id"], decode_signature(encoded))
+                else:
+                    unsigned.append(note["id"])
+            for note in self.db.iter_notes(fields=("documents",), ids=unsigned):
+                self._insert(note["id"], minhash(note["content"] or ""))
+            self._loaded = True
+            logger.info(f"Duplicate index loaded: {len(self._signatures)} signatures")
+
+    def clear(self):
+        """
+        Drops every signature; the index reloads from the store on next use.
+        """
+        with self._lock:
+            self._signatures = {}
+            self._buckets = {}
+            self._loaded = False
+
+    def add(self, doc_id: str, sig: tuple):
+        self.ensure_loaded()
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, sig)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def similarity(self, sig: tuple, doc_id: str) -> float:
+        with self._lock:
+            other = self._signatures.get(doc_id)
+        return jaccard(sig, other) if other else 0.0
+
+    def matches(self, sig: tuple, exclude: str = None) -> list:
+        """
+        Returns (doc_id, jaccard) for LSH candidates, most similar first.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            candidates = set()
+            for key in self._bands(sig):
+                candidates |= self._buckets.get(key, set())
+            candidates.discard(exclude)
+            scored = [(doc_id, jaccard(sig, self._signatures[doc_id])) for doc_id in candidates]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+    def clusters(self, threshold: float) -> list:
+        """
+        Groups all indexed notes into near-duplicate clusters (size > 1).
+        """
+        self.ensure_loaded()
+        with self._lock:
+            doc_ids = list(self._signatures)
+
+        parent = {doc_id: doc_id for doc_id in doc_ids}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for doc_id in doc_ids:
+            for other, score in self.matches(self._signatures[doc_id], exclude=doc_id):
+                if score >= threshold and other in parent:
+                    parent[find(other)] = find(doc_id)
+
+        groups = {}
+        for doc_id in doc_ids:
+            groups.setdefault(find(doc_id), []).append(doc_id)
+        return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicate(index: DuplicateIndex, db, sig: tuple, embedding: list = None):
+    """
+    Checks a new note against its MinHash candidates and its nearest embedding
+    neighbours. Returns the best match above either threshold, or None.
+    """
+    best = None
+
+    matches = index.matches(sig)
+    if matches and matches[0][1] >= settings.dedup_jaccard_threshold:
+        best = {"doc_id": matches[0][0], "jaccard": matches[0][1], "cosine": None}
+
+    if embedding is not None:
+        for neighbour in db.nearest(embedding, n_results=3):
+            similarity = cosine(embedding, neighbour["embedding"])
+            if similarity < settings.dedup_cosine_threshold:
+                continue
+            if best is None:
+                best = {"doc_id": neighbour["id"], "jaccard": index.similarity(sig, neighbour["id"]), "cosine": similarity}
+            elif best["doc_id"] == neighbour["id"]:
+                best["cosine"] = similarity
+            break
+
+    return best
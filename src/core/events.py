@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Event types
+NODE_ADDED = "node.added"
+NODE_UPDATED = "node.updated"
+NODE_REMOVED = "node.removed"
+FOLDER_CHANGED = "folder.changed"  # Listing of `path` changed; clients re-list that folder
+RESYNC = "resync"  # Deltas were lost; clients must refetch their snapshot
+
+HISTORY_SIZE = 1000
+QUEUE_SIZE = 256
+
+
+class Subscription:
+    """
+    One connected client. Events are handed over from any thread onto the
+    subscriber's event loop. A consumer that falls too far behind has its
+    backlog replaced by a single resync event instead of blocking publishers.
+    """
+    def __init__(self, feed, loop: asyncio.AbstractEventLoop, vault: str = None):
+        self.feed = feed
+        self.loop = loop
+        self.vault = vault
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def wants(self, event: dict) -> bool:
+        return self.vault is None or event["vault"] == self.vault
+
+    def push(self, event: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Loop is gone (client's server shut down)
+            self.feed.unsubscribe(self)
+
+    def _put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"seq": event["seq"], "type": RESYNC, "vault": event["vault"], "ts": event["ts"]})
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """
+    In-process publish/subscribe of vault changes (served to clients as SSE).
+    Every event gets a sequence number and the last HISTORY_SIZE events are
+    kept, so a reconnecting client (Last-Event-ID) catches up on deltas
+    instead of refetching full snapshots.
+
+    Sequence numbers start at the process start time in microseconds, so an
+    id handed out before a restart is always below the new history and gets
+    a resync rather than a replay of unrelated events.
+    """
+    def __init__(self, history: int = HISTORY_SIZE):
+        self._seq = time.time_ns() // 1000
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, vault: str, **data) -> dict:
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "type": kind, "vault": vault, "ts": time.time(), **data}
+            self._history.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for subscriber in subscribers:
+            subscriber.push(event)
+        return event
+
+    def subscribe(self, vault: str = None, last_seq: int = None) -> Subscription:
+        """
+        Must be called on the event loop that will consume the subscription.
+        """
+        subscription = Subscription(self, asyncio.get_running_loop(), vault)
+        with self._lock:
+            if last_seq is not None and last_seq != self._seq:
+                oldest = self._history[0]["seq"] if self._history else self._seq + 1
+                # Ahead of us: the id came from another process (or the clock stepped back)
+                if last_seq < oldest - 1 or last_seq > self._seq:
+                    subscription._put({"seq": self._seq, "type": RESYNC, "vault": vault, "ts": time.time()})
+                else:
+                    for event in self._history:
+                        if event["seq"] > last_seq and subscription.wants(event):
+                            subscription._put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+class VaultChannel:
+    """A ChangeFeed bound to one vault, handed to the services that emit events."""
+    def __init__(self, feed: ChangeFeed, vault: str):
+        self.feed = feed
+        self.vault = vault
+
+    def publish(self, kind: str, **data) -> dict:
+        return self.feed.publish(kind, self.vault, **data)
+
+
+@lru_cache()
+def get_change_feed() -> ChangeFeed:
+    """Process-wide change feed shared by every vault"""
+    return ChangeFeed()
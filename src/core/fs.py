@@ -2,14 +2,41 @@ import os
 from datetime import datetime
 from pathlib import Path
 from .config import VAULT_ROOT
+from .notes import format_note, set_field
+
+def atomic_write(path: Path, text: str):
+    """
+    Writes text to path via a temp file + rename so readers (and a crash)
+    only ever see the old or the new content, never a torn write.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def find_notes(vault_root: Path, filename: str):
+    """
+    Yields files named `filename` anywhere in the vault, skipping Engram's own
+    .engram folder (journal, reset trash).
+    """
+    vault_root = Path(vault_root)
+    for path in vault_root.rglob(filename):
+        if ".engram" not in path.relative_to(vault_root).parts:
+            yield path
 
 class ObsidianWriter:
-    def save_note(self, content: str, metadata: dict):
+    def __init__(self, vault_root: Path = None):
+        self.vault_root = Path(vault_root or VAULT_ROOT)
+
+    def note_path(self, metadata: dict) -> Path:
         """
-        Writes the markdown file to the Vault Root.
+        Resolves the target path for a new note (Sanitized Title + Date).
         """
         # 1. Target is always Root
-        target_folder = VAULT_ROOT
+        target_folder = self.vault_root
         
         # 2. Create Filename (Sanitized Title + Date)
         safe_title = "".join(c for c in metadata['title'] if c.isalnum() or c in (' ', '_', '-')).rstrip()
@@ -18,41 +45,52 @@ class ObsidianWriter:
              safe_title = "Untitled"
         
         filename = f"{datetime.now().strftime('%Y%m%d')}_{safe_title}.md"
-        filepath = target_folder / filename
+        return target_folder / filename
 
-        # 3. Construct File Content with YAML Frontmatter
-        file_content = f"""---
-title: "{metadata['title']}"
-category: "{category}"
-tags: {metadata['tags']}
-created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-status: active
----
+    def save_note(self, content: str, metadata: dict, filepath: Path = None):
+        """
+        Writes the markdown file to the Vault Root.
+        """
+        if filepath is None:
+            filepath = self.note_path(metadata)
 
-{content}
+        # 3. Construct File Content with YAML Frontmatter
+        frontmatter = {
+            "title": metadata['title'],
+            "category": metadata.get('category', 'Inbox'),
+            "tags": metadata['tags'],
+            "created": datetime.now().replace(microsecond=0),
+            "status": "active"
+        }
+        file_content = format_note(frontmatter, f"""{content}
 
 ## Original Content
 ```text
 {metadata.get('original_text', '')}
 ```
-"""
+""")
 
         # 4. Write to Disk
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(file_content)
+        atomic_write(filepath, file_content)
             
         return filepath
 
+    def append_section(self, filepath: Path, section: str):
+        """
+        Appends a Markdown section (e.g. merged content) to an existing note.
+        """
+        with open(filepath, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        atomic_write(filepath, f"{content.rstrip()}\n\n{section}\n")
+        return filepath
+
     def update_note(self, filename: str, action: str, reason: str):
         """
         Updates an existing note based on action.
         filename: Can be just the name (e.g. '20250101_Bug.md') to search, or full path.
         """
-        found_path = None
-        for path in VAULT_ROOT.rglob(filename):
-            found_path = path
-            break
-        
+        found_path = next(find_notes(self.vault_root, filename), None)
         if not found_path:
             return None
 
@@ -61,14 +99,14 @@ status: active
 
         if action == "complete":
             # 1. Update YAML status
-            content = content.replace("status: active", "status: completed")
+            content = set_field(content, "status", "completed")
             
             # 2. Append update log
             update_log = f"\n\n## Update: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n**Status changed to Completed**\n*Reason: {reason}*\n"
             content += update_log
 
         elif action == "archive":
-            content = content.replace("status: active", "status: archived")
+            content = set_field(content, "status", "archived")
             update_log = f"\n\n## Update: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n**Archived**\n*Reason: {reason}*\n"
             content += update_log
 
@@ -76,8 +114,7 @@ status: active
              update_log = f"\n\n## Update: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n*Note: {reason}*\n"
              content += update_log
 
-        with open(found_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        atomic_write(found_path, content)
             
         return found_path
 
@@ -0,0 +1,333 @@
+import asyncio
+import random
+import threading
+import time
+from functools import lru_cache
+import httpx
+import ollama
+from .config import settings
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class ModelUnavailableError(Exception):
+    """Raised when Ollama is down (circuit open) or a call exhausted its retries."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    After `failure_threshold` consecutive failures calls fail fast for
+    `reset_timeout` seconds, then a single probe decides whether to close again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "Model gateway"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one probe through
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"{self.name} circuit closed (Ollama reachable again).")
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"{self.name} circuit opened after {self._failures} failures.")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def trip(self):
+        """Opens the circuit immediately (e.g. a failed health check)."""
+        with self._lock:
+            if self._state != self.OPEN:
+                logger.warning(f"{self.name} circuit opened by health check.")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, ollama.ResponseError):
+        return exc.status_code >= 500
+    return False
+
+
+class Endpoint:
+    """
+    One Ollama host in the chat pool: its own client, breaker and load stats.
+    """
+    def __init__(self, host: str, timeout: httpx.Timeout, limits: httpx.Limits):
+        self.host = host
+        self.client = ollama.AsyncClient(host=host, timeout=timeout, limits=limits)
+        self.breaker = CircuitBreaker(
+            settings.breaker_failure_threshold, settings.breaker_reset_s, name=f"Ollama {host or 'default'}"
+        )
+        self.outstanding = 0
+        self.latency = None  # EWMA of successful call durations (seconds)
+        self.served = 0
+        self.failed = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def observe(self, elapsed: float):
+        self.served += 1
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+    def describe(self) -> dict:
+        return {
+            "host": self.host or "default",
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "served": self.served,
+            "failed": self.failed
+        }
+
+
+class ModelGateway:
+    """
+    Single entry point for every Ollama call (chat and embeddings).
+    Embeddings go through one pooled sync client on the primary host, with
+    bounded retries with jitter and a circuit breaker.
+
+    Chat is load-balanced over a pool of endpoints (`ollama_host` plus
+    `ollama_hosts`): each call goes to the healthy endpoint with the fewest
+    outstanding requests, failures are retried on a different endpoint, calls
+    running far past an endpoint's usual latency are hedged on an idle one,
+    and a background health check takes dead hosts out of rotation.
+    """
+    def __init__(self, host: str = None, hosts: list = None):
+        self.host = host or settings.ollama_host
+        extra_hosts = settings.ollama_hosts if hosts is None else hosts
+        self.retries = settings.model_retries
+        self.backoff = settings.model_retry_backoff_s
+        self.chat_timeout = settings.chat_timeout_s
+        self.embed_timeout = settings.embed_timeout_s
+
+        limits = httpx.Limits(
+            max_connections=settings.model_max_connections,
+            max_keepalive_connections=settings.model_max_connections
+        )
+        connect = settings.model_connect_timeout_s
+        # Sync client serves embeddings, the endpoint pool serves chat
+        self.client = ollama.Client(
+            host=self.host, timeout=httpx.Timeout(self.embed_timeout, connect=connect), limits=limits
+        )
+        self.breaker = CircuitBreaker(settings.breaker_failure_threshold, settings.breaker_reset_s)
+
+        chat_timeout = httpx.Timeout(self.chat_timeout, connect=connect)
+        self.endpoints = [Endpoint(h, chat_timeout, limits) for h in dict.fromkeys([self.host, *extra_hosts])]
+        self.async_client = self.endpoints[0].client
+        self._health_task = None
+        self._health_loop_owner = None
+
+    @property
+    def available(self) -> bool:
+        """False while a circuit is open, i.e. callers should take the degraded path."""
+        return self.breaker.state != CircuitBreaker.OPEN and any(e.healthy for e in self.endpoints)
+
+    @property
+    def concurrency(self) -> int:
+        """How many chat calls the pool can usefully run at once (for bulk work)."""
+        return settings.model_parallel_per_endpoint * max(1, sum(e.healthy for e in self.endpoints))
+
+    def stats(self) -> list:
+        return [e.describe() for e in self.endpoints]
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter keeps retries from many requests from arriving in lockstep
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _call(self, fn, **kwargs):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise ModelUnavailableError("Model backend unavailable (circuit open)")
+            try:
+                result = fn(**kwargs)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not _is_retryable(e):
+                    # Ollama answered (e.g. unknown model), so the backend itself is up
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise ModelUnavailableError(f"Model call failed after {attempt + 1} attempts: {e}") from e
+                logger.warning(f"Model call failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(self._delay(attempt))
+
+    def _pick(self, exclude=(), idle_only: bool = False):
+        """
+        Least-outstanding-requests choice among healthy endpoints
+        (ties go to the historically faster one).
+        """
+        candidates = [
+            e for e in self.endpoints
+            if e not in exclude and e.healthy and (not idle_only or e.outstanding == 0)
+        ]
+        candidates.sort(key=lambda e: (e.outstanding, e.latency or 0.0))
+        for endpoint in candidates:
+            # allow() admits a single probe to an endpoint whose reset timeout elapsed
+            if endpoint.breaker.allow():
+                return endpoint
+        return None
+
+    async def _attempt(self, endpoint: Endpoint, kwargs: dict):
+        endpoint.outstanding += 1
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(endpoint.client.chat(**kwargs), timeout=self.chat_timeout)
+        except Exception as e:
+            if _is_retryable(e):
+                endpoint.failed += 1
+                endpoint.breaker.record_failure()
+            else:
+                # Ollama answered (e.g. unknown model), so the backend itself is up
+                endpoint.breaker.record_success()
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        endpoint.breaker.record_success()
+        endpoint.observe(time.monotonic() - start)
+        return result
+
+    def _hedge_delay(self, endpoint: Endpoint):
+        if len(self.endpoints) < 2:
+            return None
+        if endpoint.latency is None:
+            return settings.model_hedge_min_s
+        return max(settings.model_hedge_min_s, settings.model_hedge_factor * endpoint.latency)
+
+    async def _hedged(self, endpoint: Endpoint, tried: set, kwargs: dict):
+        """
+        Runs the call on `endpoint`; if it is still running after the hedge
+        delay, races a copy on an idle endpoint and keeps the first answer.
+        """
+        primary = asyncio.ensure_future(self._attempt(endpoint, kwargs))
+        delay = self._hedge_delay(endpoint)
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        backup_endpoint = None if done else self._pick(tried, idle_only=True)
+        if backup_endpoint is None:
+            return await primary
+
+        tried.add(backup_endpoint)
+        logger.info(f"Chat on {endpoint.host or 'default'} slow after {delay:.1f}s, "
+                    f"hedging on {backup_endpoint.host or 'default'}")
+        pending = {primary, asyncio.ensure_future(self._attempt(backup_endpoint, kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _ensure_health_checks(self):
+        if len(self.endpoints) < 2:
+            return
+        loop = asyncio.get_running_loop()
+        if self._health_loop_owner is loop and self._health_task and not self._health_task.done():
+            return
+        self._health_loop_owner = loop
+        self._health_task = loop.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(settings.model_health_interval_s)
+            await asyncio.gather(*(self._probe(e) for e in self.endpoints))
+
+    async def _probe(self, endpoint: Endpoint):
+        try:
+            await asyncio.wait_for(endpoint.client.list(), timeout=settings.model_connect_timeout_s)
+        except Exception as e:
+            logger.debug(f"Health check failed for {endpoint.host or 'default'}: {e}")
+            endpoint.breaker.trip()
+            return
+        if endpoint.breaker.state != CircuitBreaker.CLOSED:
+            endpoint.breaker.record_success()
+
+    async def chat(self, **kwargs):
+        self._ensure_health_checks()
+        tried = set()
+        for attempt in range(self.retries + 1):
+            # Prefer an endpoint this call has not failed on yet
+            endpoint = self._pick(tried) or self._pick()
+            if endpoint is None:
+                raise ModelUnavailableError("Model backend unavailable (all endpoints' circuits open)")
+            tried.add(endpoint)
+            try:
+                return await self._hedged(endpoint, tried, kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                if attempt == self.retries:
+                    raise ModelUnavailableError(f"Model call failed after {attempt + 1} attempts: {e}") from e
+                logger.warning(f"Chat on {endpoint.host or 'default'} failed (attempt {attempt + 1}), "
+                               f"redistributing: {e}")
+                if len(self.endpoints) == 1:
+                    await asyncio.sleep(self._delay(attempt))
+
+    async def warm(self, model: str, keep_alive: str):
+        """Loads `model` on every healthy endpoint so no host starts cold."""
+        healthy = [e for e in self.endpoints if e.healthy]
+        results = await asyncio.gather(
+            *(self._attempt(e, {"model": model, "messages": [], "keep_alive": keep_alive}) for e in healthy),
+            return_exceptions=True
+        )
+        for endpoint, result in zip(healthy, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up of {model} on {endpoint.host or 'default'} failed: {result}")
+        if healthy and all(isinstance(r, Exception) for r in results):
+            raise results[0]
+
+    def embeddings(self, model: str, prompt: str):
+        return self._call(self.client.embeddings, model=model, prompt=prompt)
+
+    def embed(self, model: str, input: list):
+        return self._call(self.client.embed, model=model, input=input)
+
+
+@lru_cache()
+def get_model_gateway() -> ModelGateway:
+    """Process-wide shared gateway (one connection pool per Ollama host)"""
+    return ModelGateway()
@@ -0,0 +1,233 @@
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from .config import JOURNAL_PATH, VAULT_ROOT, settings
+from .fs import atomic_write, find_notes
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class WriteJournal:
+    """
+    Write-ahead journal for the vault/vector-store dual write.
+
+    Every save or delete is recorded here (one JSON file per entry) before the
+    markdown file or Chroma is touched, and removed once both sides are done.
+    Anything still present at startup is an interrupted write and is replayed.
+    """
+    def __init__(self, path: Path = JOURNAL_PATH, vault_root: Path = VAULT_ROOT):
+        self.path = Path(path)
+        self.vault_root = Path(vault_root)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def record(self, op: str, doc_id: str, content: str = None, metadata: dict = None) -> dict:
+        """
+        Durably records an intended operation ('add' or 'delete') and returns the entry.
+        """
+        entry = {
+            "seq": time.time_ns(),
+            "op": op,
+            "doc_id": doc_id,
+            "content": content,
+            "metadata": metadata or {}
+        }
+        entry["file"] = f"{entry['seq']}_{doc_id}.json"
+        atomic_write(self.path / entry["file"], json.dumps(entry))
+        return entry
+
+    def complete(self, entry: dict):
+        """
+        Marks an entry as applied on both sides.
+        """
+        try:
+            os.remove(self.path / entry["file"])
+        except FileNotFoundError:
+            pass
+
+    def pending(self) -> list:
+        """
+        Returns unapplied entries in the order they were recorded.
+        """
+        entries = []
+        for entry_path in sorted(self.path.glob("*.json")):
+            try:
+                with open(entry_path, "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except Exception as e:
+                # A torn entry means the crash happened before the write began
+                logger.warning(f"Discarding unreadable journal entry {entry_path.name}: {e}")
+                os.remove(entry_path)
+        return entries
+
+    def replay(self, db) -> int:
+        """
+        Reconciles only the journaled entries against the vault and the vector store.
+        """
+        replayed = 0
+        for entry in self.pending():
+            doc_id = entry["doc_id"]
+            try:
+                if entry["op"] == "add":
+                    if any(find_notes(self.vault_root, doc_id)):
+                        db.add(content=entry["content"], metadata=entry["metadata"], doc_id=doc_id)
+                        replayed += 1
+                    else:
+                        # The markdown write never landed; nothing to index
+                        logger.info(f"Dropping journal entry for unwritten note: {doc_id}")
+                elif entry["op"] == "delete":
+                    db.delete_note(doc_id)
+                    for path in find_notes(self.vault_root, doc_id):
+                        os.remove(path)
+                    replayed += 1
+                self.complete(entry)
+            except Exception as e:
+                logger.error(f"Journal replay failed for {doc_id} (kept for next start): {e}")
+
+        if replayed:
+            logger.info(f"Journal replay complete: {replayed} entries reconciled.")
+        return replayed
+
+
+class GroupCommitter:
+    """
+    Batches vector-store writes from bursty saves into grouped commits.
+    A batch is flushed after `interval_ms` or once it holds `max_batch` notes,
+    whichever comes first. A failed batch is retried with backoff (the model
+    may be briefly down); entries are already journaled, so one still failing
+    at shutdown is picked up by the next replay.
+    """
+    def __init__(self, db, journal: WriteJournal,
+                 interval_ms: int = settings.commit_interval_ms,
+                 max_batch: int = settings.commit_batch_size):
+        self.db = db
+        self.journal = journal
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._pending = {}  # doc_id -> latest submitted entry not yet in the store
+        self._pending_lock = threading.Lock()
+        self._commit_lock = threading.Lock()  # Held while a batch is being written
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="engram-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry: dict):
+        with self._pending_lock:
+            self._pending[entry["doc_id"]] = entry
+        self._queue.put(entry)
+
+    def pending(self, doc_id: str):
+        """
+        The queued entry for doc_id, so readers see a save that is still
+        waiting for its group commit.
+        """
+        with self._pending_lock:
+            return self._pending.get(doc_id)
+
+    def discard(self, doc_id: str):
+        """
+        Drops a queued save of doc_id (the note is being deleted) and waits out
+        a batch already writing it, so the caller's delete lands last.
+        """
+        with self._pending_lock:
+            self._pending.pop(doc_id, None)
+        with self._commit_lock:
+            pass
+
+    def discard_all(self):
+        """
+        Drops every queued save and waits out a batch already writing.
+        """
+        with self._pending_lock:
+            self._pending.clear()
+        with self._commit_lock:
+            pass
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until everything submitted so far is in the store. Returns False
+        if that took longer than `timeout` (a batch is still being retried).
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """
+        Flushes whatever is queued and stops the commit thread.
+        """
+        self._closing.set()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            if isinstance(first, threading.Event):
+                first.set()
+                continue
+
+            batch = [first]
+            flushed = None  # A flush() waiting on this batch
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    flushed = item
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+            if flushed:
+                flushed.set()
+
+    def _commit(self, batch: list):
+        # Last write wins for repeated saves of the same note within a batch
+        latest = {entry["doc_id"]: entry for entry in batch}
+        delay = settings.commit_retry_s
+        while True:
+            with self._commit_lock:
+                # Skip entries superseded by a later save or discarded by a delete
+                with self._pending_lock:
+                    live = [entry for doc_id, entry in latest.items() if self._pending.get(doc_id) is entry]
+                try:
+                    if live:
+                        self.db.add_many(live)
+                    break
+                except Exception as e:
+                    error = e
+
+            if self._closing.is_set():
+                logger.error(f"Group commit of {len(live)} notes failed (left in journal): {error}")
+                # Readers fall back to the store again; the journal replay owns these now
+                self._release(latest)
+                return
+            logger.warning(f"Group commit of {len(live)} notes failed, retrying in {delay:.1f}s: {error}")
+            # Shutdown cuts the wait short for one last attempt
+            self._closing.wait(delay)
+            delay = min(delay * 2, settings.commit_retry_max_s)
+
+        for entry in batch:
+            self.journal.complete(entry)
+        self._release(latest)
+
+    def _release(self, latest: dict):
+        with self._pending_lock:
+            for doc_id, entry in latest.items():
+                if self._pending.get(doc_id) is entry:
+                    del self._pending[doc_id]
@@ -1,21 +1,164 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+import time
+from src.core.config import settings
 
-def setup_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    
-    if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.INFO)
-        
-        formatter = logging.Formatter(
+# Correlation id of the request being handled (set by the server middleware)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+QUEUE_SIZE = 10000
+
+_default_level = logging.INFO
+_loggers = {}
+_queue_handler = None
+_listener = None
+_init_lock = threading.Lock()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the current request id (runs on the caller's thread)."""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops most records tagged with a `sample_key` (hot-path lines pass
+    extra={"sample_key": ...}): keeps a random `rate` share, capped at
+    `max_per_second` per key. Untagged records always pass.
+    """
+    def __init__(self, rate: float, max_per_second: int):
+        super().__init__()
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        if random.random() >= self.rate:
+            return False
+        now = int(time.monotonic())
+        with self._lock:
+            second, count = self._windows.get(key, (now, 0))
+            if second != now:
+                second, count = now, 0
+            if count >= self.max_per_second:
+                return False
+            self._windows[key] = (second, count + 1)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            payload["request_id"] = record.request_id
+        if getattr(record, "sample_key", None):
+            payload["sampled"] = record.sample_key
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        handler.setFormatter(formatter)
-        
-        logger.addHandler(handler)
-    
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [req={request_id}]" if request_id else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: if the writer falls behind, records are dropped."""
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _init_pipeline():
+    """One background writer thread per process; loggers only enqueue."""
+    global _queue_handler, _listener, _default_level
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JSONFormatter() if settings.log_format == "json" else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    _queue_handler.addFilter(SamplingFilter(settings.log_sample_rate, settings.log_sample_max_per_s))
+
+    level = logging.getLevelName(str(settings.log_level).upper())
+    _default_level = level if isinstance(level, int) else logging.INFO
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def setup_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+
+    with _init_lock:
+        if _queue_handler is None:
+            _init_pipeline()
+
+        if name not in _loggers:
+            logger.setLevel(_default_level)
+            logger.addHandler(_queue_handler)
+            logger.propagate = False
+            _loggers[name] = logger
+
     return logger
+
+
+def set_log_level(level: str, name: str = None) -> dict:
+    """
+    Changes log levels at runtime. Without a name, applies to every Engram logger
+    (and to loggers created later).
+    """
+    global _default_level
+    numeric = logging.getLevelName(level.upper())
+    if not isinstance(numeric, int):
+        raise ValueError(f"Unknown log level: {level}")
+
+    with _init_lock:
+        if name:
+            if name not in _loggers:
+                raise ValueError(f"Unknown logger: {name}")
+            _loggers[name].setLevel(numeric)
+        else:
+            _default_level = numeric
+            for logger in _loggers.values():
+                logger.setLevel(numeric)
+    return get_log_levels()
+
+
+def get_log_levels() -> dict:
+    return {
+        "default": logging.getLevelName(_default_level),
+        "loggers": {name: logging.getLevelName(logger.level) for name, logger in sorted(_loggers.items())},
+        "dropped": DroppingQueueHandler.dropped
+    }
@@ -0,0 +1,264 @@
+import threading
+import time
+from .config import settings
+from .db import VectorDB, _pages
+from .gateway import ModelUnavailableError
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# States
+RUNNING = "running"
+WAITING = "waiting"  # Embedding model unavailable; resumes by itself
+COMPLETE = "complete"
+STOPPED = "stopped"  # Interrupted (vault closed); resumes from the shadow when reopened
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# One migration per store path: generations of the same vault share its shadow
+_running = {}
+_running_lock = threading.Lock()
+
+
+class EmbeddingMigration:
+    """
+    Moves a vault's vector store to a new embedding model without a search outage.
+
+    Notes are re-embedded in throttled batches into a shadow collection tagged
+    with the new model while /ask keeps querying the live collection. Writes
+    that land meanwhile are tracked and replayed into the shadow; the last few
+    are applied under the store's write lock, then the shadow is promoted in
+    one step. An interrupted migration resumes from the shadow's contents.
+    """
+    def __init__(self, db: VectorDB, target_model: str = None,
+                 batch_size: int = None, pause_s: float = None):
+        self.db = db
+        self.from_model = db.embed_model
+        self.to_model = target_model or db.target_model
+        self.batch_size = batch_size or settings.embed_migration_batch
+        self.pause_s = settings.embed_migration_pause_s if pause_s is None else pause_s
+
+        self.state = RUNNING
+        self.total = 0
+        self.migrated = 0
+        self.reused = 0
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cancelled = False
+        self._thread = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in (RUNNING, WAITING)
+
+    def start(self):
+        self.started = time.time()
+        self.db.migration = self
+        self._thread = threading.Thread(target=self._run, name="engram-embed-migration", daemon=True)
+        self._thread.start()
+        logger.info(f"Embedding migration started: {self.from_model} -> {self.to_model}")
+        return self
+
+    def mark_dirty(self, ids: list):
+        if self.active:
+            with self._lock:
+                self._dirty.update(ids)
+
+    def stop(self):
+        """
+        Stops the worker, keeping the shadow so a later run resumes from it.
+        """
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def cancel(self, wait: bool = True):
+        """
+        Abandons the migration and drops the shadow collection.
+        """
+        self._cancelled = True
+        self._stop.set()
+        if wait and self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def progress(self) -> dict:
+        elapsed = (self.finished or time.time()) - self.started if self.started else 0.0
+        rate = self.migrated / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.migrated - self.reused)
+        with self._lock:
+            pending_changes = len(self._dirty)
+        return {
+            "state": self.state,
+            "from_model": self.from_model,
+            "to_model": self.to_model,
+            "total": self.total,
+            "migrated": self.migrated,
+            "reused": self.reused,
+            "pending_changes": pending_changes,
+            "percent": round(100 * (self.total - remaining) / self.total, 1) if self.total else 100.0,
+            "rate_per_s": round(rate, 2),
+            "eta_s": round(remaining / rate) if rate and self.active else None,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error
+        }
+
+    def _embed(self, texts: list, wait: bool = True) -> list:
+        """
+        Embeds with the target model. Waits out model outages unless `wait` is
+        False; returns None if stopped (or the model is down and not waiting).
+        """
+        while not self._stop.is_set():
+            try:
+                embeddings = self.db.gateway.embed(model=self.to_model, input=texts)["embeddings"]
+                self.state = RUNNING
+                return embeddings
+            except ModelUnavailableError as e:
+                if self.state != WAITING:
+                    logger.warning(f"Embedding migration paused, model unavailable: {e}")
+                self.state = WAITING
+                if not wait:
+                    return None
+                self._stop.wait(settings.breaker_reset_s)
+        return None
+
+    def _copy(self, shadow, notes: list, wait: bool = True, count_reused: bool = True) -> bool:
+        """
+        Re-embeds notes into the shadow, skipping those it already holds unchanged.
+        Returns False if it could not finish (stopped, or model down and not waiting).
+        """
+        if not notes:
+            return True
+        by_id = {note["id"]: note for note in notes}
+        held = shadow.get(ids=list(by_id), include=["documents", "metadatas"])
+        unchanged = {
+            doc_id for doc_id, document, metadata in zip(held["ids"], held["documents"], held["metadatas"])
+            if by_id[doc_id]["content"] == document and (by_id[doc_id]["metadata"] or None) == metadata
+        }
+        todo = [note for note in notes if note["id"] not in unchanged]
+        if count_reused:
+            self.reused += len(notes) - len(todo)
+
+        for start in range(0, len(todo), self.batch_size):
+            batch = todo[start:start + self.batch_size]
+            embeddings = self._embed([note["content"] or "" for note in batch], wait=wait)
+            if embeddings is None:
+                return False
+            shadow.upsert(
+                ids=[note["id"] for note in batch],
+                embeddings=embeddings,
+                documents=[note["content"] for note in batch],
+                metadatas=[note["metadata"] or None for note in batch]
+            )
+            self.migrated += len(batch)
+            # Throttle: leave the embedding model to interactive requests between batches
+            # (not in the final catch-up, which runs with writers held)
+            if wait and self._stop.wait(self.pause_s):
+                return False
+        return True
+
+    def _sync(self, shadow, ids: set, wait: bool = True) -> bool:
+        """Brings notes written during the migration into the shadow."""
+        ids = list(ids)
+        live = list(self.db.iter_notes(fields=("documents", "metadatas"), ids=ids))
+        gone = set(ids) - {note["id"] for note in live}
+        if gone:
+            shadow.delete(ids=list(gone))
+        return self._copy(shadow, live, wait=wait)
+
+    def _run(self):
+        try:
+            shadow = self.db.open_shadow(self.to_model)
+
+            # The second pass only re-embeds what changed during the first, which also
+            # covers writes through other handles on this store (a generation still draining)
+            for verify in (False, True):
+                self.total = max(self.total, self.db.collection.count())
+                for page in _pages(self.db.iter_notes(fields=("documents", "metadatas"))):
+                    if self._stop.is_set() or not self._copy(shadow, page, count_reused=not verify):
+                        return
+            # Notes deleted before this run started may linger in a resumed shadow
+            live_ids = set(self.db.iter_ids())
+            stale = [doc_id for doc_id in _shadow_ids(shadow) if doc_id not in live_ids]
+            if stale:
+                shadow.delete(ids=stale)
+
+            while True:
+                # Catch up on concurrent writes until few enough remain to apply under the lock
+                while True:
+                    with self._lock:
+                        dirty, self._dirty = self._dirty, set()
+                    if len(dirty) <= self.batch_size:
+                        break
+                    if not self._sync(shadow, dirty):
+                        return
+
+                with self.db._write_lock:
+                    with self._lock:
+                        dirty |= self._dirty
+                        self._dirty = set()
+                    # Never wait out a model outage while holding up every writer
+                    if not self._stop.is_set() and self._sync(shadow, dirty, wait=False):
+                        self.state = COMPLETE
+                        self.finished = time.time()
+                        self.db.promote(shadow)
+                        break
+                    with self._lock:
+                        self._dirty |= dirty
+                if self._stop.wait(settings.breaker_reset_s):
+                    return
+            logger.info(f"Embedding migration complete: {self.migrated} notes re-embedded, "
+                        f"{self.reused} reused, in {self.finished - self.started:.1f}s")
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            self.finished = time.time()
+            logger.error(f"Embedding migration to {self.to_model} failed: {e}")
+        finally:
+            if self.active:
+                self.state = CANCELLED if self._cancelled else STOPPED
+                self.finished = time.time()
+            if self.state == CANCELLED:
+                self.db.drop(self.db.open_shadow(self.to_model).name)
+                logger.info(f"Embedding migration to {self.to_model} cancelled")
+
+
+def _shadow_ids(shadow):
+    offset = 0
+    while True:
+        page = shadow.get(include=[], limit=settings.embed_migration_batch * 8, offset=offset)
+        yield from page["ids"]
+        if not page["ids"]:
+            return
+        offset += len(page["ids"])
+
+
+def ensure_migration(db: VectorDB):
+    """
+    Starts (or resumes) moving `db` to its configured embedding model when the
+    live collection was built with another one. A migration still running for
+    the same store through an older handle is stopped first (this one resumes
+    from its shadow). Returns the running migration, if any.
+    """
+    key = str(db.path)
+    with _running_lock:
+        previous = _running.pop(key, None)
+    if previous and previous.active and previous.db is not db:
+        previous.stop()
+    elif previous and previous.active:
+        if previous.to_model == db.target_model:
+            with _running_lock:
+                _running[key] = previous
+            return previous
+        previous.cancel()
+
+    if not db.needs_migration:
+        return None
+    migration = EmbeddingMigration(db)
+    with _running_lock:
+        _running[key] = migration
+    return migration.start()
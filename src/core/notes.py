@@ -0,0 +1,229 @@
+import json
+import re
+from datetime import date, datetime
+from typing import NamedTuple
+import yaml
+
+# libyaml's loader when PyYAML was built with it; same results, several times faster
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_OPEN = re.compile(r"\ufeff?\s*---[ \t]*\r?\n")
+_CLOSE = re.compile(r"^---[ \t]*(?:\r?\n|\Z)", re.MULTILINE)
+_KEY = re.compile(r"[A-Za-z_][\w-]*")
+_PLAIN = re.compile(r"[A-Za-z][^:#\[\]{},\"'\t\r\n]*")
+_INT = re.compile(r"-?(?:0|[1-9][0-9]*)")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_AWKWARD = re.compile(r"[\x00-\x1f\x7f-\x9f\u2028\u2029\ufeff]")
+_FLOW_ITEM = re.compile(r"""\s*(?:'((?:[^']|'')*)'|"((?:[^"\\]|\\.)*)"|([^,'"\[\]{}]*?))\s*(,|$)""")
+# Plain words YAML 1.1 resolves to something other than a string
+_RESERVED = {"yes", "no", "true", "false", "on", "off", "null"}
+_KEYWORDS = {
+    "~": None, "null": None, "Null": None, "NULL": None,
+    **{variant: value
+       for word, value in (("yes", True), ("no", False), ("true", True), ("false", False), ("on", True), ("off", False))
+       for variant in (word, word.capitalize(), word.upper())}
+}
+
+_SLOW = object()  # Fast path gives up; the YAML loader decides
+
+
+class NoteFormatError(ValueError):
+    """Raised when a note's frontmatter is not a valid YAML mapping."""
+
+
+class Note(NamedTuple):
+    metadata: dict
+    body: str  # Without the frontmatter, stripped
+    frontmatter: bool  # Whether the file had a frontmatter block at all
+
+    def heading(self) -> str:
+        """Text of the body's first H1 ("# Title"), or None."""
+        body = self.body
+        pos = 0
+        while True:
+            if body.startswith("#", pos) and body[pos + 1:pos + 2] in (" ", "\t"):
+                end = body.find("\n", pos)
+                title = body[pos + 2:end if end >= 0 else None].strip()
+                if title:
+                    return title
+            pos = body.find("\n#", pos) + 1
+            if pos == 0:
+                return None
+
+
+def parse_note(text: str) -> Note:
+    """
+    Splits a note into frontmatter metadata and body in one pass. Frontmatter
+    must open the file (leading blank lines are tolerated); Engram's own
+    key/value format is read without YAML, anything else goes to the loader.
+    """
+    opening = _OPEN.match(text)
+    if not opening:
+        return Note({}, text, False)
+    closing = _CLOSE.search(text, opening.end())
+    if not closing:
+        return Note({}, text, False)
+    block = text[opening.end():closing.start()]
+    return Note(load_frontmatter(block), text[closing.end():].strip(), True)
+
+
+def load_frontmatter(block: str) -> dict:
+    metadata = _load_fast(block)
+    if metadata is _SLOW:
+        try:
+            metadata = yaml.load(block, Loader=YAML_LOADER)
+        except yaml.YAMLError as e:
+            raise NoteFormatError(str(e)) from e
+        if metadata is None:
+            return {}
+        if not isinstance(metadata, dict):
+            raise NoteFormatError(f"frontmatter is a {type(metadata).__name__}, not a mapping")
+    return metadata
+
+
+def _load_fast(block: str):
+    metadata = {}
+    for line in block.split("\n"):
+        if _AWKWARD.search(line, 0, len(line) - line.endswith("\r")):
+            return _SLOW  # Tabs, stray line breaks, control characters: YAML's rules apply
+        line = line.rstrip()
+        if not line:
+            continue
+        colon = line.find(":")
+        if colon <= 0 or not _KEY.fullmatch(line, 0, colon):
+            return _SLOW  # Indented, a comment, a list item, a multi-line value...
+        if colon + 1 < len(line) and line[colon + 1] != " ":
+            return _SLOW
+        value = _scalar(line[colon + 1:].strip())
+        if value is _SLOW:
+            return _SLOW
+        metadata[line[:colon]] = value
+    return metadata
+
+
+def _scalar(value: str):
+    if not value:
+        return None
+    first = value[0]
+    if first == '"':
+        try:
+            result = json.loads(value)  # JSON strings are valid YAML double-quoted scalars
+        except ValueError:
+            return _SLOW
+        return result if isinstance(result, str) else _SLOW
+    if first == "'":
+        if len(value) < 2 or value[-1] != "'" or "'" in value[1:-1].replace("''", ""):
+            return _SLOW
+        return value[1:-1].replace("''", "'")
+    if first == "[":
+        return _flow_list(value)
+    if value in _KEYWORDS:
+        return _KEYWORDS[value]
+    if _PLAIN.fullmatch(value):
+        return _SLOW if value.lower() in _RESERVED else value
+    if _INT.fullmatch(value):
+        return int(value)
+    try:
+        if _DATETIME.fullmatch(value):
+            return datetime(int(value[:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        if _DATE.fullmatch(value):
+            return date(int(value[:4]), int(value[5:7]), int(value[8:10]))
+    except ValueError:
+        return _SLOW  # Out-of-range field; let YAML report it
+    return _SLOW
+
+
+def _flow_list(value: str):
+    """Flow sequences of strings: JSON (["a", "b"]) or Python-style (['a', 'b'])."""
+    if value[-1] != "]":
+        return _SLOW
+    inner = value[1:-1]
+    if not inner.strip():
+        return []
+    items = []
+    pos = 0
+    while pos < len(inner):
+        match = _FLOW_ITEM.match(inner, pos)
+        if not match or match.end() == pos:
+            return _SLOW
+        single, double, plain, comma = match.groups()
+        if single is not None:
+            items.append(single.replace("''", "'"))
+        elif double is not None:
+            try:
+                items.append(json.loads(f'"{double}"'))
+            except ValueError:
+                return _SLOW
+        elif plain and _PLAIN.fullmatch(plain) and plain.lower() not in _RESERVED:
+            items.append(plain)
+        else:
+            return _SLOW
+        pos = match.end()
+        if not comma:
+            break
+    return items if pos >= len(inner) else _SLOW
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return "[" + ", ".join(_quote(str(item)) for item in value) + "]"
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    value = str(value)
+    if _PLAIN.fullmatch(value) and value.lower() not in _RESERVED and value == value.rstrip() \
+            and not _AWKWARD.search(value):
+        return value
+    return _quote(value)
+
+
+def _quote(value: str) -> str:
+    """JSON string, which YAML reads as a double-quoted scalar; non-printables escaped."""
+    if not _AWKWARD.search(value):
+        return json.dumps(value, ensure_ascii=False)
+    return json.dumps(value).replace("\x7f", "\\u007f")
+
+
+def format_frontmatter(metadata: dict) -> str:
+    """
+    Engram's canonical frontmatter: one `key: value` line per field, in the
+    given order. Strings are bare when YAML would read them back unchanged and
+    double-quoted otherwise; lists are JSON arrays of strings; datetimes are
+    "YYYY-MM-DD HH:MM:SS". parse_note reads it back without the YAML loader.
+    """
+    lines = [f"{key}: {_format_value(value)}" for key, value in metadata.items()]
+    return "---\n" + "\n".join(lines) + "\n---\n"
+
+
+def format_note(metadata: dict, body: str) -> str:
+    return f"{format_frontmatter(metadata)}\n{body}"
+
+
+def set_field(text: str, key: str, value) -> str:
+    """
+    Sets one frontmatter field, leaving every other line of the note as it
+    was. Notes without frontmatter are returned unchanged.
+    """
+    opening = _OPEN.match(text)
+    closing = _CLOSE.search(text, opening.end()) if opening else None
+    if not closing:
+        return text
+    line = f"{key}: {_format_value(value)}"
+    block = text[opening.end():closing.start()]
+    field = re.compile(rf"^{re.escape(key)}:.*$", re.MULTILINE)
+    if field.search(block):
+        block = field.sub(lambda _: line, block, count=1)
+    else:
+        block = block.rstrip("\n") + "\n" + line + "\n" if block.strip() else line + "\n"
+    return text[:opening.end()] + block + text[closing.start():]
@@ -0,0 +1,257 @@
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from functools import lru_cache
+from .config import settings
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+MODES = (CPROFILE, SAMPLE)
+
+
+class ProfileArm:
+    """
+    A standing request to profile matching requests: the next `count` of
+    them, or (with `threshold_ms`) the next `count` that turn out slower
+    than the threshold.
+    """
+    def __init__(self, route: str, count: int = 1, threshold_ms: float = None,
+                 mode: str = None, method: str = None):
+        if mode is None:
+            # Threshold arms profile every matching request, so default to the cheap sampler
+            mode = SAMPLE if threshold_ms else CPROFILE
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode} (expected one of {', '.join(MODES)})")
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        self.id = uuid.uuid4().hex[:8]
+        self.route = route
+        self.method = method.upper() if method else None
+        self.remaining = count
+        self.threshold_ms = threshold_ms
+        self.mode = mode
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method and method != self.method:
+            return False
+        if self.route.endswith("*"):
+            return path.startswith(self.route[:-1])
+        return path == self.route
+
+    def describe(self) -> dict:
+        return {"id": self.id, "route": self.route, "method": self.method, "remaining": self.remaining,
+                "threshold_ms": self.threshold_ms, "mode": self.mode}
+
+
+class StackSampler:
+    """
+    Wall-clock sampler over every thread (event loop and worker threads alike).
+    One background thread serves all active captures and stops when none are left.
+    """
+    def __init__(self, interval_s: float):
+        self.interval = interval_s
+        self._captures = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, capture: "Capture"):
+        with self._lock:
+            self._captures.add(capture)
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="engram-stack-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, capture: "Capture"):
+        with self._lock:
+            self._captures.discard(capture)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                captures = list(self._captures)
+                if not captures:
+                    self._thread = None
+                    return
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(stack)))
+            for capture in captures:
+                capture.samples.update(stacks)
+            time.sleep(self.interval)
+
+
+class Capture:
+    """One profiled request in progress."""
+    def __init__(self, profiler: "Profiler", arm: ProfileArm, method: str, path: str, request_id: str):
+        self.profiler = profiler
+        self.arm = arm
+        self.method = method
+        self.path = path
+        self.request_id = request_id
+        self.mode = arm.mode
+        self.samples = Counter()
+        self._profile = None
+        self._started = time.perf_counter()
+
+    def start(self):
+        if self.mode == CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self.profiler.sampler.add(self)
+        self._started = time.perf_counter()
+
+    def finish(self, status: int):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        if self.mode == CPROFILE:
+            self._profile.disable()
+        else:
+            self.profiler.sampler.remove(self)
+        self.profiler._finished(self, status, elapsed_ms)
+
+    def result(self, status: int, elapsed_ms: float) -> dict:
+        entry = {
+            "id": uuid.uuid4().hex[:12],
+            "arm": self.arm.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "mode": self.mode,
+            "request_id": self.request_id,
+            "captured": time.time()
+        }
+        if self.mode == CPROFILE:
+            # Same bytes pstats.Stats.dump_stats writes, so `pstats`/snakeviz load the download
+            entry["pstats"] = marshal.dumps(pstats.Stats(self._profile).stats)
+        else:
+            entry["collapsed"] = dict(self.samples)
+        return entry
+
+
+class Profiler:
+    """
+    Opt-in request profiling. Arms select requests by route; finished
+    profiles go into a bounded ring (`profile_ring_size`), newest last.
+
+    cProfile follows only the event-loop thread, so other requests interleaved
+    on the loop show up in it and work handed to worker threads does not; the
+    sampler sees every thread but is wall-clock and process-wide. Only one
+    cProfile capture runs at a time; matching requests meanwhile go unprofiled.
+    """
+    def __init__(self):
+        self.sampler = StackSampler(settings.profile_sample_interval_ms / 1000)
+        self._arms = []
+        self._ring = deque(maxlen=settings.profile_ring_size)
+        self._lock = threading.Lock()
+        self._cprofile_busy = False
+
+    @property
+    def armed(self) -> bool:
+        return bool(self._arms)
+
+    def arm(self, route: str, count: int = 1, threshold_ms: float = None,
+            mode: str = None, method: str = None) -> dict:
+        arm = ProfileArm(route, count=count, threshold_ms=threshold_ms, mode=mode, method=method)
+        with self._lock:
+            self._arms.append(arm)
+        logger.info(f"Profiling armed: {arm.describe()}")
+        return arm.describe()
+
+    def disarm(self, arm_id: str = None) -> int:
+        with self._lock:
+            before = len(self._arms)
+            self._arms = [a for a in self._arms if arm_id is not None and a.id != arm_id]
+            return before - len(self._arms)
+
+    def begin(self, method: str, path: str, request_id: str = None):
+        """
+        Returns a started Capture if an arm wants this request, else None.
+        """
+        with self._lock:
+            for arm in self._arms:
+                if not arm.matches(method, path):
+                    continue
+                if arm.mode == CPROFILE:
+                    if self._cprofile_busy:
+                        # Only one cProfile at a time; a later sampling arm may still take it
+                        continue
+                    self._cprofile_busy = True
+                if not arm.threshold_ms:
+                    # "Next N" arms claim their slot up front so concurrent requests do not overshoot
+                    arm.remaining -= 1
+                    if arm.remaining <= 0:
+                        self._arms.remove(arm)
+                break
+            else:
+                return None
+        capture = Capture(self, arm, method, path, request_id)
+        capture.start()
+        return capture
+
+    def _finished(self, capture: Capture, status: int, elapsed_ms: float):
+        arm = capture.arm
+        with self._lock:
+            if capture.mode == CPROFILE:
+                self._cprofile_busy = False
+            if arm.threshold_ms:
+                if elapsed_ms < arm.threshold_ms or arm not in self._arms:
+                    return
+                arm.remaining -= 1
+                if arm.remaining <= 0:
+                    self._arms.remove(arm)
+        entry = capture.result(status, elapsed_ms)
+        with self._lock:
+            self._ring.append(entry)
+        logger.info(f"Profile captured: {capture.method} {capture.path} {elapsed_ms:.0f}ms ({capture.mode})")
+
+    def list(self) -> dict:
+        with self._lock:
+            return {
+                "arms": [arm.describe() for arm in self._arms],
+                "profiles": [
+                    {k: v for k, v in entry.items() if k not in ("pstats", "collapsed")}
+                    for entry in reversed(self._ring)
+                ]
+            }
+
+    def get(self, profile_id: str) -> dict:
+        with self._lock:
+            for entry in self._ring:
+                if entry["id"] == profile_id:
+                    return entry
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+
+
+def collapsed(entry: dict) -> str:
+    """Brendan Gregg's folded format ("frame;frame;frame count"), for flamegraph.pl / speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(entry["collapsed"].items()))
+
+
+@lru_cache()
+def get_profiler() -> Profiler:
+    """Process-wide profiler (arms and the ring of captured profiles)"""
+    return Profiler()
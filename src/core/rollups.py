@@ -0,0 +1,363 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from .config import settings
+from .context import CHARS_PER_TOKEN
+from .fs import atomic_write
+from .gateway import ModelUnavailableError
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ROLLUP_FILE = "rollups.json"
+ROLLUP_VERSION = 2  # Bumped when the bucket kinds change; older files are rebuilt
+CATEGORY = "category"
+WEEK = "week"
+CATEGORY_WEEK = "category-week"  # "Work/Tech|2026-W42": one category within one week
+
+_BROAD = re.compile(
+    r"\b(summar\w*|overview|recap|highlights?|themes?|progress|worked on|working on|"
+    r"what (did|have|was) i|what's been|what has been|been up to)\b"
+)
+_LAST_N_WEEKS = re.compile(r"\b(?:last|past) (\d{1,2}) weeks\b")
+
+
+def week_of(created) -> str:
+    """ISO week bucket ("2026-W42") of a note's created timestamp, or None."""
+    try:
+        day = date.fromisoformat(str(created)[:10])
+    except ValueError:
+        return None
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def bucket_keys(metadata: dict) -> set:
+    category = metadata.get('category') or 'Inbox'
+    keys = {f"{CATEGORY}:{category}"}
+    week = week_of(metadata.get("created"))
+    if week:
+        keys.add(f"{WEEK}:{week}")
+        keys.add(f"{CATEGORY_WEEK}:{category}|{week}")
+    return keys
+
+
+def _weeks_between(start: date, end: date) -> list:
+    """Week buckets from `end` back to `start`, newest first."""
+    weeks = []
+    day = end
+    while day >= start:
+        weeks.append(week_of(day.isoformat()))
+        day -= timedelta(days=7)
+    if week_of(start.isoformat()) not in weeks:
+        weeks.append(week_of(start.isoformat()))
+    return weeks
+
+
+def temporal_weeks(query: str, today: date = None) -> list:
+    """Week buckets a question refers to ("this month", "last week", ...), newest first."""
+    today = today or date.today()
+    text = query.lower()
+    if "this week" in text:
+        return [week_of(today.isoformat())]
+    if "last week" in text or "past week" in text:
+        return [week_of((today - timedelta(days=7)).isoformat())]
+    match = _LAST_N_WEEKS.search(text)
+    if match:
+        return _weeks_between(today - timedelta(weeks=int(match.group(1)) - 1), today)
+    if "this month" in text:
+        return _weeks_between(today.replace(day=1), today)
+    if "last month" in text or "past month" in text:
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return _weeks_between(last_day.replace(day=1), last_day)
+    if re.search(r"\b(recently|lately)\b", text):
+        return _weeks_between(today - timedelta(days=13), today)
+    return []
+
+
+class RollupIndex:
+    """
+    Cached map-reduce summaries of a vault, per category, per ISO week and per
+    category within a week.
+
+    Writes only mark the buckets they touch; a background task (debounced by
+    `rollup_debounce_s`) re-summarizes those buckets. Each bucket's notes are
+    summarized in fixed chunks (map) whose results are cached by content
+    digest, then the chunk summaries are combined (reduce), so an edit costs
+    one chunk plus the reduce rather than the whole bucket. Rollups are kept
+    in `.engram/rollups.json` and let /ask answer broad or temporal questions
+    from a few short summaries instead of many notes.
+    """
+    def __init__(self, path: Path, db, agent, loop: asyncio.AbstractEventLoop = None):
+        self.path = Path(path)
+        self.db = db
+        self.agent = agent
+        self._dirty = set()
+        # No rollup file yet (new feature on an existing vault): build everything on first use
+        self._full = not self.path.exists()
+        self._buckets = self._read()
+        self._lock = threading.Lock()
+        # Saves and deletes touch buckets from worker threads; refreshes are started on this loop
+        self._loop = loop
+        self._task = None
+        self._closed = False
+
+    def _read(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version", 1) < ROLLUP_VERSION:
+                # Written before the current bucket kinds existed; chunk summaries are still reused
+                self._full = True
+            return data.get("buckets", {})
+        except Exception as e:
+            logger.warning(f"Failed to load rollups, rebuilding: {e}")
+            self._full = True
+            return {}
+
+    def _write(self):
+        with self._lock:
+            payload = json.dumps({"version": ROLLUP_VERSION, "buckets": self._buckets}, indent=2)
+        atomic_write(self.path, payload)
+
+    def reload(self):
+        """Re-reads the rollup file (e.g. restored by an undone reset) and refreshes everything."""
+        with self._lock:
+            self._buckets = self._read()
+        self.touch_all()
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+            self._dirty = set()
+            self._full = False
+
+    # --- Invalidation ---
+
+    def touch(self, *metadatas):
+        """Marks the buckets of the given notes' metadata for refresh."""
+        with self._lock:
+            for metadata in metadatas:
+                if metadata:
+                    self._dirty |= bucket_keys(metadata)
+        self._kick()
+
+    def touch_all(self):
+        with self._lock:
+            self._full = True
+        self._kick()
+
+    def _kick(self):
+        if not settings.rollups_enabled or self._closed:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread: hand over to the loop we last ran on
+            if self._loop and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._start)
+            return
+        self._loop = loop
+        self._start()
+
+    def _start(self):
+        if self._task and not self._task.done():
+            return
+        # Fresh context: the worker outlives the request that happened to start it
+        self._task = asyncio.get_running_loop().create_task(self._worker(), context=contextvars.Context())
+
+    async def _worker(self):
+        while not self._closed:
+            await asyncio.sleep(settings.rollup_debounce_s)
+            with self._lock:
+                keys, self._dirty = self._dirty, set()
+                full, self._full = self._full, False
+            if not keys and not full:
+                return
+            try:
+                await self.refresh(None if full else keys)
+            except ModelUnavailableError as e:
+                logger.warning(f"Rollup refresh postponed, model unavailable: {e}")
+                with self._lock:
+                    self._dirty |= keys
+                    self._full |= full
+                await asyncio.sleep(settings.breaker_reset_s)
+            except Exception as e:
+                logger.error(f"Rollup refresh failed: {e}")
+
+    def close(self):
+        self._closed = True
+        if self._task and not self._task.done() and self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    # --- Refresh (map-reduce) ---
+
+    def _members(self, keys: set = None) -> dict:
+        """
+        One paged metadata scan: bucket key -> note ids, oldest first.
+        keys None means every bucket.
+        """
+        members = {key: [] for key in keys} if keys is not None else {}
+        for note in self.db.iter_notes(fields=("metadatas",)):
+            for key in bucket_keys(note["metadata"]):
+                if keys is None or key in keys:
+                    members.setdefault(key, []).append((str(note["metadata"].get("created", "")), note["id"]))
+        return {key: [doc_id for _, doc_id in sorted(notes)] for key, notes in members.items()}
+
+    async def refresh(self, keys: set = None):
+        """Re-summarizes the given buckets (all when None)."""
+        started = time.monotonic()
+        members = await asyncio.to_thread(self._members, keys)
+        if keys is None:
+            # Buckets whose notes are all gone
+            with self._lock:
+                members.update({key: [] for key in self._buckets if key not in members})
+
+        calls = 0
+        for key, ids in sorted(members.items()):
+            calls += await self._refresh_bucket(key, ids)
+            await asyncio.to_thread(self._write)
+        logger.info(f"Rollups refreshed: {len(members)} buckets, {calls} model calls "
+                    f"in {time.monotonic() - started:.1f}s")
+
+    def _note_text(self, note: dict) -> str:
+        limit = settings.rollup_note_tokens * CHARS_PER_TOKEN
+        content = (note["content"] or "").strip()
+        if len(content) > limit:
+            content = content[:limit].rstrip() + "…"
+        meta = note["metadata"]
+        return f"[{str(meta.get('created', ''))[:10]}] {meta.get('title', note['id'])}\n{content}"
+
+    async def _refresh_bucket(self, key: str, ids: list) -> int:
+        if not ids:
+            with self._lock:
+                self._buckets.pop(key, None)
+            return 0
+
+        kind, label = key.split(":", 1)
+        category = label if kind == CATEGORY else None
+        if kind == CATEGORY_WEEK:
+            category, week = label.rsplit("|", 1)
+            label = f"{category}, week {week}"
+        notes = await asyncio.to_thread(
+            lambda: list(self.db.iter_notes(fields=("documents", "metadatas"), ids=ids))
+        )
+        # The store returns them in its own order; chunks must stay stable (oldest first)
+        order = {doc_id: i for i, doc_id in enumerate(ids)}
+        notes.sort(key=lambda note: order[note["id"]])
+        if not notes:
+            with self._lock:
+                self._buckets.pop(key, None)
+            return 0
+        with self._lock:
+            previous = self._buckets.get(key, {})
+        cache = {chunk["digest"]: chunk["summary"] for chunk in previous.get("chunks", [])}
+        size = settings.rollup_chunk_notes
+        calls = 0
+
+        # Map: chunk summaries, reused while a chunk's notes are unchanged
+        chunks = []
+        for start in range(0, len(notes), size):
+            texts = [self._note_text(note) for note in notes[start:start + size]]
+            digest = hashlib.sha1("\n\x00".join(texts).encode()).hexdigest()
+            summary = cache.get(digest)
+            if summary is None:
+                summary = await self.agent.summarize(label, texts)
+                calls += 1
+            chunks.append({"digest": digest, "summary": summary})
+
+        # Reduce: combine chunk summaries (in rounds when there are many)
+        partials = [chunk["summary"] for chunk in chunks]
+        reduce_digest = hashlib.sha1("\n\x00".join(partials).encode()).hexdigest()
+        if len(partials) == 1:
+            summary = partials[0]
+        elif previous.get("reduce_digest") == reduce_digest:
+            summary = previous["summary"]
+        else:
+            while len(partials) > 1:
+                rounds = []
+                for start in range(0, len(partials), size):
+                    group = partials[start:start + size]
+                    if len(group) > 1:
+                        group = [await self.agent.summarize(label, group, combine=True)]
+                        calls += 1
+                    rounds.append(group[0])
+                partials = rounds
+            summary = partials[0]
+
+        with self._lock:
+            self._buckets[key] = {
+                "kind": kind,
+                "label": label,
+                "category": category,
+                "summary": summary,
+                "notes": len(notes),
+                "first": str(notes[0]["metadata"].get("created", ""))[:10],
+                "last": str(notes[-1]["metadata"].get("created", ""))[:10],
+                "updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "chunks": chunks,
+                "reduce_digest": reduce_digest
+            }
+        return calls
+
+    # --- Query side ---
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket:
+                return dict(bucket, key=key, stale=key in self._dirty or self._full)
+        return None
+
+    def categories(self) -> list:
+        with self._lock:
+            return [b["label"] for b in self._buckets.values() if b["kind"] == CATEGORY]
+
+    def route(self, query: str, today: date = None) -> list:
+        """
+        Rollups that answer a broad or temporal question, or [] when the question
+        is specific (normal retrieval is better). Buckets not built yet are skipped.
+        """
+        if self._full:
+            self._kick()
+        text = query.lower()
+        weeks = temporal_weeks(query, today)
+        categories = [
+            label for label in self.categories()
+            if label.lower() in text or re.search(rf"\b{re.escape(label.split('/')[-1].lower())}\b", text)
+        ]
+        broad = bool(_BROAD.search(text))
+
+        if weeks and categories:
+            # Only those categories within those weeks, newest week first
+            keys = [f"{CATEGORY_WEEK}:{c}|{week}" for week in weeks for c in categories]
+        elif weeks:
+            keys = [f"{WEEK}:{week}" for week in weeks]
+        elif broad and categories:
+            keys = [f"{CATEGORY}:{c}" for c in categories]
+        elif broad and re.search(r"\b(everything|all (my )?notes|overall|in general)\b", text):
+            keys = [f"{CATEGORY}:{c}" for c in self.categories()]
+        else:
+            return []
+        # Context keeps at most ask_max_notes items; newest first, the oldest are the ones left out
+        return [bucket for bucket in (self.get(key) for key in keys) if bucket][:settings.ask_max_notes]
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "buckets": {
+                    key: {k: bucket[k] for k in ("kind", "label", "notes", "first", "last", "updated")}
+                    for key, bucket in sorted(self._buckets.items())
+                },
+                "pending": sorted(self._dirty),
+                "full_refresh_pending": self._full,
+                "refreshing": bool(self._task and not self._task.done())
+            }
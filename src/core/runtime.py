@@ -0,0 +1,342 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from .agent import BrainAgent
+from .config import settings, init_folders, DEFAULT_VAULT
+from .db import VectorDB
+from .dedup import DuplicateIndex
+from .events import VaultChannel, get_change_feed, RESYNC
+from .rollups import RollupIndex, ROLLUP_FILE
+from .suggest import SuggestIndex
+from .trash import VaultTrash
+from .fs import ObsidianWriter
+from .gateway import ModelGateway, get_model_gateway
+from .journal import WriteJournal, GroupCommitter
+from .migration import ensure_migration
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Open stores by resolved vault path, shared by every generation on that path
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class VaultStore:
+    """
+    The per-path half of a generation: vector store, journal, group committer,
+    trash, rollups and in-memory indexes. Generations on the same vault path
+    (a model-only reconfiguration, or a registered vault pointing at the
+    default one) share one, so there is a single writer per journal and store;
+    it is closed with the last generation using it.
+    """
+    def __init__(self, vault_path: Path, embed_model: str, gateway: ModelGateway,
+                 agent: BrainAgent, loop: asyncio.AbstractEventLoop = None):
+        self.vault_path = Path(vault_path)
+        self.refs = 0
+
+        init_folders(self.vault_path)
+        engram_dir = self.vault_path / ".engram"
+        self.db = VectorDB(path=engram_dir / "db", embed_model=embed_model, gateway=gateway)
+        # Store built with another embedding model: re-embed in the background, serving the old one meanwhile
+        ensure_migration(self.db)
+        self.writer = ObsidianWriter(vault_root=self.vault_path)
+        self.journal = WriteJournal(engram_dir / "journal", vault_root=self.vault_path)
+        # Recover any interrupted writes before this store's committer starts taking new ones
+        self.journal.replay(self.db)
+        self.committer = GroupCommitter(db=self.db, journal=self.journal)
+        self.dedup = DuplicateIndex(self.db)
+        self.suggest = SuggestIndex(self.db)
+        self.suggest.load()
+        self.rollups = RollupIndex(engram_dir / ROLLUP_FILE, self.db, agent, loop=loop)
+        self.trash = VaultTrash(self.vault_path, self.db)
+        self.trash.resume()
+
+    @classmethod
+    def open(cls, vault_path: Path, embed_model: str, gateway: ModelGateway,
+             agent: BrainAgent, loop: asyncio.AbstractEventLoop = None) -> "VaultStore":
+        """
+        The store for `vault_path`, opened on first use. Joining an open store
+        adopts the caller's embedding model (migrating to it) and chat agent.
+        """
+        key = str(Path(vault_path).resolve())
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = cls(vault_path, embed_model, gateway, agent, loop)
+                _stores[key] = store
+            elif embed_model != store.db.target_model:
+                store.db.target_model = embed_model
+                ensure_migration(store.db)
+            # Rollups are summarized with the newest generation's chat model
+            store.rollups.agent = agent
+            store.refs += 1
+        return store
+
+    def release(self):
+        with _stores_lock:
+            self.refs -= 1
+            if self.refs > 0:
+                return
+            _stores.pop(str(self.vault_path.resolve()), None)
+        self.close()
+
+    def close(self):
+        self.trash.close()
+        self.rollups.close()
+        if self.db.migration and self.db.migration.active:
+            # Resumes from the shadow collection when this vault is opened again
+            self.db.migration.stop()
+        # Flush grouped vector writes; anything that fails stays journaled
+        self.committer.close()
+        # Without this the path's Chroma system stays cached (and resident) after eviction
+        self.db.close()
+        logger.info(f"Vault store closed: {self.vault_path}")
+
+
+class Components:
+    """
+    One generation of the live, configuration-dependent objects built for a
+    single vault path + model set: its own agent on top of the path's shared
+    VaultStore (store, writer, journal, trash, rollups).
+    """
+    def __init__(self, vault_path: Path, chat_model: str, embed_model: str,
+                 gateway: ModelGateway, generation: int, name: str = DEFAULT_VAULT,
+                 loop: asyncio.AbstractEventLoop = None):
+        self.name = name
+        self.vault_path = Path(vault_path)
+        self.chat_model = chat_model
+        self.embed_model = embed_model
+        self.generation = generation
+
+        self.agent = BrainAgent(gateway=gateway, model=chat_model)
+        self.store = VaultStore.open(self.vault_path, embed_model, gateway, self.agent, loop)
+        self.db = self.store.db
+        self.writer = self.store.writer
+        self.journal = self.store.journal
+        self.committer = self.store.committer
+        self.dedup = self.store.dedup
+        self.suggest = self.store.suggest
+        self.events = VaultChannel(get_change_feed(), name)
+        self.rollups = self.store.rollups
+        self.trash = self.store.trash
+
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self.retired = False
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # The store stays open while another generation on the same path uses it
+        self.store.release()
+        logger.info(f"Components closed: vault={self.name}, generation={self.generation}")
+
+
+class UnknownVaultError(KeyError):
+    """Raised when a request names a vault that is not registered."""
+
+
+class Runtime:
+    """
+    Holds the current Components and swaps them atomically on reconfiguration.
+    Requests lease the generation that was current when they started, so they
+    drain on the old instances while new requests see the new ones.
+
+    The default vault is always open. Additional registered vaults are opened
+    lazily on first use and closed again by an idle/LRU policy
+    (`max_open_vaults`, `vault_idle_s`) so memory stays bounded.
+    """
+    def __init__(self, gateway: ModelGateway = None):
+        self.gateway = gateway or get_model_gateway()
+        try:
+            # Built during startup: background work kicked from worker threads runs here
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._swap_lock = asyncio.Lock()
+        self._current = self._build(settings.vault_path, settings.chat_model, settings.embed_model, 1)
+        self._vaults = dict(settings.vaults)
+        self._open = OrderedDict()  # name -> Components, least recently used first
+
+    def _build(self, vault_path, chat_model, embed_model, generation, name=DEFAULT_VAULT) -> Components:
+        return Components(vault_path, chat_model, embed_model, self.gateway, generation, name=name, loop=self.loop)
+
+    @property
+    def current(self) -> Components:
+        return self._current
+
+    def vault_names(self) -> list:
+        with self._lock:
+            return [DEFAULT_VAULT] + sorted(self._vaults)
+
+    def list_vaults(self) -> list:
+        with self._lock:
+            vaults = [{"name": DEFAULT_VAULT, "path": str(self._current.vault_path), "open": True}]
+            for name in sorted(self._vaults):
+                vaults.append({"name": name, "path": str(self._vaults[name]), "open": name in self._open})
+            return vaults
+
+    def register_vault(self, name: str, path: Path):
+        if name == DEFAULT_VAULT:
+            raise ValueError(f"'{DEFAULT_VAULT}' is reserved for the configured vault_path")
+        with self._lock:
+            self._vaults[name] = Path(path)
+            # A re-registered path must not keep serving the old store
+            stale = self._open.pop(name, None)
+        if stale:
+            self._retire(stale)
+        settings.vaults = dict(self._vaults)
+
+    def unregister_vault(self, name: str):
+        with self._lock:
+            if name not in self._vaults:
+                raise UnknownVaultError(name)
+            del self._vaults[name]
+            stale = self._open.pop(name, None)
+        if stale:
+            self._retire(stale)
+        settings.vaults = dict(self._vaults)
+
+    def acquire(self, vault: str = None) -> Components:
+        if not vault or vault == DEFAULT_VAULT:
+            with self._lock:
+                components = self._current
+                components.in_flight += 1
+                components.last_used = time.monotonic()
+                return components
+
+        with self._lock:
+            components = self._lease_open(vault)
+        if components:
+            return components
+
+        with self._open_lock:
+            # Another request may have opened it while we waited
+            with self._lock:
+                components = self._lease_open(vault)
+                path = self._vaults.get(vault)
+            if components:
+                return components
+            if path is None:
+                raise UnknownVaultError(vault)
+
+            logger.info(f"Opening vault '{vault}' at {path}")
+            components = self._build(path, self._current.chat_model, self._current.embed_model, 1, name=vault)
+
+            with self._lock:
+                components.in_flight += 1
+                self._open[vault] = components
+                evicted = self._evict()
+
+        for stale in evicted:
+            self._retire(stale)
+        return components
+
+    def acquire_all(self) -> dict:
+        """
+        Leases every registered vault (opening as needed) for a fan-out query.
+        """
+        leases = {}
+        try:
+            for name in self.vault_names():
+                leases[name] = self.acquire(name)
+        except Exception:
+            for components in leases.values():
+                self.release(components)
+            raise
+        return leases
+
+    def _lease_open(self, vault: str):
+        # Caller holds self._lock
+        components = self._open.get(vault)
+        if components:
+            self._open.move_to_end(vault)
+            components.in_flight += 1
+            components.last_used = time.monotonic()
+        return components
+
+    def _evict(self) -> list:
+        """
+        Picks idle vaults past `vault_idle_s` plus the least recently used
+        beyond `max_open_vaults`. Busy vaults are never evicted. Caller holds self._lock.
+        """
+        now = time.monotonic()
+        evicted = []
+        for name, components in list(self._open.items()):
+            over_capacity = len(self._open) > settings.max_open_vaults
+            idle = now - components.last_used > settings.vault_idle_s
+            if components.in_flight == 0 and (over_capacity or idle):
+                evicted.append(self._open.pop(name))
+        return evicted
+
+    def _retire(self, components: Components):
+        with self._lock:
+            components.retired = True
+            drained = components.in_flight == 0
+        if drained:
+            components.close()
+
+    def release(self, components: Components):
+        with self._lock:
+            components.in_flight -= 1
+            drained = components.retired and components.in_flight == 0
+            evicted = self._evict()
+        if drained:
+            components.close()
+        for stale in evicted:
+            self._retire(stale)
+
+    async def reconfigure(self, vault_path: str = None, chat_model: str = None,
+                          embed_model: str = None) -> int:
+        """
+        Builds a new generation off the event loop, warms its chat model,
+        then swaps it in. Returns the new generation number.
+        """
+        async with self._swap_lock:
+            old = self._current
+            new_vault = Path(vault_path) if vault_path else old.vault_path
+            new_chat = chat_model or old.chat_model
+            new_embed = embed_model or old.embed_model
+
+            # Same vault path: shares the open store, so only the agent is new
+            new = await asyncio.to_thread(self._build, new_vault, new_chat, new_embed, old.generation + 1)
+            if new_chat != old.chat_model:
+                await new.agent.warm_up()
+
+            with self._lock:
+                self._current = new
+                old.retired = True
+                drained = old.in_flight == 0
+                # Other open vaults reopen lazily with the new models
+                stale_vaults = list(self._open.values())
+                self._open.clear()
+
+            settings.vault_path = new_vault
+            settings.chat_model = new_chat
+            settings.embed_model = new_embed
+            logger.info(f"Reconfigured to generation {new.generation}: vault={new_vault}, chat={new_chat}")
+
+        if new.vault_path != old.vault_path:
+            # Clients are looking at a different vault now
+            new.events.publish(RESYNC)
+
+        if drained:
+            await asyncio.to_thread(old.close)
+        for stale in stale_vaults:
+            self._retire(stale)
+        return new.generation
+
+    def close(self):
+        with self._lock:
+            open_components = [self._current] + list(self._open.values())
+            self._open.clear()
+        for components in open_components:
+            components.retired = True
+            components.close()
@@ -1,11 +1,49 @@
-from src.core.agent import BrainAgent
+from src.core.agent import BrainAgent, unprocessed_note
+from src.core.config import settings
+from src.core.context import assemble_context
 from src.core.db import VectorDB
+from src.core.gateway import ModelUnavailableError
+from src.core.rollups import RollupIndex, CATEGORY
+from src.core.suggest import SuggestIndex
+from src.core.logger import setup_logger
 from typing import Dict, Any
+import asyncio
+
+logger = setup_logger(__name__)
+
+def graph_node(doc_id: str, meta: Dict, document: str = "") -> Dict[str, Any]:
+    """
+    One force-graph node; shared by /graph snapshots and change-feed deltas.
+    """
+    category = meta.get('category') or 'Inbox'
+
+    # Color coding for Work Sub-domains
+    if "Tickets" in category: color = "#f43f5e" # Rose
+    elif "Meetings" in category: color = "#10b981" # Emerald
+    elif "Tech" in category: color = "#3b82f6" # Blue
+    elif "Planning" in category: color = "#8b5cf6" # Violet
+    else: color = "#64748b" # Slate (General/Misc)
+
+    return {
+        "id": doc_id,
+        "name": meta.get('title', doc_id),
+        "val": 1,
+        "group": category,
+        "color": color,
+        "summary": document or "",
+        "tags": meta.get("tags", ""),
+        "created": meta.get('created', 'Unknown')
+    }
 
 class AnalysisService:
-    def __init__(self, agent: BrainAgent, db: VectorDB):
+    def __init__(self, agent: BrainAgent, db: VectorDB, vault_dbs: Dict[str, VectorDB] = None,
+                 suggest: SuggestIndex = None, rollups: RollupIndex = None):
         self.agent = agent
         self.db = db
+        self.suggest_index = suggest
+        self.rollups = rollups
+        # Set when a query fans out across vaults (name -> store)
+        self.vault_dbs = vault_dbs or {}
 
     async def analyze_input(self, text: str, context: str = None) -> Dict[str, Any]:
         """
@@ -15,77 +53,184 @@ class AnalysisService:
         if context:
             full_text += f"\n(Context: {context})"
         
-        analysis = await self.agent.process(full_text)
+        try:
+            analysis = await self.agent.process(full_text)
+        except ModelUnavailableError as e:
+            # Shown for review before saving, so a placeholder is safe here
+            logger.warning(f"Analyze degraded, model unavailable: {e}")
+            analysis = unprocessed_note(full_text)
         
         if isinstance(analysis, dict):
              analysis["original_text"] = full_text
              
         return analysis
 
-    async def ask(self, query: str) -> Dict[str, Any]:
+    async def ask(self, query: str, token_budget: int = None) -> Dict[str, Any]:
         """
         Performs vector search and answers user query.
+        Context is assembled within a token budget (see src.core.context) from
+        over-fetched candidates, or from rollups for broad/temporal questions;
+        the response reports what it used.
+        While the model backend is down, falls back to keyword matches without generation.
         """
-        results = self.db.search(query, n_results=5)
-        answer = await self.agent.answer(query, results)
-        
+        budget = token_budget or settings.ask_token_budget
+        degraded = not self.agent.gateway.available
+        context = None
+        route = "search"
+        skipped = []
+
+        # Broad or temporal questions ("what did I do in Work/Tech this month") are
+        # answered from the cached rollups rather than a handful of retrieved notes
+        rollups = self.rollups.route(query) if self.rollups and not self.vault_dbs and not degraded else []
+        if rollups:
+            try:
+                context = assemble_context(query, None, [self._rollup_item(r) for r in rollups], budget=budget)
+                logger.info(f"Ask routed to rollups: {[r['key'] for r in rollups]}")
+                answer = await self.agent.answer(query, context["items"])
+                route = "rollups"
+            except ModelUnavailableError as e:
+                logger.warning(f"Ask degraded, model unavailable: {e}")
+                degraded = True
+                context = None
+
+        if not degraded and route == "search":
+            try:
+                embedding = await asyncio.to_thread(self.db.embed, query)
+                candidates, skipped = await self._search(query, n_results=settings.ask_candidates,
+                                                         query_embedding=embedding, include_embeddings=True)
+                context = assemble_context(query, embedding, candidates, budget=budget)
+                logger.info(f"Ask context: {len(context['items'])}/{context['candidates']} notes, "
+                            f"{context['tokens']}/{budget} tokens")
+                answer = await self.agent.answer(query, context["items"])
+            except ModelUnavailableError as e:
+                logger.warning(f"Ask degraded, model unavailable: {e}")
+                degraded = True
+
+        if degraded:
+            if context is None:
+                candidates, skipped = await self._search(query, n_results=settings.ask_max_notes, lexical=True)
+                context = assemble_context(query, None, candidates, budget=budget)
+            answer = "The AI model is currently unavailable. Showing notes that match your keywords instead."
+
         return {
             "answer": answer,
+            "degraded": degraded,
+            "route": route,
+            "context": {
+                "tokens": context["tokens"],
+                "budget": context["budget"],
+                "candidates": context["candidates"],
+                "selected": len(context["items"])
+            },
             "sources": [{
                 "filename": r['metadata'].get('filename'),
                 "title": r['metadata'].get('title'),
                 "category": r['metadata'].get('category'),
+                "vault": r.get('vault'),
+                "tokens": r['tokens'],
                 "snippet": r['content'][:200] + "..."
-            } for r in results]
+            } for r in context["items"]],
+            "skipped_vaults": skipped
+        }
+
+    @staticmethod
+    def _rollup_item(rollup: Dict) -> Dict[str, Any]:
+        span = rollup["first"] if rollup["first"] == rollup["last"] else f"{rollup['first']} to {rollup['last']}"
+        return {
+            "id": rollup["key"],
+            "content": f"Summary of {rollup['label']} ({rollup['notes']} notes, {span}):\n{rollup['summary']}",
+            "metadata": {
+                "title": f"{rollup['label']} rollup",
+                "category": rollup.get("category", rollup["label"] if rollup["kind"] == CATEGORY else None)
+            }
         }
 
+    def rollup_status(self) -> Dict[str, Any]:
+        return self.rollups.status() if self.rollups else {"buckets": {}}
+
+    def refresh_rollups(self) -> Dict[str, Any]:
+        """
+        Queues a full rebuild (unchanged chunks are reused from the cache).
+        """
+        self.rollups.touch_all()
+        return {"status": "scheduled"}
+
+    def suggest(self, query: str, limit: int = 8) -> Dict[str, Any]:
+        """
+        Typeahead over titles, tags and ticket IDs. In-memory only; never calls the model.
+        """
+        suggestions = self.suggest_index.query(query, limit=limit) if self.suggest_index else []
+        return {"query": query, "suggestions": suggestions}
+
+    async def _search(self, query: str, n_results: int, lexical: bool = False, **search_kwargs) -> tuple:
+        """
+        Searches the selected vault, or every leased vault concurrently and
+        merges by score (distance ascending, or keyword score descending).
+        search_kwargs go to VectorDB.search (semantic only).
+        Returns (hits, names of fanned-out vaults left out).
+
+        The query vector comes from the selected vault's embedding model, so a
+        semantic fan-out skips vaults on another model (their distances would
+        not compare, or their dimensions not match); keyword search covers all.
+        """
+        if not self.vault_dbs:
+            if lexical:
+                # A paged scan of the whole collection
+                return await asyncio.to_thread(self.db.lexical_search, query, n_results), []
+            return await asyncio.to_thread(self.db.search, query, n_results, **search_kwargs), []
+
+        skipped = []
+        vaults = {}
+        for name, db in self.vault_dbs.items():
+            if lexical or db.embed_model == self.db.embed_model:
+                vaults[name] = db
+            else:
+                logger.warning(f"Skipping vault '{name}' in search: embedded with {db.embed_model}, "
+                               f"query with {self.db.embed_model}")
+                skipped.append(name)
+
+        async def search_vault(name: str, db: VectorDB):
+            try:
+                if lexical:
+                    hits = await asyncio.to_thread(db.lexical_search, query, n_results)
+                else:
+                    hits = await asyncio.to_thread(db.search, query, n_results, **search_kwargs)
+            except ModelUnavailableError:
+                raise
+            except Exception as e:
+                # e.g. the vault switched embedding models mid-query; the others still answer
+                logger.warning(f"Skipping vault '{name}' in search: {e}")
+                skipped.append(name)
+                return []
+            for hit in hits:
+                hit["vault"] = name
+            return hits
+
+        per_vault = await asyncio.gather(*(search_vault(n, db) for n, db in vaults.items()))
+        merged = [hit for hits in per_vault for hit in hits]
+        if lexical:
+            merged.sort(key=lambda hit: hit["score"], reverse=True)
+        else:
+            merged.sort(key=lambda hit: hit["distance"])
+        return merged[:n_results], sorted(skipped)
+
     def get_graph_data(self) -> Dict[str, Any]:
         """
         Returns nodes and links for force-graph.
         """
-        data = self.db.get_all_notes()
         nodes = []
         links = []
-        
-        # Build Nodes
-        ids = data.get('ids', [])
-        metadatas = data.get('metadatas', [])
-        documents = data.get('documents', [])
-        
-        for i, doc_id in enumerate(ids):
-            meta = metadatas[i] if metadatas else {}
-            category = meta.get('category', 'Inbox')
-            
-            # Color coding for Work Sub-domains
-            if "Tickets" in category: color = "#f43f5e" # Rose
-            elif "Meetings" in category: color = "#10b981" # Emerald
-            elif "Tech" in category: color = "#3b82f6" # Blue
-            elif "Planning" in category: color = "#8b5cf6" # Violet
-            else: color = "#64748b" # Slate (General/Misc)
-
-            nodes.append({
-                "id": doc_id,
-                "name": meta.get('title', doc_id),
-                "val": 1, 
-                "group": category,
-                "color": color,
-                "summary": documents[i] if documents else "", 
-                "tags": meta.get("tags", ""),
-                "created": meta.get('created', 'Unknown')
-            })
-        
-        # Build Links (Chain Strategy)
-        category_map = {}
-        for node in nodes:
-            cat = node['group']
-            if cat not in category_map: category_map[cat] = []
-            category_map[cat].append(node['id'])
-            
-        for cat, node_ids in category_map.items():
-            for j in range(len(node_ids) - 1):
-                links.append({
-                    "source": node_ids[j],
-                    "target": node_ids[j+1]
-                })
+        last_in_category = {}
+
+        # Paged scan: only the nodes being returned are held, never a raw copy of the store
+        for note in self.db.iter_notes(fields=("documents", "metadatas")):
+            node = graph_node(note["id"], note["metadata"], note["content"])
+            nodes.append(node)
+
+            # Build Links (Chain Strategy): each node links to the previous one in its category
+            previous = last_in_category.get(node['group'])
+            if previous:
+                links.append({"source": previous, "target": node['id']})
+            last_in_category[node['group']] = node['id']
 
         return {"nodes": nodes, "links": links}
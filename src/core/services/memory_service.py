@@ -1,8 +1,19 @@
+import asyncio
+import json
 from datetime import datetime
+from pathlib import Path
 from typing import Dict
 from src.core.db import VectorDB
-from src.core.fs import ObsidianWriter
-from src.core.config import VAULT_ROOT
+from src.core.fs import ObsidianWriter, atomic_write, find_notes
+from src.core.notes import Note, NoteFormatError, format_note, parse_note
+from src.core.journal import WriteJournal, GroupCommitter
+from src.core.dedup import DuplicateIndex, minhash, encode_signature, find_duplicate
+from src.core.rollups import RollupIndex
+from src.core.suggest import SuggestIndex, extract_tickets
+from src.core.events import VaultChannel, NODE_ADDED, NODE_UPDATED, NODE_REMOVED, FOLDER_CHANGED
+from src.core.services.analysis_service import graph_node
+from src.core.gateway import ModelUnavailableError
+from src.core.config import settings
 from src.core.logger import setup_logger
 import os
 
@@ -10,56 +21,385 @@ logger = setup_logger(__name__)
 
 from src.core.agent import BrainAgent
 
+# Export field name -> VectorDB field
+EXPORT_FIELDS = {"content": "documents", "metadata": "metadatas", "embedding": "embeddings"}
+EXPORT_CHUNK_LINES = 64
+REINDEX_WINDOW = 16  # Files in flight during a reindex when there is no agent (no model pool to size it by)
+
 class MemoryService:
-    def __init__(self, db: VectorDB, writer: ObsidianWriter, agent: BrainAgent = None):
+    def __init__(self, db: VectorDB, writer: ObsidianWriter, agent: BrainAgent = None,
+                 journal: WriteJournal = None, committer: GroupCommitter = None,
+                 dedup: DuplicateIndex = None, suggest: SuggestIndex = None,
+                 events: VaultChannel = None, rollups: RollupIndex = None):
         self.db = db
         self.writer = writer
+        self.vault_root = writer.vault_root
         self.agent = agent
+        self.journal = journal
+        self.committer = committer
+        self.dedup = dedup
+        self.suggest = suggest
+        self.events = events
+        self.rollups = rollups
+
+    def _touch_rollups(self, *metadatas):
+        if self.rollups:
+            self.rollups.touch(*metadatas)
+
+    def _relative(self, path) -> str:
+        try:
+            relative = Path(path).relative_to(self.vault_root)
+        except ValueError:
+            return str(path)
+        return "" if str(relative) == "." else str(relative)
+
+    def _emit(self, kind: str, **data):
+        if self.events:
+            self.events.publish(kind, **data)
+
+    def _emit_node(self, kind: str, doc_id: str, content: str, metadata: Dict, path: Path):
+        self._emit(kind, node=graph_node(doc_id, metadata, content), path=self._relative(path))
+
+    def _commit(self, doc_id: str, content: str, metadata: dict, embedding: list = None, embed_model: str = None):
+        """
+        Journals and hands a note to the vector store (grouped with other saves
+        when a committer is available). Call before touching the file so a crash
+        in between is reconciled on the next startup.
+        """
+        # The model tag lets the store re-embed if its model was switched in between
+        item = {"doc_id": doc_id, "content": content, "metadata": metadata,
+                "embedding": embedding, "embed_model": embed_model}
+        if not self.journal:
+            return lambda: self.db.add_many([item])
+
+        entry = self.journal.record("add", doc_id, content, metadata)
+        entry["embedding"] = embedding
+        entry["embed_model"] = embed_model
 
-    def save_memory(self, data: Dict) -> str:
+        def apply():
+            if self.committer:
+                self.committer.submit(entry)
+            else:
+                self.db.add_many([entry])
+                self.journal.complete(entry)
+        return apply
+
+    def _get_note(self, doc_id: str):
+        """
+        Like db.get_note, but also sees saves still queued in the group committer.
+        """
+        entry = self.committer.pending(doc_id) if self.committer else None
+        if entry:
+            return {"id": doc_id, "content": entry["content"], "metadata": entry["metadata"]}
+        return self.db.get_note(doc_id)
+
+    def save_memory(self, data: Dict, on_duplicate: str = None) -> Dict:
         """
         Saves a filtered/analyzed memory to both FileSystem and VectorDB.
+        The intent is journaled first, so a crash between the two writes is
+        reconciled on the next startup instead of needing a full reindex.
+
+        on_duplicate: "merge" folds a near-duplicate into the existing note,
+        "offer" returns the match without writing, "create" skips the check.
+        Defaults to settings.dedup_mode.
         """
-        # Write to File System
-        filepath = self.writer.save_note(data.get("summary"), data)
+        mode = on_duplicate or settings.dedup_mode
+        filepath = self.writer.note_path(data)
         
         # Prepare content for DB (Summary + Original to match file body)
         full_db_content = f"{data.get('summary')}\n\n## Original Content\n{data.get('original_text', '')}"
+        signature = minhash(full_db_content)
+
+        embedding = None
+        embed_model = self.db.embed_model  # Read before embedding; see VectorDB.add_many
+        if self.dedup and mode in ("merge", "offer"):
+            try:
+                embedding = self.db.embed(full_db_content)
+            except ModelUnavailableError as e:
+                logger.warning(f"Duplicate check falling back to MinHash only: {e}")
+
+            duplicate = find_duplicate(self.dedup, self.db, signature, embedding)
+            if duplicate:
+                existing = self._get_note(duplicate["doc_id"])
+                if existing and mode == "offer":
+                    return {
+                        "status": "duplicate",
+                        "duplicate_of": {
+                            "id": duplicate["doc_id"],
+                            "title": existing["metadata"].get("title"),
+                            "jaccard": duplicate["jaccard"],
+                            "cosine": duplicate["cosine"]
+                        }
+                    }
+                if existing:
+                    merged = self._merge_into(existing, data.get("summary"), duplicate["jaccard"])
+                    if merged:
+                        merged.pop("note")
+                        return merged
+
+        metadata = {
+            "filename": filepath.name,
+            "category": data.get("category"),
+            "title": data.get("title"),
+            "tags": str(data.get("tags", [])),
+            "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "tickets": ",".join(extract_tickets(f"{data.get('title', '')}\n{full_db_content}")),
+            "minhash": encode_signature(signature)
+        }
+
+        apply = self._commit(filepath.name, full_db_content, metadata, embedding, embed_model)
+
+        # Write to File System
+        self.writer.save_note(data.get("summary"), data, filepath=filepath)
 
         # Write to DB
-        self.db.add(
-            content=full_db_content,
-            metadata={
-                "filename": filepath.name,
-                "category": data.get("category"),
-                "title": data.get("title"),
-                "tags": str(data.get("tags", [])),
-                "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            },
-            doc_id=filepath.name
-        )
-        return str(filepath)
+        apply()
+        if self.dedup:
+            self.dedup.add(filepath.name, signature)
+        if self.suggest:
+            self.suggest.add(filepath.name, metadata)
+        self._touch_rollups(metadata)
+
+        self._emit_node(NODE_ADDED, filepath.name, full_db_content, metadata, filepath)
+        self._emit(FOLDER_CHANGED, path=self._relative(filepath.parent))
+
+        return {"filepath": str(filepath), "merged_into": None}
+
+    def _merge_into(self, existing: Dict, summary: str, similarity: float):
+        """
+        Folds new content into an existing note instead of creating a copy.
+        Returns None if the existing file is gone (caller creates a new note);
+        otherwise the result includes the updated "note" since the store
+        write may still be pending in the group committer.
+        """
+        doc_id = existing["id"]
+        found_path = next(find_notes(self.vault_root, doc_id), None)
+        if not found_path:
+            return None
+
+        if similarity >= settings.dedup_identical_threshold:
+            # Same thought dumped again; nothing new to add
+            logger.info(f"Duplicate of {doc_id} skipped (identical content)")
+            return {"filepath": str(found_path), "merged_into": doc_id, "note": existing}
+
+        section = f"## Merged: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n{summary}"
+        merged_content = f"{existing['content']}\n\n{section}"
+        signature = minhash(merged_content)
+        metadata = dict(existing["metadata"], minhash=encode_signature(signature))
+
+        apply = self._commit(doc_id, merged_content, metadata)
+        self.writer.append_section(found_path, section)
+        apply()
+        self.dedup.add(doc_id, signature)
+        self._touch_rollups(metadata)
+        self._emit_node(NODE_UPDATED, doc_id, merged_content, metadata, found_path)
+
+        logger.info(f"Merged near-duplicate into {doc_id}")
+        note = {"id": doc_id, "content": merged_content, "metadata": metadata}
+        return {"filepath": str(found_path), "merged_into": doc_id, "note": note}
+
+    def dedupe_vault(self, apply: bool = False) -> Dict:
+        """
+        Batch job: finds near-duplicate clusters across the vault (MinHash) and,
+        if apply is set, merges each cluster into its oldest note and deletes the rest.
+        """
+        groups = []
+        removed = 0
+
+        for cluster in self.dedup.clusters(settings.dedup_jaccard_threshold):
+            notes = [note for note in (self._get_note(doc_id) for doc_id in cluster) if note]
+            if len(notes) < 2:
+                continue
+            notes.sort(key=lambda note: str(note["metadata"].get("created", "")))
+            keeper, duplicates = notes[0], notes[1:]
+            groups.append({"keep": keeper["id"], "duplicates": [note["id"] for note in duplicates]})
+
+            if not apply:
+                continue
+
+            for note in duplicates:
+                similarity = self.dedup.similarity(minhash(note["content"]), keeper["id"])
+                merged = self._merge_into(keeper, note["content"], similarity)
+                if merged is None:
+                    break
+                keeper = merged["note"]
+                self.delete_memory(note["id"])
+                removed += 1
+
+        return {"clusters": len(groups), "removed": removed, "applied": apply, "groups": groups}
 
     def delete_memory(self, doc_id: str) -> str:
         """
         Deletes a memory from DB and FS.
         """
-        # Delete from DB
+        entry = self.journal.record("delete", doc_id) if self.journal else None
+        # Its rollup buckets come from the metadata, which is about to go
+        existing = self._get_note(doc_id) if self.rollups else None
+
+        # Delete from DB (after any save of it still queued for a group commit)
+        if self.committer:
+            self.committer.discard(doc_id)
         self.db.delete_note(doc_id)
         
         # Delete from FS
-        found_path = None
-        for path in VAULT_ROOT.rglob(doc_id):
-            found_path = path
-            break
-            
+        found_path = next(find_notes(self.vault_root, doc_id), None)
         if found_path and found_path.exists():
             os.remove(found_path)
+
+        if entry:
+            self.journal.complete(entry)
+
+        if self.dedup:
+            self.dedup.remove(doc_id)
+        if self.suggest:
+            self.suggest.remove(doc_id)
+        if existing:
+            self._touch_rollups(existing["metadata"])
+
+        self._emit(NODE_REMOVED, id=doc_id, path=self._relative(found_path) if found_path else None)
+        if found_path:
+            self._emit(FOLDER_CHANGED, path=self._relative(found_path.parent))
             
         return doc_id
 
 
 
+    def export_notes(self, fields: list):
+        """
+        Returns a generator of NDJSON chunks (one note per line) paged through
+        the vector store, so exporting any vault size runs in constant memory.
+        fields: any of "content", "metadata", "embedding" (the id is always included).
+        """
+        unknown = [f for f in fields if f not in EXPORT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+        db_fields = [EXPORT_FIELDS[f] for f in fields]
+
+        def lines():
+            chunk = []
+            for note in self.db.iter_notes(fields=db_fields):
+                if "embedding" in note:
+                    note["embedding"] = [float(x) for x in note["embedding"]]
+                chunk.append(json.dumps(note))
+                if len(chunk) >= EXPORT_CHUNK_LINES:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+
+        return lines()
+
+    async def _reindex_file(self, path: Path, index_state: dict, previously_indexed: set,
+                            changed_folders: set) -> bool:
+        """
+        Reads, tags (when raw) and indexes one changed file. Returns whether it was indexed.
+        """
+        filename = path.name
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except Exception as e:
+            logger.error(f"Failed to read {filename}: {e}")
+            return False
+
+        # Parse Frontmatter once (Tolerant of missing or broken frontmatter)
+        try:
+            note = parse_note(content)
+        except NoteFormatError as e:
+            logger.warning(f"Failed to parse frontmatter for {filename}: {e}")
+            note = Note({}, content, True)
+
+        try:
+            metadata = note.metadata
+            body = note.body
+            untagged = False
+
+            if not note.frontmatter:
+                # --- AUTO-TAGGING FOR RAW FILES ---
+                if self.agent:
+                    logger.debug(f"Auto-tagging raw file: {filename}", extra={"sample_key": "reindex.autotag"})
+                    try:
+                        analysis = await self.agent.process(content)
+                    except Exception as agent_err:
+                        logger.error(f"Auto-tagging error for {filename}: {agent_err}")
+                        analysis = None
+                    if analysis:
+                        metadata = {
+                            "title": analysis.get("title", path.stem),
+                            "category": analysis.get("category", "Inbox"),
+                            "tags": analysis.get("tags", []),
+                            "created": datetime.fromtimestamp(path.stat().st_ctime).replace(microsecond=0),
+                            "status": "active"
+                        }
+
+                        # Rewrite File with Frontmatter
+                        # We keep the file in its current location, just prepend frontmatter
+                        atomic_write(path, format_note(metadata, content))
+
+                        logger.debug(f"Rewrite complete for {filename}", extra={"sample_key": "reindex.rewrite"})
+                        # Update body/content for indexing
+                        body = content
+                    else:
+                        # Left raw and out of the index state, so the next reindex retries it
+                        logger.warning(f"Agent failed to tag {filename}")
+                        untagged = True
+                else:
+                    logger.debug(f"{filename} has no frontmatter and no agent available.")
+
+            # --- INFER METADATA IF STILL MISSING (Fallback) ---
+            title = metadata.get("title")
+            if not title:
+                 title = note.heading() or path.stem.replace("_", " ").title()
+
+            category = metadata.get("category")
+            if not category:
+                try:
+                    rel_path = path.relative_to(self.vault_root)
+                    category = str(rel_path.parent) if str(rel_path.parent) != "." else "Inbox"
+                except: category = "External"
+
+            tags = metadata.get("tags", [])
+            created = metadata.get("created", datetime.fromtimestamp(path.stat().st_ctime).strftime('%Y-%m-%d %H:%M:%S'))
+
+            logger.debug(f"Indexing {filename}: Title='{title}', Cat='{category}'",
+                         extra={"sample_key": "reindex.file"})
+
+            signature = minhash(body)
+            note_metadata = {
+                "filename": filename,
+                "category": category,
+                "title": title,
+                "tags": str(tags),
+                "created": str(created),
+                "tickets": ",".join(extract_tickets(f"{title}\n{body}")),
+                "minhash": encode_signature(signature)
+            }
+            # Rollup buckets touched: the note's old metadata (category or date may change) and new
+            previous = await asyncio.to_thread(self.db.get_note, filename) if self.rollups else None
+            # Embeds through the gateway, whose retries back off with a blocking sleep
+            await asyncio.to_thread(self.db.add, content=body, metadata=note_metadata, doc_id=filename)
+            if self.dedup:
+                self.dedup.add(filename, signature)
+            if self.suggest:
+                self.suggest.add(filename, note_metadata)
+            self._touch_rollups(previous and previous["metadata"], note_metadata)
+
+            # Update State
+            if not untagged:
+                index_state[filename] = path.stat().st_mtime # Update with fresh mtime after rewrite
+            logger.debug(f"Index Updated: {filename}", extra={"sample_key": "reindex.updated"})
+
+            if filename in previously_indexed:
+                self._emit_node(NODE_UPDATED, filename, body, note_metadata, path)
+            else:
+                self._emit_node(NODE_ADDED, filename, body, note_metadata, path)
+                changed_folders.add(self._relative(path.parent))
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to index {filename}: {e}")
+            return False
+
     async def reindex_vault(self):
         """
         Smart Index: Scans Vault and checks for modified files.
@@ -67,11 +407,9 @@ class MemoryService:
         Auto-categorizes raw files if Agent is available.
         """
         import json
-        import re
-        import yaml
         
         # Load Index State
-        index_state_path = VAULT_ROOT / ".engram" / "index_state.json"
+        index_state_path = self.vault_root / ".engram" / "index_state.json"
         index_state = {}
         if index_state_path.exists():
             try:
@@ -84,125 +422,59 @@ class MemoryService:
         nodes_updated = 0
         pruned_count = 0
         current_files = set()
-        
-        # Add/Update from Disk
-        for path in VAULT_ROOT.rglob("*.md"):
-            if ".engram" in str(path): continue
-            
-            filename = path.name
-            current_files.add(filename)
-            mtime = path.stat().st_mtime
-            
-            # Smart Check: Skip if unchanged
-            if filename in index_state and index_state[filename] == mtime:
-                continue
-                
-            # --- PROCESS FILE ---
-            try:
-                # logger.info(f"Processing modified file: {path}") # Optional verbose log
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                
-                # Parse Frontmatter (Tolerant of missing frontmatter)
-                frontmatter_match = re.search(r'^\s*---\s*\n(.*?)\n---\s*\n', content, re.DOTALL | re.MULTILINE)
-                
-                metadata = {}
-                body = content
-                
-                if frontmatter_match:
-                    try:
-                        metadata = yaml.safe_load(frontmatter_match.group(1)) or {}
-                        # Remove frontmatter from body for indexing
-                        body = re.sub(r'^\s*---\s*\n(.*?)\n---\s*\n', '', content, flags=re.DOTALL | re.MULTILINE).strip()
-                    except Exception as e:
-                        logger.warning(f"Failed to parse frontmatter for {filename}: {e}")
-                else:
-                    # --- AUTO-TAGGING FOR RAW FILES ---
-                    if self.agent:
-                         logger.info(f"Auto-tagging raw file: {filename}")
-                         try:
-                             # Use Agent to analyze content
-                             analysis = await self.agent.process(content)
-                             if analysis:
-                                 metadata = {
-                                     "title": analysis.get("title", path.stem),
-                                     "category": analysis.get("category", "Inbox"),
-                                     "tags": analysis.get("tags", []),
-                                     "created": datetime.fromtimestamp(path.stat().st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                                     "status": "active"
-                                 }
-                                 
-                                 # Rewrite File with Frontmatter
-                                 # We keep the file in its current location, just prepend frontmatter
-                                 new_file_content = f"---\n"
-                                 for k, v in metadata.items():
-                                     new_file_content += f"{k}: {json.dumps(v) if isinstance(v, list) else v}\n"
-                                 new_file_content += "---\n\n" + content
-                                 
-                                 with open(path, "w", encoding="utf-8") as f:
-                                     f.write(new_file_content)
-                                     
-                                 logger.info(f"Rewrite complete for {filename}")
-                                 # Update body/content for indexing
-                                 body = content 
-                             else:
-                                 logger.warning(f"Agent failed to tag {filename}")
-                         except Exception as agent_err:
-                             logger.error(f"Auto-tagging error for {filename}: {agent_err}")
-                             
-                    else:
-                        logger.debug(f"{filename} has no frontmatter and no agent available.")
+        previously_indexed = set(index_state)
+        changed_folders = set()
 
-                # --- INFER METADATA IF STILL MISSING (Fallback) ---
-                title = metadata.get("title")
-                if not title:
-                     h1_match = re.search(r'^#\s+(.*)', body, re.MULTILINE)
-                     title = h1_match.group(1).strip() if h1_match else path.stem.replace("_", " ").title()
+        def changed_files():
+            for path in self.vault_root.rglob("*.md"):
+                if ".engram" in str(path): continue
 
-                category = metadata.get("category")
-                if not category:
-                    try:
-                        rel_path = path.relative_to(VAULT_ROOT)
-                        category = str(rel_path.parent) if str(rel_path.parent) != "." else "Inbox"
-                    except: category = "External"
-                    
-                tags = metadata.get("tags", [])
-                created = metadata.get("created", datetime.fromtimestamp(path.stat().st_ctime).strftime('%Y-%m-%d %H:%M:%S'))
-
-                logger.debug(f"Indexing {filename}: Title='{title}', Cat='{category}'")
-
-                self.db.add(
-                    content=body,
-                    metadata={
-                        "filename": filename,
-                        "category": category,
-                        "title": title,
-                        "tags": str(tags),
-                        "created": str(created)
-                    },
-                    doc_id=filename
-                )
-                
-                # Update State
-                index_state[filename] = path.stat().st_mtime # Update with fresh mtime after rewrite
-                nodes_updated += 1
-                logger.info(f"Index Updated: {filename}")
-                
-            except Exception as e:
-                logger.error(f"Failed to index {filename}: {e}")
-            
-        existing_notes = self.db.get_all_notes()
-        existing_ids = existing_notes.get('ids', [])
-        
-        for doc_id in existing_ids:
-            if doc_id not in current_files:
-                 self.db.delete_note(doc_id)
-                 if doc_id in index_state:
-                     del index_state[doc_id]
-                 pruned_count += 1
-                 logger.info(f"Pruned: {doc_id}")
+                filename = path.name
+                current_files.add(filename)
+                # Smart Check: Skip if unchanged
+                if filename in index_state and index_state[filename] == path.stat().st_mtime:
+                    continue
+                yield path
+
+        # Add/Update from Disk through a bounded window: at most `window` files are held,
+        # tagged and embedded at once, so memory stays flat however large the vault is,
+        # while every model endpoint is kept busy with raw files to tag
+        window = self.agent.gateway.concurrency if self.agent else REINDEX_WINDOW
+        pending = changed_files()
+
+        async def worker():
+            nonlocal nodes_updated
+            for path in pending:
+                if await self._reindex_file(path, index_state, previously_indexed, changed_folders):
+                    nodes_updated += 1
+
+        logger.info(f"Reindexing changed files, {window} at a time")
+        await asyncio.gather(*(worker() for _ in range(window)))
+
+        # Ids only, paged: collect the stale ones first, then delete (deleting
+        # while paging would shift the offsets)
+        stale_ids = [doc_id for doc_id in self.db.iter_ids() if doc_id not in current_files]
+        if self.rollups and stale_ids:
+            self._touch_rollups(*(note["metadata"] for note in self.db.iter_notes(ids=stale_ids)))
+
+        for doc_id in stale_ids:
+            self.db.delete_note(doc_id)
+            if self.dedup:
+                self.dedup.remove(doc_id)
+            if self.suggest:
+                self.suggest.remove(doc_id)
+            if doc_id in index_state:
+                del index_state[doc_id]
+            pruned_count += 1
+            logger.info(f"Pruned: {doc_id}")
+            # The file is already gone, so its folder is unknown: re-list from the root
+            self._emit(NODE_REMOVED, id=doc_id, path=None)
+            changed_folders.add("")
                  
-        with open(index_state_path, "w") as f:
-            json.dump(index_state, f, indent=2)
+        atomic_write(index_state_path, json.dumps(index_state, indent=2))
+
+        for folder in sorted(changed_folders):
+            self._emit(FOLDER_CHANGED, path=folder)
 
+        logger.info(f"Reindex complete: {nodes_updated} updated, {pruned_count} pruned")
         return {"updated": nodes_updated, "pruned": pruned_count}
@@ -1,70 +1,96 @@
 from pathlib import Path
+import asyncio
 import json
-import os
-from src.core.config import VAULT_ROOT, CONFIG_FILE, MODELS
-from src.core.logger import setup_logger
+from src.core.config import VAULT_ROOT, CONFIG_FILE, settings
+from src.core.dedup import DuplicateIndex
+from src.core.events import VaultChannel, RESYNC
+from src.core.journal import GroupCommitter
+from src.core.migration import ensure_migration
+from src.core.rollups import RollupIndex
+from src.core.suggest import SuggestIndex
+from src.core.trash import VaultTrash
+from src.core.logger import setup_logger, set_log_level, get_log_levels
 
 logger = setup_logger(__name__)
 
 class SystemService:
-    def __init__(self, db=None):
+    def __init__(self, db=None, vault_root: Path = None, runtime=None, events: VaultChannel = None,
+                 trash: VaultTrash = None, dedup: DuplicateIndex = None, suggest: SuggestIndex = None,
+                 rollups: RollupIndex = None, committer: GroupCommitter = None):
         self.db = db
+        self.vault_root = Path(vault_root or VAULT_ROOT)
+        self.runtime = runtime
+        self.events = events
+        self.trash = trash or VaultTrash(self.vault_root, db)
+        self.dedup = dedup
+        self.suggest = suggest
+        self.rollups = rollups
+        self.committer = committer
 
     def reset_brain(self):
         """
-        Wipes the database and deletes all memory files from the Vault.
+        Empties the vault and its index immediately. Files and vectors are
+        moved to the trash and purged in the background once the undo window
+        (`reset_undo_s`) has passed; until then undo_reset brings them back.
+        Blocking (file renames, store swap); call it off the event loop.
         """
-        # 1. Reset DB
-        if self.db:
-            self.db.reset()
-        
-        # 2. Delete Files from Vault (Safe Delete)
-        deleted_count = 0
-        try:
-            # We want to delete all visible files/folders in VAULT_ROOT
-            # But preserve .engram or other hidden system folders if essential? 
-            # Actually, "Wipe Everything" simplifies logic: Delete all MD files and empty folders.
-            
-            # Walk top-down to find files
-            for root, dirs, files in os.walk(VAULT_ROOT, topdown=False):
-                # Skip hidden directories like .engram inside the walk
-                if ".engram" in root: continue
-                
-                # Delete Files
-                for name in files:
-                    if name.startswith("."): continue # Skip hidden files? Or maybe delete them too? Let's stick to visible/md for safety.
-                    file_path = Path(root) / name
-                    if file_path.suffix == ".md":
-                        try:
-                            os.remove(file_path)
-                            deleted_count += 1
-                        except Exception as e:
-                            logger.error(f"Failed to delete {file_path}: {e}")
-
-                # Delete Empty Directories (after files are gone)
-                # Note: os.walk with topdown=False visits children before parents
-                # so we can try removing directories if they are empty.
-                if root == str(VAULT_ROOT): continue # Don't delete root
-                
-                try:
-                    # check if dir is empty (ignoring hidden files potentially?)
-                    # If we only deleted .md files, other files might remain.
-                    # If the user wants a TOTAL wipe, we should delete everything except .engram.
-                    
-                    # More aggressive wipe:
-                    dir_path = Path(root)
-                    if dir_path.exists() and not any(dir_path.iterdir()):
-                        dir_path.rmdir()
-                except Exception as e:
-                     pass # Directory might not be empty
+        if self.committer and not self.committer.flush(settings.reset_flush_timeout_s):
+            # Otherwise they would land in the fresh store; the notes themselves go to the
+            # trash with the rest, and a reindex after an undo embeds them again
+            logger.warning("Queued saves did not commit in time; dropping them before the reset")
+            self.committer.discard_all()
+        manifest = self.trash.move_to_trash()
+        self._reset_indexes()
 
-        except Exception as e:
-            logger.error(f"Failed to wipe vault files: {e}")
+        # Every client view of this vault is now stale
+        if self.events:
+            self.events.publish(RESYNC)
+
+        logger.info(f"Brain wipe complete. Moved {len(manifest['entries'])} entries to trash.")
+        return {
+            "status": "reset_complete",
+            "reset_id": manifest["id"],
+            "moved_entries": len(manifest["entries"]),
+            "undo_until": manifest["purge_at"]
+        }
+
+    async def undo_reset(self, reset_id: str):
+        """
+        Restores a reset that is still inside its undo window.
+        Raises UnknownResetError once it was purged.
+        """
+        result = await asyncio.to_thread(self.trash.restore, reset_id)
+        self._reset_indexes(reload=True)
+        # The restored store may predate a model change
+        ensure_migration(self.db)
+        if self.events:
+            self.events.publish(RESYNC)
+        return {"status": "restored", **result}
+
+    def list_resets(self):
+        return {"resets": [{
+            "id": manifest["id"],
+            "created": manifest["created"],
+            "undo_until": manifest["purge_at"],
+            "entries": len(manifest["entries"])
+        } for manifest in self.trash.batches()]}
 
-        logger.info(f"Brain wipe complete. Deleted {deleted_count} files.")
-        return {"status": "reset_complete", "deleted_files": deleted_count}
+    def _reset_indexes(self, reload: bool = False):
+        # In-memory indexes mirror the store, which was just swapped
+        if self.dedup:
+            self.dedup.clear()
+        if self.suggest:
+            self.suggest.clear()
+            if reload:
+                self.suggest.load()
+        if self.rollups:
+            # The rollup file moved with the trashed contents (and back on undo)
+            if reload:
+                self.rollups.reload()
+            else:
+                self.rollups.clear()
 
-    def get_vault_structure(self):
+    def get_vault_structure(self, subpath: str = None):
         def build_tree(path: Path):
             tree = []
             try:
@@ -76,7 +102,7 @@ class SystemService:
                     
                     node = {
                         "name": item.name,
-                        "path": str(item.relative_to(VAULT_ROOT)),
+                        "path": str(item.relative_to(self.vault_root)),
                         "type": "folder" if item.is_dir() else "file"
                     }
                     
@@ -89,19 +115,33 @@ class SystemService:
                 # Don't crash the whole tree build, return empty for this node
             return tree
 
+        if not subpath:
+            return {
+                "root": str(self.vault_root),
+                "structure": build_tree(self.vault_root)
+            }
+
+        folder = (self.vault_root / subpath).resolve()
+        if not folder.is_relative_to(self.vault_root.resolve()) or not folder.is_dir():
+            raise ValueError(f"Not a folder in the vault: {subpath}")
+        relative = folder.relative_to(self.vault_root.resolve())
         return {
-            "root": str(VAULT_ROOT),
-            "structure": build_tree(VAULT_ROOT)
+            "root": str(self.vault_root),
+            "path": str(relative),
+            "structure": build_tree(self.vault_root / relative)
         }
 
     def get_config(self):
         return {
-            "vault_path": str(VAULT_ROOT),
-            "chat_model": MODELS["chat"],
+            "vault_path": str(settings.vault_path),
+            "chat_model": settings.chat_model,
+            "embed_model": settings.embed_model,
+            "logging": get_log_levels(),
+            "model_endpoints": self.runtime.gateway.stats() if self.runtime else [],
             "available_models": ["llama3.1:8b", "mistral", "gemma2", "deepseek-coder", "llama3.2"] 
         }
 
-    def update_config(self, vault_path: str = None, chat_model: str = None):
+    def _write_config(self, updates: dict):
         current = {}
         if CONFIG_FILE.exists():
             try:
@@ -109,17 +149,85 @@ class SystemService:
                     current = json.load(f)
             except Exception as e:
                 logger.warning(f"Failed to read existing config (overwriting): {e}")
-        
-        if vault_path:
-            current["vault_path"] = vault_path
-        if chat_model:
-            current["chat_model"] = chat_model
-        
+
+        current.update(updates)
+
         try:
             with open(CONFIG_FILE, "w") as f:
                 json.dump(current, f, indent=2)
         except Exception as e:
             logger.error(f"Failed to save config: {e}")
             raise e
+
+    async def update_config(self, vault_path: str = None, chat_model: str = None,
+                            log_level: str = None, log_levels: dict = None, embed_model: str = None):
+        # Log levels apply immediately; invalid names raise ValueError before anything is saved
+        if log_level:
+            set_log_level(log_level)
+            settings.log_level = log_level.upper()
+        for name, level in (log_levels or {}).items():
+            set_log_level(level, name=name)
+
+        updates = {}
+        if vault_path:
+            updates["vault_path"] = vault_path
+        if chat_model:
+            updates["chat_model"] = chat_model
+        if embed_model:
+            updates["embed_model"] = embed_model
+        if log_level:
+            updates["log_level"] = settings.log_level
+
+        self._write_config(updates)
+
+        if not (vault_path or chat_model or embed_model):
+            return {"status": "updated", "requires_restart": False, "logging": get_log_levels()}
+
+        # Swap live components; in-flight requests finish on the old ones
+        if self.runtime:
+            generation = await self.runtime.reconfigure(vault_path=vault_path, chat_model=chat_model,
+                                                        embed_model=embed_model)
+            return {"status": "updated", "requires_restart": False, "generation": generation}
             
         return {"status": "updated", "requires_restart": True}
+
+    def get_migration(self):
+        """
+        Which embedding model serves this vault and how far a migration to the
+        configured one has come.
+        """
+        migration = self.db.migration
+        return {
+            "embed_model": self.db.embed_model,
+            "target_model": self.db.target_model,
+            "migration": migration.progress() if migration else None
+        }
+
+    async def cancel_migration(self):
+        """
+        Abandons a running migration and keeps the model the store was built with.
+        """
+        migration = self.db.migration
+        if not migration or not migration.active:
+            raise ValueError("No embedding migration is running")
+        await asyncio.to_thread(migration.cancel)
+        return await self.update_config(embed_model=self.db.embed_model)
+
+    def list_vaults(self):
+        return {"vaults": self.runtime.list_vaults()}
+
+    def register_vault(self, name: str, path: str):
+        """
+        Registers an additional vault; it is opened lazily on first request.
+        """
+        self.runtime.register_vault(name, Path(path).expanduser())
+        self._write_config({"vaults": {n: str(p) for n, p in settings.vaults.items()}})
+        return {"status": "registered", "name": name}
+
+    def remove_vault(self, name: str):
+        """
+        Unregisters a vault (its files and index stay on disk).
+        """
+        self.runtime.unregister_vault(name)
+        self._write_config({"vaults": {n: str(p) for n, p in settings.vaults.items()}})
+        return {"status": "removed", "name": name}
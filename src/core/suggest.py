@@ -0,0 +1,184 @@
+import bisect
+import re
+import threading
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TICKET_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]+-\d+\b")
+TOKEN_PATTERN = re.compile(r"[\w-]+")
+MIN_FUZZY_SCORE = 0.5
+
+
+def extract_tickets(text: str) -> list:
+    """Ticket IDs (e.g. JIRA-123) mentioned in text, in first-seen order."""
+    return list(dict.fromkeys(TICKET_PATTERN.findall(text or "")))
+
+
+def parse_list(value) -> list:
+    """
+    Tags/tickets come back from Chroma as "a,b" or "['a', 'b']" strings.
+    """
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    if not value:
+        return []
+    return [part.strip(" '\"") for part in str(value).strip("[]").split(",") if part.strip(" '\"")]
+
+
+def _tokens(*texts) -> set:
+    tokens = set()
+    for text in texts:
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            tokens.add(token)
+            if "-" in token:
+                tokens.update(part for part in token.split("-") if part)
+    return tokens
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """
+    In-memory typeahead index over note titles, tags and ticket IDs.
+    Prefix lookups go through a sorted token list; a trigram index catches typos.
+    Built from Chroma metadata only (no documents, no Ollama) and kept current
+    by the write paths.
+    """
+    def __init__(self, db):
+        self.db = db
+        self._entries = {}
+        self._token_docs = {}
+        self._sorted_tokens = []
+        self._trigram_docs = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock:
+            for note in self.db.iter_notes(fields=("metadatas",)):
+                self.add(note["id"], note["metadata"])
+        logger.info(f"Suggest index loaded: {len(self._entries)} notes")
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._token_docs = {}
+            self._sorted_tokens = []
+            self._trigram_docs = {}
+
+    def add(self, doc_id: str, metadata: dict):
+        title = str(metadata.get("title") or doc_id)
+        tags = parse_list(metadata.get("tags"))
+        tickets = parse_list(metadata.get("tickets")) or extract_tickets(title)
+        entry = {
+            "title": title,
+            "category": metadata.get("category"),
+            "tags": tags,
+            "tickets": tickets,
+            "tokens": _tokens(title, *tags, *tickets),
+            "trigrams": set().union(*(_trigrams(text) for text in [title, *tags, *tickets])),
+        }
+
+        with self._lock:
+            self.remove(doc_id)
+            self._entries[doc_id] = entry
+            for token in entry["tokens"]:
+                docs = self._token_docs.get(token)
+                if docs is None:
+                    docs = self._token_docs[token] = set()
+                    bisect.insort(self._sorted_tokens, token)
+                docs.add(doc_id)
+            for gram in entry["trigrams"]:
+                self._trigram_docs.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            entry = self._entries.pop(doc_id, None)
+            if not entry:
+                return
+            for token in entry["tokens"]:
+                docs = self._token_docs.get(token)
+                if docs is None:
+                    continue
+                docs.discard(doc_id)
+                if not docs:
+                    del self._token_docs[token]
+                    i = bisect.bisect_left(self._sorted_tokens, token)
+                    if i < len(self._sorted_tokens) and self._sorted_tokens[i] == token:
+                        del self._sorted_tokens[i]
+            for gram in entry["trigrams"]:
+                docs = self._trigram_docs.get(gram)
+                if docs:
+                    docs.discard(doc_id)
+                    if not docs:
+                        del self._trigram_docs[gram]
+
+    def _prefix_docs(self, prefix: str) -> set:
+        docs = set()
+        i = bisect.bisect_left(self._sorted_tokens, prefix)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(prefix):
+            docs |= self._token_docs[self._sorted_tokens[i]]
+            i += 1
+        return docs
+
+    def _describe(self, doc_id: str, query: str, score: float, kind: str = None) -> dict:
+        entry = self._entries[doc_id]
+        if kind is None:
+            if any(t.lower().startswith(query) for t in entry["tickets"]):
+                kind = "ticket"
+            elif any(t.lower().startswith(query) for t in entry["tags"]):
+                kind = "tag"
+            else:
+                kind = "title"
+        return {
+            "id": doc_id,
+            "title": entry["title"],
+            "category": entry["category"],
+            "tags": entry["tags"],
+            "tickets": entry["tickets"],
+            "kind": kind,
+            "score": round(score, 3)
+        }
+
+    def query(self, q: str, limit: int = 8) -> list:
+        query = q.strip().lower()
+        words = TOKEN_PATTERN.findall(query)
+        if not words:
+            return []
+
+        with self._lock:
+            # Every query word must prefix-match some token of the note
+            candidates = None
+            for word in words:
+                docs = self._prefix_docs(word)
+                candidates = docs if candidates is None else candidates & docs
+                if not candidates:
+                    break
+
+            results = []
+            for doc_id in candidates or ():
+                title = self._entries[doc_id]["title"].lower()
+                score = 3.0 if title.startswith(query) else 2.0 if query in title else 1.0
+                results.append(self._describe(doc_id, query, score))
+            results.sort(key=lambda r: (-r["score"], len(r["title"])))
+
+            # Fuzzy fallback for typos once the user has typed enough
+            if len(results) < limit and len(query) >= 3:
+                grams = _trigrams(query)
+                overlap = {}
+                for gram in grams:
+                    for doc_id in self._trigram_docs.get(gram, ()):
+                        overlap[doc_id] = overlap.get(doc_id, 0) + 1
+                seen = {r["id"] for r in results}
+                fuzzy = [
+                    (count / len(grams), doc_id) for doc_id, count in overlap.items()
+                    if doc_id not in seen and count / len(grams) >= MIN_FUZZY_SCORE
+                ]
+                fuzzy.sort(reverse=True)
+                for score, doc_id in fuzzy[:limit - len(results)]:
+                    results.append(self._describe(doc_id, query, score, kind="fuzzy"))
+
+            return results[:limit]
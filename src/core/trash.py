@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from .config import settings
+from .fs import atomic_write
+from .rollups import ROLLUP_FILE
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PURGE_BATCH = 200  # Files removed between pauses while purging
+PURGE_PAUSE_S = 0.05
+STATE_FILES = ("index_state.json", ROLLUP_FILE)  # Under .engram; describe the trashed contents
+
+
+class UnknownResetError(KeyError):
+    """Raised when undoing a reset that does not exist or was already purged."""
+
+
+class VaultTrash:
+    """
+    Instant vault reset with an undo window.
+
+    A reset renames the vault's visible entries, plus the index state and
+    rollups describing them, into `.engram/trash/<id>/` (same filesystem, so
+    every move is a metadata-only rename) and detaches the vector collection, leaving an empty store in its place. After
+    `reset_undo_s` a background thread deletes the batch in small, paced
+    steps; until then `restore` puts everything back. Batches survive a
+    restart: their manifests are rescheduled when the vault is opened again.
+    """
+    def __init__(self, vault_root: Path, db):
+        self.vault_root = Path(vault_root)
+        self.root = self.vault_root / ".engram" / "trash"
+        self.db = db
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._closed = False
+
+    def _manifest_path(self, reset_id: str) -> Path:
+        return self.root / reset_id / "manifest.json"
+
+    def _load(self, reset_id: str) -> dict:
+        if not reset_id or reset_id.startswith(".") or Path(reset_id).name != reset_id:
+            raise UnknownResetError(reset_id)
+        path = self._manifest_path(reset_id)
+        if not path.exists():
+            raise UnknownResetError(reset_id)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def batches(self) -> list:
+        """
+        Resets still inside their undo window (or awaiting purge), oldest first.
+        """
+        batches = []
+        for path in sorted(self.root.glob("*/manifest.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    batches.append(json.load(f))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable trash manifest {path}: {e}")
+        return batches
+
+    def move_to_trash(self) -> dict:
+        """
+        Moves the vault contents and its vector collection aside. Returns the manifest.
+
+        The manifest is written first, marked pending, so a reset interrupted
+        by a crash is found and rolled back on the next start; one that fails
+        here is rolled back before the error is raised.
+        """
+        reset_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        batch_dir = self.root / reset_id
+        files_dir = batch_dir / "vault"
+
+        with self._lock:
+            files_dir.mkdir(parents=True)
+            created = time.time()
+            manifest = {
+                "id": reset_id,
+                "created": created,
+                "purge_at": created + settings.reset_undo_s,
+                "entries": [item.name for item in sorted(self.vault_root.iterdir())
+                            # .engram (store, journal, trash) and other hidden folders stay
+                            if not item.name.startswith(".")],
+                "collection": f"trash-{reset_id}",
+                "pending": True
+            }
+            atomic_write(self._manifest_path(reset_id), json.dumps(manifest, indent=2))
+
+            try:
+                for name in manifest["entries"]:
+                    os.rename(self.vault_root / name, files_dir / name)
+
+                for state_file in STATE_FILES:
+                    state = self.vault_root / ".engram" / state_file
+                    if state.exists():
+                        os.rename(state, batch_dir / state_file)
+
+                self.db.detach(manifest["collection"])
+            except Exception:
+                logger.error(f"Vault reset {reset_id} failed, rolling back")
+                self._put_back(manifest)
+                raise
+
+            del manifest["pending"]
+            atomic_write(self._manifest_path(reset_id), json.dumps(manifest, indent=2))
+
+        self._schedule(manifest)
+        logger.info(f"Vault reset {reset_id}: {len(manifest['entries'])} entries moved to trash")
+        return manifest
+
+    def restore(self, reset_id: str) -> dict:
+        """
+        Undoes a reset. Notes created since keep their names; a restored file
+        that clashes with one is put back as "<name> (restored)".
+        """
+        with self._lock:
+            manifest = self._load(reset_id)
+            timer = self._timers.pop(reset_id, None)
+            if timer:
+                timer.cancel()
+            renamed, carried = self._put_back(manifest)
+
+        logger.info(f"Vault reset {reset_id} undone ({renamed} clashing files renamed)")
+        return {"id": reset_id, "restored_entries": len(manifest["entries"]),
+                "renamed": renamed, "carried_over": carried}
+
+    def _put_back(self, manifest: dict) -> tuple:
+        """
+        Returns whatever of a reset made it into the trash, then removes the
+        batch. Also unwinds a reset that stopped part way. Caller holds the lock.
+        """
+        batch_dir = self.root / manifest["id"]
+        renamed = 0
+        for name in manifest["entries"]:
+            source = batch_dir / "vault" / name
+            if source.exists() or source.is_symlink():
+                renamed += self._restore_entry(source, self.vault_root / name)
+
+        self._restore_index_state(batch_dir / "index_state.json")
+        rollups = batch_dir / ROLLUP_FILE
+        if rollups.exists():
+            # Chunk summaries are cached by content, so the refresh after undo is cheap
+            os.replace(rollups, self.vault_root / ".engram" / ROLLUP_FILE)
+        carried = 0
+        if self.db.has_collection(manifest["collection"]):
+            carried = self.db.reattach(manifest["collection"])
+        self._remove_tree(batch_dir, paced=False)
+        return renamed, carried
+
+    def _restore_entry(self, source: Path, target: Path) -> int:
+        if not (target.exists() or target.is_symlink()):
+            os.rename(source, target)
+            return 0
+        if source.is_dir() and target.is_dir():
+            # Folder recreated since the reset: merge into it
+            renamed = sum(self._restore_entry(child, target / child.name) for child in list(source.iterdir()))
+            source.rmdir()
+            return renamed
+
+        aside = target.with_name(f"{target.stem} (restored){target.suffix}")
+        n = 2
+        while aside.exists():
+            aside = target.with_name(f"{target.stem} (restored {n}){target.suffix}")
+            n += 1
+        os.rename(source, aside)
+        return 1
+
+    def _restore_index_state(self, saved: Path):
+        if not saved.exists():
+            return
+        current_path = self.vault_root / ".engram" / "index_state.json"
+        with open(saved, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if current_path.exists():
+            with open(current_path, "r", encoding="utf-8") as f:
+                # Files indexed since the reset are the ones on disk now
+                state.update(json.load(f))
+        atomic_write(current_path, json.dumps(state, indent=2))
+
+    def purge(self, reset_id: str):
+        """
+        Permanently deletes a reset's files and collection, pacing the file
+        deletes so a large vault does not starve request handling of disk I/O.
+        """
+        with self._lock:
+            self._timers.pop(reset_id, None)
+            try:
+                manifest = self._load(reset_id)
+            except UnknownResetError:
+                return  # Undone or purged already
+            # Drop the manifest first: from here on the reset can no longer be undone
+            os.remove(self._manifest_path(reset_id))
+
+        self.db.drop(manifest["collection"])
+        removed = self._remove_tree(self.root / reset_id, paced=True)
+        logger.info(f"Vault reset {reset_id} purged ({removed} files)")
+
+    def _remove_tree(self, root: Path, paced: bool) -> int:
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            for name in filenames:
+                try:
+                    os.remove(os.path.join(dirpath, name))
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Failed to purge {name}: {e}")
+                if paced and removed % PURGE_BATCH == 0:
+                    time.sleep(PURGE_PAUSE_S)
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path):
+                    os.remove(path)
+            try:
+                os.rmdir(dirpath)
+            except OSError as e:
+                logger.warning(f"Failed to remove {dirpath}: {e}")
+        return removed
+
+    def _schedule(self, manifest: dict):
+        with self._lock:
+            if self._closed or manifest["id"] in self._timers:
+                return
+            delay = max(0.0, manifest["purge_at"] - time.time())
+            timer = threading.Timer(delay, self.purge, args=(manifest["id"],))
+            timer.name = f"engram-purge-{manifest['id']}"
+            timer.daemon = True
+            self._timers[manifest["id"]] = timer
+            timer.start()
+
+    def resume(self):
+        """
+        Schedules purges for resets left in the trash by a previous run, and
+        rolls back any reset that a crash interrupted.
+        """
+        for manifest in self.batches():
+            if manifest.get("pending"):
+                logger.warning(f"Rolling back interrupted vault reset {manifest['id']}")
+                with self._lock:
+                    self._put_back(manifest)
+                continue
+            self._schedule(manifest)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            timers = list(self._timers.values())
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
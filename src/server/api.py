@@ -4,20 +4,27 @@ from fastapi.middleware.cors import CORSMiddleware
 import traceback
 import time
 
-from src.server.routers import memories, search, system
+from src.server.routers import debug, events, memories, search, system
+from src.server.encoding import CompressionMiddleware
+from src.server.middleware import ProfilingMiddleware, RequestContextMiddleware
 from src.core.logger import setup_logger
 
 logger = setup_logger("server")
 
 from contextlib import asynccontextmanager
-from src.core.config import init_folders
+from src.core.config import init_folders, settings
+from src.server.dependencies import get_runtime
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Ensure folders exist on startup
     init_folders()
+    # Opens the default vault, reconciling any save/delete interrupted by a crash
+    get_runtime()
     logger.info("System initialized.")
     yield
+    # Flush grouped vector-store commits before exit
+    get_runtime().close()
 
 app = FastAPI(title="Engram Server", version="1.0.0", lifespan=lifespan)
 
@@ -39,12 +46,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Negotiated brotli/gzip for large payloads (/graph, /tree, /ask)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Opt-in profiling of armed routes (/debug/profiles); inside the request-id middleware so profiles carry it
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost: correlation id for every log line of a request
+app.add_middleware(RequestContextMiddleware)
+
 # Include Routers
 app.include_router(search.router)
 app.include_router(memories.router)
 app.include_router(system.router)
+app.include_router(events.router)
+app.include_router(debug.router)
 
 @app.get("/health")
 async def health_check():
@@ -1,41 +1,89 @@
 from functools import lru_cache
-from src.core.db import VectorDB
-from src.core.agent import BrainAgent
-from src.core.fs import ObsidianWriter
+from typing import Optional
+from fastapi import Depends, HTTPException, status
+from src.core.gateway import get_model_gateway
+from src.core.runtime import Runtime, Components, UnknownVaultError
 from src.core.services.memory_service import MemoryService
 from src.core.services.analysis_service import AnalysisService
 from src.core.services.system_service import SystemService
 
 @lru_cache()
+def get_runtime():
+    """Singleton Runtime (owns the swappable VectorDB/ObsidianWriter/BrainAgent)"""
+    return Runtime(gateway=get_model_gateway())
+
+def get_components(vault: Optional[str] = None):
+    """Leases the selected vault's current component generation for the lifetime of a request"""
+    runtime = get_runtime()
+    try:
+        components = runtime.acquire(vault)
+    except UnknownVaultError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown vault: {vault}")
+    try:
+        yield components
+    finally:
+        runtime.release(components)
+
+def get_fanout_components(all_vaults: bool = False):
+    """Leases every registered vault when a query fans out across vaults"""
+    if not all_vaults:
+        yield {}
+        return
+    runtime = get_runtime()
+    leases = runtime.acquire_all()
+    try:
+        yield leases
+    finally:
+        for components in leases.values():
+            runtime.release(components)
+
 def get_vector_db():
-    """Singleton VectorDB instance"""
-    return VectorDB()
+    """Current VectorDB instance"""
+    return get_runtime().current.db
 
-@lru_cache()
 def get_brain_agent():
-    """Singleton BrainAgent instance"""
-    return BrainAgent()
+    """Current BrainAgent instance"""
+    return get_runtime().current.agent
 
-@lru_cache()
 def get_obsidian_writer():
-    """Singleton ObsidianWriter instance"""
-    return ObsidianWriter()
+    """Current ObsidianWriter instance"""
+    return get_runtime().current.writer
 
-def get_memory_service():
+def get_memory_service(components: Components = Depends(get_components)):
     """Dependency Provider for MemoryService"""
     return MemoryService(
-        db=get_vector_db(), 
-        writer=get_obsidian_writer(),
-        agent=get_brain_agent()
+        db=components.db, 
+        writer=components.writer,
+        agent=components.agent,
+        journal=components.journal,
+        committer=components.committer,
+        dedup=components.dedup,
+        suggest=components.suggest,
+        events=components.events,
+        rollups=components.rollups
     )
 
-def get_analysis_service():
+def get_analysis_service(components: Components = Depends(get_components),
+                         fanout: dict = Depends(get_fanout_components)):
     """Dependency Provider for AnalysisService"""
     return AnalysisService(
-        agent=get_brain_agent(),
-        db=get_vector_db()
+        agent=components.agent,
+        db=components.db,
+        vault_dbs={name: c.db for name, c in fanout.items()},
+        suggest=components.suggest,
+        rollups=components.rollups
     )
 
-def get_system_service():
+def get_system_service(components: Components = Depends(get_components)):
     """Dependency Provider for SystemService"""
-    return SystemService(db=get_vector_db())
+    return SystemService(
+        db=components.db,
+        vault_root=components.vault_path,
+        runtime=get_runtime(),
+        events=components.events,
+        trash=components.trash,
+        dedup=components.dedup,
+        suggest=components.suggest,
+        rollups=components.rollups,
+        committer=components.committer
+    )
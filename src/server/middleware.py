@@ -0,0 +1,81 @@
+import re
+import time
+import uuid
+from src.core.logger import setup_logger, request_id_var
+from src.core.profiling import get_profiler
+
+logger = setup_logger(__name__)
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Accept caller-supplied ids only if they are short and log-safe
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """
+    Assigns every request a correlation id (reusing a valid incoming
+    X-Request-ID), exposes it to all log lines through a contextvar and echoes
+    it back in the response headers.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(REQUEST_ID_HEADER, b"").decode("latin-1")
+        request_id = incoming if _VALID_ID.match(incoming) else uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status_code = None
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != REQUEST_ID_HEADER]
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.debug(f"{scope['method']} {scope['path']} -> {status_code} in {elapsed_ms:.1f}ms")
+            request_id_var.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests picked by an armed rule (see src.core.profiling). With
+    nothing armed it costs one attribute check per request.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.profiler = get_profiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.armed:
+            await self.app(scope, receive, send)
+            return
+
+        capture = self.profiler.begin(scope["method"], scope["path"], request_id_var.get())
+        if capture is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            capture.finish(status_code)
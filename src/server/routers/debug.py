@@ -0,0 +1,74 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from src.core.config import settings
+from src.core.profiling import CPROFILE, Profiler, collapsed, get_profiler
+from src.server.schemas import ProfileArm
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+def require_profiling_token(x_profiling_token: Optional[str] = Header(default=None)):
+    """
+    Profiles expose code paths and note-derived timings, so the endpoints exist
+    only when `profiling_token` is configured and the caller sends it.
+    """
+    if not settings.profiling_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    if not x_profiling_token or not secrets.compare_digest(x_profiling_token, settings.profiling_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+router = APIRouter(prefix="/debug/profiles", tags=["Debug"], dependencies=[Depends(require_profiling_token)])
+
+@router.post("/arm", status_code=status.HTTP_201_CREATED)
+async def arm_profiling(data: ProfileArm, profiler: Profiler = Depends(get_profiler)):
+    """
+    Profiles the next `count` requests to `route`, or with `threshold_ms` the
+    next `count` that take longer than that.
+    """
+    try:
+        return profiler.arm(data.route, count=data.count, threshold_ms=data.threshold_ms,
+                            mode=data.mode, method=data.method)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("")
+async def list_profiles(profiler: Profiler = Depends(get_profiler)):
+    """Active arms and captured profiles, newest first."""
+    return profiler.list()
+
+@router.delete("")
+async def clear_profiles(profiler: Profiler = Depends(get_profiler)):
+    """Disarms every rule and drops the captured profiles."""
+    disarmed = profiler.disarm()
+    profiler.clear()
+    return {"status": "cleared", "disarmed": disarmed}
+
+@router.delete("/arm/{arm_id}")
+async def disarm_profiling(arm_id: str, profiler: Profiler = Depends(get_profiler)):
+    if not profiler.disarm(arm_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown arm: {arm_id}")
+    return {"status": "disarmed", "id": arm_id}
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str, format: Optional[str] = None,
+                           profiler: Profiler = Depends(get_profiler)):
+    """
+    cProfile captures download as pstats (`python -m pstats`, snakeviz); sampled
+    ones as collapsed stacks (flamegraph.pl, speedscope).
+    """
+    entry = profiler.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown profile: {profile_id}")
+    native = "pstats" if entry["mode"] == CPROFILE else "collapsed"
+    format = format or native
+    if format != native:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Profile {profile_id} was captured with {entry['mode']}; "
+                                   f"it is available as {native} only")
+
+    if format == "pstats":
+        return Response(entry["pstats"], media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+    return Response(collapsed(entry), media_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'})
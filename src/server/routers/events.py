@@ -0,0 +1,52 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from src.core.config import DEFAULT_VAULT
+from src.core.events import ChangeFeed, get_change_feed
+from src.server.dependencies import get_runtime
+from src.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+router = APIRouter(prefix="", tags=["Events"])
+
+KEEPALIVE_S = 15.0
+RETRY_MS = 3000
+
+def _format(event: dict) -> str:
+    return f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/events")
+async def change_feed(request: Request, vault: Optional[str] = None, all_vaults: bool = False,
+                      last_event_id: Optional[int] = Header(default=None),
+                      feed: ChangeFeed = Depends(get_change_feed)):
+    """
+    Server-sent events with fine-grained vault changes (node.added, node.updated,
+    node.removed, folder.changed). Clients apply them to their /graph and /tree
+    snapshots; on "resync" they refetch. Reconnects resume from Last-Event-ID.
+    """
+    vault = vault or DEFAULT_VAULT
+    if not all_vaults and vault not in get_runtime().vault_names():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown vault: {vault}")
+
+    async def stream():
+        # Deliberately holds no component lease: a long-lived stream must not keep a vault open
+        subscription = feed.subscribe(vault=None if all_vaults else vault, last_seq=last_event_id)
+        try:
+            yield f"retry: {RETRY_MS}\n: connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format(event)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,5 +1,7 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, status
-from typing import Dict
+from fastapi.responses import StreamingResponse
+from typing import Dict, Optional
 from src.core.services.memory_service import MemoryService
 # from src.server.schemas import UpdateContent
 from src.server.dependencies import get_memory_service
@@ -9,14 +11,21 @@ logger = setup_logger(__name__)
 router = APIRouter(prefix="", tags=["Memories"])
 
 @router.post("/save", status_code=status.HTTP_201_CREATED)
-async def save_note(data: Dict, service: MemoryService = Depends(get_memory_service)):
+async def save_note(data: Dict, on_duplicate: Optional[str] = None, service: MemoryService = Depends(get_memory_service)):
     """
     Save the analyzed note to the File System and Vector Database.
+    on_duplicate: "merge", "offer" or "create" (defaults to the configured dedup_mode).
     """
+    if on_duplicate not in (None, "merge", "offer", "create"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid on_duplicate: {on_duplicate}")
     try:
-        filepath = service.save_memory(data)
-        logger.info(f"Memory saved: {filepath}")
-        return {"status": "success", "filepath": filepath}
+        # Off the event loop: embedding may wait out model retries and backoff
+        result = await asyncio.to_thread(service.save_memory, data, on_duplicate=on_duplicate)
+        if result.get("status") == "duplicate":
+            logger.info(f"Duplicate offered instead of saving: {result['duplicate_of']['id']}")
+            return result
+        logger.info(f"Memory saved: {result['filepath']}")
+        return {"status": "success", **result}
     except Exception as e:
         logger.error(f"Failed to save memory: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -27,7 +36,7 @@ async def delete_memory(doc_id: str, service: MemoryService = Depends(get_memory
     Manually delete a memory from the DB and FileSystem.
     """
     try:
-        service.delete_memory(doc_id)
+        await asyncio.to_thread(service.delete_memory, doc_id)
         logger.info(f"Memory deleted: {doc_id}")
         return {"status": "success", "id": doc_id}
     except Exception as e:
@@ -47,3 +56,29 @@ async def reindex_memories(service: MemoryService = Depends(get_memory_service))
     except Exception as e:
         logger.error(f"Reindex failed: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/dedupe")
+async def dedupe_memories(apply: bool = False, service: MemoryService = Depends(get_memory_service)):
+    """
+    Finds near-duplicate notes across the vault. Dry run unless apply=true,
+    in which case each cluster is merged into its oldest note.
+    """
+    try:
+        result = await asyncio.to_thread(service.dedupe_vault, apply=apply)
+        logger.info(f"Dedupe complete: {result['clusters']} clusters, {result['removed']} removed")
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.error(f"Dedupe failed: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/export")
+async def export_memories(fields: str = "metadata,content", service: MemoryService = Depends(get_memory_service)):
+    """
+    Streams every stored note as NDJSON, paged through the vector store.
+    fields: comma-separated "content", "metadata" and/or "embedding".
+    """
+    try:
+        chunks = service.export_notes([f.strip() for f in fields.split(",") if f.strip()])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
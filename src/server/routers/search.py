@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from src.core.services.analysis_service import AnalysisService
-from src.server.schemas import NoteInput, RecallQuery
+from src.server.schemas import NoteInput, RecallQuery, AskResponse, GraphResponse, SuggestResponse
+from src.server.encoding import negotiate
 from src.server.dependencies import get_analysis_service
 from src.core.logger import setup_logger
 
@@ -18,24 +19,54 @@ async def analyze_input(input_data: NoteInput, service: AnalysisService = Depend
         logger.error(f"Analysis failed: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.post("/ask")
-async def ask_brain(query: RecallQuery, service: AnalysisService = Depends(get_analysis_service)):
+@router.post("/ask", response_model=AskResponse)
+async def ask_brain(query: RecallQuery, request: Request, service: AnalysisService = Depends(get_analysis_service)):
     """
     Recall memories and chat with the system.
     """
     try:
-        return await service.ask(query.query)
+        return negotiate(request, await service.ask(query.query, token_budget=query.token_budget))
     except Exception as e:
         logger.error(f"Ask/Recall failed: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.get("/graph")
-async def get_knowledge_graph(service: AnalysisService = Depends(get_analysis_service)):
+@router.get("/suggest", response_model=SuggestResponse)
+async def suggest(q: str = "", limit: int = 8, service: AnalysisService = Depends(get_analysis_service)):
+    """
+    Typeahead over note titles, tags and ticket IDs (in-memory, no model calls).
+    """
+    try:
+        return service.suggest(q, limit=max(1, min(limit, 50)))
+    except Exception as e:
+        logger.error(f"Suggest failed: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/rollups")
+async def rollup_status(service: AnalysisService = Depends(get_analysis_service)):
+    """
+    Cached per-category / per-week summaries used for broad /ask questions.
+    """
+    try:
+        return service.rollup_status()
+    except Exception as e:
+        logger.error(f"Failed to get rollups: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/rollups/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_rollups(service: AnalysisService = Depends(get_analysis_service)):
+    try:
+        return service.refresh_rollups()
+    except Exception as e:
+        logger.error(f"Failed to schedule rollup refresh: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/graph", response_model=GraphResponse)
+async def get_knowledge_graph(request: Request, service: AnalysisService = Depends(get_analysis_service)):
     """
     Returns nodes and links for knowledge graph visualization.
     """
     try:
-        return service.get_graph_data()
+        return negotiate(request, service.get_graph_data())
     except Exception as e:
         logger.error(f"Failed to fetch knowledge graph: {e}")
         # Return empty structure to avoid breaking UI, but log the error.
@@ -1,5 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from src.server.schemas import ConfigUpdate
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from src.server.schemas import ConfigUpdate, TreeResponse, VaultRegistration
+from src.core.runtime import UnknownVaultError
+from src.core.trash import UnknownResetError
+from src.server.encoding import negotiate
 from src.core.services.system_service import SystemService
 from src.server.dependencies import get_system_service
 from src.core.logger import setup_logger
@@ -7,10 +12,16 @@ from src.core.logger import setup_logger
 logger = setup_logger(__name__)
 router = APIRouter(prefix="", tags=["System"])
 
-@router.get("/tree")
-async def get_vault_structure(service: SystemService = Depends(get_system_service)):
+@router.get("/tree", response_model=TreeResponse, response_model_exclude_none=True)
+async def get_vault_structure(request: Request, path: Optional[str] = None,
+                              service: SystemService = Depends(get_system_service)):
+    """
+    Vault file tree; `path` limits it to one folder (re-listing after a folder.changed event).
+    """
     try:
-        return service.get_vault_structure()
+        return negotiate(request, service.get_vault_structure(path))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get vault structure: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -26,7 +37,11 @@ async def get_config(service: SystemService = Depends(get_system_service)):
 @router.post("/config")
 async def update_config(data: ConfigUpdate, service: SystemService = Depends(get_system_service)):
     try:
-        return service.update_config(data.vault_path, data.chat_model)
+        return await service.update_config(data.vault_path, data.chat_model,
+                                           log_level=data.log_level, log_levels=data.log_levels,
+                                           embed_model=data.embed_model)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to update config: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -34,7 +49,78 @@ async def update_config(data: ConfigUpdate, service: SystemService = Depends(get
 @router.post("/reset")
 async def reset_brain(service: SystemService = Depends(get_system_service)):
     try:
-        return service.reset_brain()
+        return await asyncio.to_thread(service.reset_brain)
     except Exception as e:
         logger.error(f"Failed to reset brain: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/reset")
+async def list_resets(service: SystemService = Depends(get_system_service)):
+    """
+    Resets that can still be undone.
+    """
+    try:
+        return service.list_resets()
+    except Exception as e:
+        logger.error(f"Failed to list resets: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/reset/{reset_id}/undo")
+async def undo_reset(reset_id: str, service: SystemService = Depends(get_system_service)):
+    try:
+        return await service.undo_reset(reset_id)
+    except UnknownResetError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Reset {reset_id} not found (already purged or undone)")
+    except Exception as e:
+        logger.error(f"Failed to undo reset {reset_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/embeddings/migration")
+async def get_migration(service: SystemService = Depends(get_system_service)):
+    """
+    Embedding model in use and progress of a migration to a newly configured one.
+    """
+    try:
+        return service.get_migration()
+    except Exception as e:
+        logger.error(f"Failed to get migration status: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.delete("/embeddings/migration")
+async def cancel_migration(service: SystemService = Depends(get_system_service)):
+    try:
+        return await service.cancel_migration()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to cancel migration: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/vaults")
+async def list_vaults(service: SystemService = Depends(get_system_service)):
+    try:
+        return service.list_vaults()
+    except Exception as e:
+        logger.error(f"Failed to list vaults: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/vaults", status_code=status.HTTP_201_CREATED)
+async def register_vault(data: VaultRegistration, service: SystemService = Depends(get_system_service)):
+    try:
+        return service.register_vault(data.name, data.path)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to register vault {data.name}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.delete("/vaults/{name}")
+async def remove_vault(name: str, service: SystemService = Depends(get_system_service)):
+    try:
+        return service.remove_vault(name)
+    except UnknownVaultError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown vault: {name}")
+    except Exception as e:
+        logger.error(f"Failed to remove vault {name}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional
 
 class NoteInput(BaseModel):
     text: str
@@ -7,10 +7,97 @@ class NoteInput(BaseModel):
 
 class RecallQuery(BaseModel):
     query: str
+    token_budget: Optional[int] = Field(default=None, ge=64, le=32000)  # Defaults to settings.ask_token_budget
 
 class UpdateContent(BaseModel):
     content: str
 
+class VaultRegistration(BaseModel):
+    name: str
+    path: str
+
 class ConfigUpdate(BaseModel):
     vault_path: Optional[str] = None
     chat_model: Optional[str] = None
+    embed_model: Optional[str] = None  # Changing it starts a background re-embedding migration
+    log_level: Optional[str] = None  # Applied to every logger
+    log_levels: Optional[Dict[str, str]] = None  # Per-logger overrides, e.g. {"src.core.db": "DEBUG"}
+
+class ProfileArm(BaseModel):
+    route: str  # Exact path ("/ask") or a prefix ending in "*"
+    method: Optional[str] = None
+    count: int = Field(default=1, ge=1, le=100)  # Requests to capture (with threshold_ms: slow ones)
+    threshold_ms: Optional[float] = Field(default=None, gt=0)  # Keep only requests slower than this
+    mode: Optional[str] = None  # "cprofile" | "sample"; defaults to sample for threshold arms
+
+# --- Response Models (serialized straight to JSON bytes by FastAPI) ---
+
+class AskSource(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    filename: Optional[str] = None
+    title: Optional[str] = None
+    category: Optional[str] = None
+    vault: Optional[str] = None
+    tokens: Optional[int] = None  # Context tokens this note contributed
+    snippet: str = ""
+
+class AskContext(BaseModel):
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+    selected: int = 0
+
+class AskResponse(BaseModel):
+    answer: str
+    degraded: bool = False
+    route: str = "search"  # "search" (retrieved notes) or "rollups" (cached summaries)
+    context: Optional[AskContext] = None
+    sources: List[AskSource] = []
+    skipped_vaults: List[str] = []  # Fan-out vaults left out (other embedding model, or failed)
+
+class Suggestion(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    id: str
+    title: str
+    category: Optional[str] = None
+    tags: List[str] = []
+    tickets: List[str] = []
+    kind: str
+    score: float
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion] = []
+
+class GraphNode(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    id: str
+    name: str
+    val: int = 1
+    group: str
+    color: str
+    summary: str = ""
+    tags: str = ""
+    created: str = "Unknown"
+
+class GraphLink(BaseModel):
+    source: str
+    target: str
+
+class GraphResponse(BaseModel):
+    nodes: List[GraphNode] = []
+    links: List[GraphLink] = []
+
+class TreeNode(BaseModel):
+    name: str
+    path: str
+    type: str
+    children: Optional[List["TreeNode"]] = None
+
+class TreeResponse(BaseModel):
+    root: str
+    path: Optional[str] = None  # Set when only one folder was listed
+    structure: List[TreeNode] = []
@@ -0,0 +1,135 @@
+"""
+Deterministic stand-in for the Ollama HTTP API, used by the load-test harness.
+
+Serves /api/chat, /api/embeddings and /api/embed with canned, hash-derived
+output and a configurable simulated model latency, so the real Engram server
+can be driven end to end without a GPU.
+
+Usage:
+    python -m src.tools.fake_ollama --port 11500 --chat-latency-ms 300
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+EMBED_DIM = 64
+CATEGORIES = ["Work/Tickets", "Work/Meetings", "Work/Tech", "Work/Planning", "Work/General"]
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> list:
+    """Stable pseudo-embedding: same text, same vector."""
+    digest = b""
+    counter = 0
+    while len(digest) < dim:
+        digest += hashlib.sha256(f"{counter}:{text}".encode()).digest()
+        counter += 1
+    return [(b - 128) / 128 for b in digest[:dim]]
+
+
+def fake_analysis(text: str) -> dict:
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    words = [w.strip(".,:;!?").lower() for w in text.split() if len(w) > 3]
+    title = " ".join(words[:4]).title() or "Untitled"
+    return {
+        "is_clear": True,
+        "clarifying_question": "",
+        "category": CATEGORIES[int(digest[:2], 16) % len(CATEGORIES)],
+        "tags": sorted(set(words[:3])) or ["note"],
+        "title": title,
+        "summary": f"# {title}\n{text}"
+    }
+
+
+def create_app(chat_latency_ms: float = 200, embed_latency_ms: float = 10, parallel: int = 1) -> Starlette:
+    """
+    parallel: how many model calls are served at once (mirrors OLLAMA_NUM_PARALLEL).
+    """
+    model_slots = asyncio.Semaphore(parallel)
+
+    async def simulate(latency_ms: float):
+        async with model_slots:
+            await asyncio.sleep(latency_ms / 1000)
+
+    def envelope(payload: dict, started: float) -> dict:
+        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": payload.get("model", "fake"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": elapsed_ns,
+            "load_duration": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration": elapsed_ns // 2,
+            "eval_count": 0,
+            "eval_duration": elapsed_ns // 2,
+        }
+
+    async def chat(request: Request):
+        started = time.perf_counter()
+        payload = await request.json()
+        messages = payload.get("messages", [])
+        last = messages[-1]["content"] if messages else ""
+
+        await simulate(chat_latency_ms)
+
+        if payload.get("format"):
+            content = json.dumps(fake_analysis(last))
+        else:
+            content = f"Based on your notes: {last[:120]}"
+
+        body = envelope(payload, started)
+        body["message"] = {"role": "assistant", "content": content}
+        return JSONResponse(body)
+
+    async def embeddings(request: Request):
+        payload = await request.json()
+        await simulate(embed_latency_ms)
+        return JSONResponse({"embedding": fake_embedding(payload.get("prompt", ""))})
+
+    async def embed(request: Request):
+        started = time.perf_counter()
+        payload = await request.json()
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await simulate(embed_latency_ms)
+        body = envelope(payload, started)
+        body["embeddings"] = [fake_embedding(text) for text in inputs]
+        return JSONResponse(body)
+
+    async def tags(request: Request):
+        return JSONResponse({"models": []})
+
+    return Starlette(routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/embeddings", embeddings, methods=["POST"]),
+        Route("/api/embed", embed, methods=["POST"]),
+        Route("/api/tags", tags, methods=["GET"]),
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--chat-latency-ms", type=float, default=200)
+    parser.add_argument("--embed-latency-ms", type=float, default=10)
+    parser.add_argument("--parallel", type=int, default=1)
+    args = parser.parse_args()
+
+    app = create_app(args.chat_latency_ms, args.embed_latency_ms, args.parallel)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Load-test harness for the Engram HTTP API.
+
+Boots the real FastAPI app (src/server/api.py) in a subprocess against a
+throwaway vault and a deterministic fake Ollama, then drives a mixed workload
+and reports throughput, latency percentiles and error rates per route.
+
+Usage:
+    python -m src.tools.loadtest --concurrency 16 --duration 60
+    python -m src.tools.loadtest --rate 20 --mix ask=6,save=2,graph=1,tree=1
+    python -m src.tools.loadtest --target http://localhost:8000   # existing server
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+from src.tools.fake_ollama import create_app
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_MIX = "ask=5,save=3,graph=1,tree=1"
+
+WORDS = (
+    "deploy auth service ticket migration postgres standup roadmap review latency "
+    "cache index release rollback incident oncall design budget sprint backlog api"
+).split()
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        route, _, weight = part.partition("=")
+        mix[route.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, elapsed: float, status: int, ok: bool):
+        self.latencies[route].append(elapsed)
+        self.status_codes[route][status] += 1
+        if not ok:
+            self.errors[route] += 1
+
+    def report(self, duration: float) -> dict:
+        report = {}
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            count = len(values)
+            report[route] = {
+                "requests": count,
+                "throughput_rps": round(count / duration, 2),
+                "error_rate": round(self.errors[route] / count, 4) if count else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p90_ms": round(percentile(values, 90) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+                "status_codes": dict(self.status_codes[route]),
+            }
+        return report
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, seed: int):
+        self.client = client
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def _sentence(self, n: int = 12) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(n))
+
+    async def call(self, route: str):
+        if route == "save":
+            self.counter += 1
+            title = f"Load {self.counter} {self._sentence(3)}"
+            request = ("POST", "/save", {
+                "title": title,
+                "category": "Work/General",
+                "tags": ["loadtest"],
+                "summary": f"# {title}\n{self._sentence(60)}",
+                "original_text": self._sentence(30)
+            })
+        elif route == "ask":
+            request = ("POST", "/ask", {"query": self._sentence(8)})
+        elif route == "analyze":
+            request = ("POST", "/analyze", {"text": self._sentence(40)})
+        elif route in ("graph", "tree"):
+            request = ("GET", f"/{route}", None)
+        elif route == "reindex":
+            request = ("POST", "/reindex", None)
+        else:
+            raise ValueError(f"Unknown route in mix: {route}")
+
+        method, path, body = request
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, json=body)
+            ok = response.status_code < 400
+            status = response.status_code
+        except httpx.HTTPError:
+            ok, status = False, 0
+        self.stats.record(route, time.perf_counter() - started, status, ok)
+
+
+async def run_closed_loop(workload: Workload, mix: dict, concurrency: int, deadline: float, think_ms: float):
+    """N virtual users, each issuing its next request as soon as the last one returns."""
+    routes, weights = list(mix), list(mix.values())
+
+    async def user():
+        while time.monotonic() < deadline:
+            await workload.call(workload.rng.choices(routes, weights)[0])
+            if think_ms:
+                await asyncio.sleep(workload.rng.expovariate(1000 / think_ms))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def run_open_loop(workload: Workload, mix: dict, rate: float, max_in_flight: int, deadline: float):
+    """Poisson arrivals at `rate` req/s, capped at `max_in_flight` outstanding requests."""
+    routes, weights = list(mix), list(mix.values())
+    slots = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def one(route):
+        try:
+            await workload.call(route)
+        finally:
+            slots.release()
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(workload.rng.expovariate(rate))
+        await slots.acquire()
+        task = asyncio.create_task(one(workload.rng.choices(routes, weights)[0]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def run_background_reindex(workload: Workload, interval: float, deadline: float):
+    while time.monotonic() + interval < deadline:
+        await asyncio.sleep(interval)
+        await workload.call("reindex")
+
+
+def start_fake_ollama(port: int, args) -> threading.Thread:
+    import uvicorn
+
+    app = create_app(args.chat_latency_ms, args.embed_latency_ms, args.model_parallel)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="fake-ollama", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_server(port: int, ollama_port: int, workdir: str) -> subprocess.Popen:
+    env = os.environ.copy()
+    env["OLLAMA_HOST"] = f"http://127.0.0.1:{ollama_port}"
+    env["PYTHONPATH"] = str(ROOT_DIR)
+    env["PYTHONUNBUFFERED"] = "1"
+    cmd = [sys.executable, "-m", "uvicorn", "src.server.api:app",
+           "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    # cwd decides where the throwaway vault and config.json live
+    return subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout}s")
+
+
+async def run(args, base_url: str) -> dict:
+    await wait_until_ready(base_url)
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        # Seed the vault so /ask and /graph have something to chew on
+        seeder = Workload(client, Stats(), args.seed)
+        for _ in range(args.seed_notes):
+            await seeder.call("save")
+
+        stats = Stats()
+        workload = Workload(client, stats, args.seed + 1)
+        started = time.monotonic()
+        deadline = started + args.duration
+
+        jobs = []
+        if args.rate:
+            jobs.append(run_open_loop(workload, mix, args.rate, args.concurrency, deadline))
+        else:
+            jobs.append(run_closed_loop(workload, mix, args.concurrency, deadline, args.think_ms))
+        if args.reindex_interval:
+            jobs.append(run_background_reindex(workload, args.reindex_interval, deadline))
+
+        await asyncio.gather(*jobs)
+        return stats.report(time.monotonic() - started)
+
+
+def print_report(report: dict):
+    header = f"{'route':<10}{'reqs':>8}{'rps':>9}{'err%':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for route, row in report.items():
+        print(f"{route:<10}{row['requests']:>8}{row['throughput_rps']:>9}{row['error_rate'] * 100:>8.2f}"
+              f"{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engram HTTP load test")
+    parser.add_argument("--target", help="Base URL of an already running server (skips spawning one)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the spawned server")
+    parser.add_argument("--ollama-port", type=int, default=11500, help="Port for the fake Ollama")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted routes, e.g. ask=5,save=3,graph=1,tree=1")
+    parser.add_argument("--concurrency", type=int, default=8, help="Virtual users (closed loop) or max in flight (open loop)")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean think time between requests per user")
+    parser.add_argument("--duration", type=float, default=30, help="Measured run length in seconds")
+    parser.add_argument("--reindex-interval", type=float, default=0, help="Seconds between background /reindex calls")
+    parser.add_argument("--seed-notes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--chat-latency-ms", type=float, default=200)
+    parser.add_argument("--embed-latency-ms", type=float, default=10)
+    parser.add_argument("--model-parallel", type=int, default=1, help="Concurrent calls the fake model serves")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    server = None
+    workdir = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        workdir = tempfile.TemporaryDirectory(prefix="engram-loadtest-")
+        start_fake_ollama(args.ollama_port, args)
+        server = start_server(args.port, args.ollama_port, workdir.name)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        report = asyncio.run(run(args, base_url))
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if workdir:
+            workdir.cleanup()
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Microbenchmark for the note codec (src/core/notes.py).
+
+Parses a synthetic corpus the way reindex does (frontmatter, body and H1
+title) with the previous regex + yaml.safe_load pipeline and with
+parse_note, checks both agree and that every note survives a write/read
+round trip through format_note, and reports per-note cost for each note shape:
+
+    engram   frontmatter written by format_note (the fast path)
+    legacy   frontmatter from older Engram writers (quoted strings, ['a', 'b'] tags)
+    yaml     hand-written YAML (block lists, comments) that needs the YAML loader
+    raw      no frontmatter at all
+
+Exits non-zero when a check fails, so `--check` (a tiny corpus, one timed
+run) doubles as a quick correctness gate for codec changes.
+
+Usage:
+    python -m src.tools.notebench
+    python -m src.tools.notebench --notes 5000 --repeat 7 --body-words 800
+    python -m src.tools.notebench --check
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import yaml
+
+from src.core.notes import YAML_LOADER, format_note, parse_note
+
+WORDS = (
+    "deploy auth service ticket migration postgres standup roadmap review latency "
+    "cache index release rollback incident oncall design budget sprint backlog api"
+).split()
+SHAPES = ("engram", "legacy", "yaml", "raw")
+_FRONTMATTER = re.compile(r'^\s*---\s*\n(.*?)\n---\s*\n', re.DOTALL | re.MULTILINE)
+_H1 = re.compile(r'^#\s+(.*)', re.MULTILINE)
+
+
+def _body(rng: random.Random, words: int) -> str:
+    paragraphs = []
+    while words > 0:
+        n = min(words, rng.randint(20, 80))
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(n)))
+        words -= n
+    return f"# {rng.choice(WORDS).title()} {rng.choice(WORDS)}\n\n" + "\n\n".join(paragraphs) + "\n"
+
+
+def make_note(rng: random.Random, shape: str, body_words: int) -> str:
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+    category = rng.choice(["Work/Tech", "Work/Meetings", "Personal", "Inbox"])
+    tags = rng.sample(WORDS, rng.randint(1, 4))
+    created = datetime(2026, 1, 1) + timedelta(minutes=rng.randint(0, 400000))
+    body = _body(rng, body_words)
+
+    if shape == "engram":
+        return format_note({"title": title, "category": category, "tags": tags,
+                            "created": created, "status": "active"}, body)
+    if shape == "legacy":
+        return (f'---\ntitle: "{title}"\ncategory: "{category}"\ntags: {tags}\n'
+                f'created: {created:%Y-%m-%d %H:%M:%S}\nstatus: active\n---\n\n{body}')
+    if shape == "yaml":
+        tag_lines = "".join(f"  - {tag}\n" for tag in tags)
+        return (f"---\n# imported from another tool\ntitle: {title}\ncategory: {category}\n"
+                f"tags:\n{tag_lines}created: {created:%Y-%m-%d}\naliases: [{title.split()[0]}]\n---\n{body}")
+    return body
+
+
+def parse_regex(text: str):
+    """The pipeline reindex used before the codec: two frontmatter regex passes, safe_load, H1 regex."""
+    metadata, body = {}, text
+    match = _FRONTMATTER.search(text)
+    if match:
+        metadata = yaml.safe_load(match.group(1)) or {}
+        body = _FRONTMATTER.sub('', text).strip()
+    h1 = _H1.search(body)
+    return metadata, body, h1.group(1).strip() if h1 else None
+
+
+def parse_codec(text: str):
+    note = parse_note(text)
+    return note.metadata, note.body, note.heading()
+
+
+def round_trips(text: str) -> bool:
+    """Whether the note reads back the same after being written with format_note."""
+    note = parse_note(text)
+    if not note.frontmatter:
+        return True
+    again = parse_note(format_note(note.metadata, note.body))
+    return (again.metadata, again.body) == (note.metadata, note.body)
+
+
+def bench(fn, notes: list, repeat: int) -> float:
+    """Best-of-`repeat` seconds per note."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in notes:
+            fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best / len(notes)
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    corpus = {shape: [make_note(rng, shape, args.body_words) for _ in range(args.notes)] for shape in SHAPES}
+
+    mismatches = 0
+    roundtrip_failures = 0
+    for notes in corpus.values():
+        for text in notes:
+            if parse_regex(text) != parse_codec(text):
+                mismatches += 1
+            if not round_trips(text):
+                roundtrip_failures += 1
+
+    report = {}
+    for shape, notes in corpus.items():
+        before = bench(parse_regex, notes, args.repeat)
+        after = bench(parse_codec, notes, args.repeat)
+        report[shape] = {
+            "regex_us": round(before * 1e6, 1),
+            "codec_us": round(after * 1e6, 1),
+            "speedup": round(before / after, 1) if after else None
+        }
+    everything = [text for notes in corpus.values() for text in notes]
+    rng.shuffle(everything)
+    before = bench(parse_regex, everything, args.repeat)
+    after = bench(parse_codec, everything, args.repeat)
+    report["mixed"] = {"regex_us": round(before * 1e6, 1), "codec_us": round(after * 1e6, 1),
+                       "speedup": round(before / after, 1) if after else None}
+    return {"loader": YAML_LOADER.__name__, "mismatches": mismatches,
+            "roundtrip_failures": roundtrip_failures, "shapes": report}
+
+
+def print_report(report: dict):
+    print(f"YAML loader for non-canonical frontmatter: {report['loader']}")
+    print(f"Results differing from the regex pipeline: {report['mismatches']}")
+    print(f"Notes changed by a format_note round trip: {report['roundtrip_failures']}\n")
+    header = f"{'shape':<10}{'regex us':>12}{'codec us':>12}{'speedup':>10}"
+    print(header)
+    print("-" * len(header))
+    for shape, row in report["shapes"].items():
+        print(f"{shape:<10}{row['regex_us']:>12}{row['codec_us']:>12}{row['speedup']:>9}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engram note parser microbenchmark")
+    parser.add_argument("--notes", type=int, default=1000, help="Notes per shape")
+    parser.add_argument("--body-words", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    parser.add_argument("--check", action="store_true", help="Tiny corpus and one timed run: a quick correctness check")
+    args = parser.parse_args()
+    if args.check:
+        args.notes, args.body_words, args.repeat = 50, 40, 1
+
+    report = run(args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["mismatches"] or report["roundtrip_failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()